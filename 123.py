@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 # filepath: c:\Users\1\Desktop\12306router\fix_train_routes_cities.py
 
-import sqlite3
 import os
 import sys
 
+from database import bump_timetable_version, connect
+from station_search import load_city_aliases
+
 def fix_train_routes_cities():
     """补全trains.db中train_routes表的city列中所有城市名"""
     try:
@@ -14,10 +16,10 @@ def fix_train_routes_cities():
             return False
         
         # 连接trains.db数据库
-        conn = sqlite3.connect('trains.db')
+        conn = connect('trains.db', profile='etl')
         cursor = conn.cursor()
         
-        # 定义城市名称映射(缩写或可能的变体 -> 标准名称)
+        # 定义城市名称映射(缩写或可能的变体 -> 标准名称)；简称/别名统一来自 city_aliases.json
         city_mapping = {
             "北京": "北京",
             "上海": "上海", 
@@ -29,10 +31,6 @@ def fix_train_routes_cities():
             "福州": "福州",
             "广州": "广州",
             "贵阳": "贵阳",
-            "呼和": "呼和浩特",
-            "呼市": "呼和浩特",
-            "哈尔": "哈尔滨",
-            "哈市": "哈尔滨",
             "合肥": "合肥",
             "杭州": "杭州",
             "海口": "海口",
@@ -44,11 +42,7 @@ def fix_train_routes_cities():
             "南京": "南京",
             "南昌": "南昌",
             "沈阳": "沈阳",
-            "石家": "石家庄",
-            "石市": "石家庄",
             "太原": "太原",
-            "乌鲁": "乌鲁木齐",
-            "乌市": "乌鲁木齐",
             "武汉": "武汉",
             "西宁": "西宁",
             "西安": "西安",
@@ -59,6 +53,7 @@ def fix_train_routes_cities():
             "大连": "大连",
             "青岛": "青岛"
         }
+        city_mapping.update(load_city_aliases())
         
         # 扩展城市名映射，增加各种可能的变体
         expanded_mapping = {}
@@ -152,6 +147,8 @@ def fix_train_routes_cities():
             updates_count += updates
             print(f"已更新: *石家* -> 石家庄, {updates}条记录")
         
+        if updates_count:
+            bump_timetable_version(conn)
         conn.commit()
         
         # 统计完成后的城市列表
@@ -0,0 +1,464 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from booking_queue import TicketWriter
+from city_resolver import get_resolver
+from database import pooled
+from journey_planner import MINUTES_PER_DAY, format_minutes
+from route_cache import RouteCache
+from route_search import decode_cursor, parse_window, search_routes
+from seat_inventory import (BOOKING_WINDOW_DAYS, DEFAULT_TOTAL_SEATS, SeatInventory, availability_calendar,
+                            booking_window)
+from ticket_shards import ShardMap, ShardedTicketWriter
+
+# 与 server.js 相同的签名密钥，登录仍由 server.js 签发令牌，两边令牌通用
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
+
+
+def _b64url_decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def sign_token(payload, secret=JWT_SECRET):
+    """签发 HS256 JWT（与 jsonwebtoken 的 jwt.sign 格式相同）"""
+    header = _b64url_encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(',', ':')).encode())
+    body = _b64url_encode(json.dumps(payload, separators=(',', ':')).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{body}".encode(), hashlib.sha256).digest()
+    return f"{header}.{body}.{_b64url_encode(signature)}"
+
+
+def verify_token(token, secret=JWT_SECRET):
+    """校验 HS256 JWT，返回载荷；签名错误、格式错误或已过期时返回 None"""
+    try:
+        header, body, signature = token.split('.')
+        if json.loads(_b64url_decode(header)).get('alg') != 'HS256':
+            return None
+        expected = hmac.new(secret.encode(), f"{header}.{body}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
+            return None
+        payload = json.loads(_b64url_decode(body))
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(payload, dict) or payload.get('exp', float('inf')) <= time.time():
+        return None
+    return payload
+
+
+def parse_route_params(query):
+    """
+    /api/routes/direct、/api/routes/calendar 的查询参数 -> route_search 过滤条件
+    与 server.js 的 parseRouteSearch 一致
+    参数错误时抛出 ValueError
+    """
+    filters = {"sort": query.get('sort') or 'train_code'}
+    if query.get('depart'):
+        filters['depart_window'] = parse_window(query['depart'])
+    if query.get('arrive'):
+        filters['arrive_window'] = parse_window(query['arrive'])
+    if query.get('maxDuration'):
+        try:
+            max_minutes = int(query['maxDuration'])
+        except ValueError:
+            max_minutes = 0
+        if max_minutes <= 0:
+            raise ValueError("无效的最长历时")
+        filters['max_minutes'] = max_minutes
+    if query.get('classes'):
+        filters['classes'] = [c for c in query['classes'].upper().split(',') if c]
+    if query.get('trainCode'):
+        filters['train_code'] = query['trainCode']
+    if query.get('cursor'):
+        filters['cursor'] = decode_cursor(query['cursor'])
+    try:
+        filters['limit'] = int(query.get('limit') or 30)
+    except ValueError:
+        filters['limit'] = 30
+    return filters
+
+
+def parse_travel_date(value):
+    """乘车日期字符串 -> 'YYYY-MM-DD'，不在预售期（明天起 BOOKING_WINDOW_DAYS 天）内时抛出 ValueError"""
+    try:
+        travel_date = date.fromisoformat(str(value))
+    except ValueError:
+        travel_date = None
+    today = date.today()
+    if travel_date is None or not (today < travel_date <= today + timedelta(days=BOOKING_WINDOW_DAYS)):
+        raise ValueError("请选择合法的乘车日期（未来30天内）")
+    return travel_date.isoformat()
+
+
+def parse_order(body, prefix=''):
+    """
+    购票/改签请求体 -> 订单 dict；改签时字段名带 new 前缀（newTrainCode 等）
+    参数缺失、日期不在预售期内或区间非法时抛出 ValueError
+    """
+    def field(name):
+        return body.get(prefix + name[0].upper() + name[1:] if prefix else name)
+
+    order = {
+        "train_code": field('trainCode'),
+        "train_full_code": field('trainFullCode') or field('trainCode'),
+        "from_station": field('fromStation'),
+        "to_station": field('toStation'),
+        "from_no": field('fromStationNo'),
+        "to_no": field('toStationNo'),
+        "travel_date": field('travelDate'),
+    }
+    if not all(order[key] for key in ('train_code', 'from_station', 'to_station', 'from_no', 'to_no', 'travel_date')):
+        raise ValueError("改签参数不完整" if prefix else "参数不完整")
+    travel_date = parse_travel_date(order['travel_date'])
+    try:
+        order['from_no'], order['to_no'] = int(order['from_no']), int(order['to_no'])
+    except (TypeError, ValueError):
+        raise ValueError("改签参数不完整" if prefix else "参数不完整") from None
+    if order['from_no'] >= order['to_no']:
+        raise ValueError("出发站必须在到达站之前")
+    order['travel_date'] = travel_date
+    return order
+
+
+def format_route(route, names, from_city, to_city, tickets_left):
+    """search_routes 的路线 -> 接口返回的 JSON（字段与 server.js 一致），tickets_left 为余票数或按日余票列表"""
+    arrive = None
+    if route['arrive_min'] is not None:
+        offset = max(0, route['arrive_day'] - (route['depart_day'] or 0))
+        arrive = format_minutes(route['arrive_min'] + offset * MINUTES_PER_DAY)
+    return {
+        "trainCode": route['train_code'],
+        "trainFullCode": route['train_full_code'] or route['train_code'],
+        "from": {"station": names.get(route['start_id'], from_city), "sequence": route['start_no']},
+        "to": {"station": names.get(route['end_id'], to_city), "sequence": route['end_no']},
+        "runTime": route['run_time'] or "未知",
+        "departTime": None if route['depart_min'] is None else format_minutes(route['depart_min']),
+        "arriveTime": arrive,
+        "duration": route['duration'],
+        "ticketsLeft": tickets_left,
+    }
+
+
+class ApiService:
+    """
+    Python 版后端：实现 server.js 的直达查询、余票日历、购票、退票、改签和我的车票接口，JSON 格式与 server.js 相同
+    查询走内存（城市解析器、路线结果缓存、座位占用矩阵），缓存未命中的 SQL 查询在线程池中执行；
+    ticket.db 的写入全部经由 TicketWriter 排队、批量提交；指定 shard_map 时按 (车次, 日期) 写入各分片库
+    （分片只分散数据，同一进程内不提高购票吞吐，见 ticket_shards.ShardedTicketWriter）
+    """
+
+    def __init__(self, trains_db='trains.db', stations_db='stations.db', ticket_db='ticket.db',
+                 secret=JWT_SECRET, strategy='first_fit', total_seats=DEFAULT_TOTAL_SEATS, shard_map=None,
+                 snapshot_path=None):
+        self.trains_db = trains_db
+        self.stations_db = stations_db
+        self.ticket_db = ticket_db
+        self.total_seats = total_seats
+        self.shard_map = shard_map
+        self.secret = secret
+        self.route_cache = RouteCache(databases=(trains_db, stations_db))
+        if shard_map is not None:
+            self.writer = ShardedTicketWriter(shard_map, strategy, total_seats)
+        else:
+            self.writer = TicketWriter(ticket_db, SeatInventory(total_seats), strategy, snapshot_path=snapshot_path)
+        # (方法, 路径) -> (处理函数, 是否需要登录)
+        self.handlers = {
+            ('GET', '/api/routes/direct'): (self.direct_routes, False),
+            ('GET', '/api/routes/calendar'): (self.route_calendar, False),
+            ('POST', '/api/tickets'): (self.book_ticket, True),
+            ('POST', '/api/tickets/refund'): (self.refund_ticket, True),
+            ('POST', '/api/tickets/change'): (self.change_ticket, True),
+            ('GET', '/api/user/tickets'): (self.user_tickets, True),
+        }
+
+    async def start(self):
+        await self.writer.start()
+
+    async def stop(self):
+        await self.writer.stop()
+
+    def _find_routes(self, from_city, to_city, filters):
+        """城市 -> 车站ID，查询（或命中缓存）直达路线，返回 (路线列表, 下一页游标, 车站ID->站名)"""
+        resolver = get_resolver(self.stations_db)
+        start_ids = resolver.resolve_ids(from_city)
+        end_ids = resolver.resolve_ids(to_city)
+        if not start_ids or not end_ids:
+            raise ValueError("不支持的城市")
+        names = {station_id: name for name, station_id in start_ids + end_ids}
+
+        def load():
+            with pooled(self.trains_db) as conn:
+                return search_routes(conn, [i for _, i in start_ids], [i for _, i in end_ids], **filters)
+
+        key = json.dumps([from_city, to_city, filters], sort_keys=True, ensure_ascii=False)
+        routes, next_cursor = self.route_cache.get(key, load)
+        return routes, next_cursor, names
+
+    async def tickets_left(self, routes, travel_date):
+        """
+        按内存占用矩阵计算余票，某日期第一次查询时由写线程载入
+        travel_date 须先经 parse_travel_date 校验：每个新日期都会整日载入并常驻内存
+        """
+        if travel_date:
+            await self.writer.ensure_date(travel_date)
+        return self.writer.count_available_many(
+            (route['train_code'], travel_date, route['start_no'], route['end_no']) for route in routes)
+
+    async def direct_routes(self, request):
+        query = request['query']
+        from_city, to_city, travel_date = query.get('from'), query.get('to'), query.get('date')
+        if not from_city or not to_city:
+            return {"code": 1, "msg": "请提供出发城市和目的地"}
+        try:
+            if travel_date:
+                travel_date = parse_travel_date(travel_date)
+            filters = parse_route_params(query)
+            routes, next_cursor, names = await asyncio.to_thread(self._find_routes, from_city, to_city, filters)
+        except ValueError as e:
+            return {"code": 1, "msg": str(e)}
+        counts = await self.tickets_left(routes, travel_date)
+
+        formatted = [format_route(route, names, from_city, to_city, left) for route, left in zip(routes, counts)]
+        return {
+            "code": 0,
+            "data": {
+                "routes": formatted,
+                "total": len(formatted),
+                "nextCursor": next_cursor,
+                "from": from_city,
+                "to": to_city,
+                "date": travel_date,
+            },
+        }
+
+    def _calendar(self, routes, dates):
+        """
+        多日余票：每个车票库对 seat_occupancy 只做一次 (train_code, travel_date) 范围扫描
+        分片时某个 (车次, 日期) 的占用只在一个分片中，其余分片算出的是全部座位，按日取最小值即可合并
+        """
+        keys = [(route['train_code'], route['start_no'], route['end_no']) for route in routes]
+        merged = {key: [self.total_seats] * len(dates) for key in keys}
+        paths = self.shard_map.paths if self.shard_map is not None else [self.ticket_db]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with pooled(path) as conn:
+                part = availability_calendar(conn, keys, dates, self.total_seats)
+            for key, counts in part.items():
+                merged[key] = [min(a, b) for a, b in zip(merged[key], counts)]
+        return [merged[key] for key in keys]
+
+    async def route_calendar(self, request):
+        """预售期内每天的余票（日历视图），一次请求代替逐日查询 /api/routes/direct"""
+        query = request['query']
+        from_city, to_city = query.get('from'), query.get('to')
+        if not from_city or not to_city:
+            return {"code": 1, "msg": "请提供出发城市和目的地"}
+        try:
+            filters = parse_route_params(query)
+            routes, next_cursor, names = await asyncio.to_thread(self._find_routes, from_city, to_city, filters)
+        except ValueError as e:
+            return {"code": 1, "msg": str(e)}
+        dates = booking_window()
+        calendar = await asyncio.to_thread(self._calendar, routes, dates)
+        formatted = [format_route(route, names, from_city, to_city, left) for route, left in zip(routes, calendar)]
+        return {
+            "code": 0,
+            "data": {
+                "dates": dates,
+                "routes": formatted,
+                "total": len(formatted),
+                "nextCursor": next_cursor,
+                "from": from_city,
+                "to": to_city,
+            },
+        }
+
+    async def book_ticket(self, request):
+        body = request['body']
+        try:
+            order = parse_order(body)
+            ticket_id, seat = await self.writer.book_ticket(request['user']['id'], order)
+        except ValueError as e:
+            return {"code": 1, "msg": str(e)}
+        return {
+            "code": 0,
+            "msg": "购票成功",
+            "data": {
+                "ticketId": ticket_id,
+                "trainCode": body['trainCode'],
+                "fromStation": body['fromStation'],
+                "toStation": body['toStation'],
+                "travelDate": body['travelDate'],
+                "seatNumber": seat,
+            },
+        }
+
+    async def refund_ticket(self, request):
+        try:
+            await self.writer.refund_ticket(request['user']['id'], request['body'].get('ticketId'))
+        except ValueError as e:
+            return {"code": 1, "msg": str(e)}
+        return {"code": 0, "msg": "退票成功"}
+
+    async def change_ticket(self, request):
+        body = request['body']
+        if 'changes' in body:
+            return await self.change_tickets(request)
+        try:
+            order = parse_order(body, prefix='new')
+            ticket_id, seat = await self.writer.change_ticket(request['user']['id'], body.get('ticketId'), order)
+        except ValueError as e:
+            return {"code": 1, "msg": str(e)}
+        return {
+            "code": 0,
+            "msg": "改签成功",
+            "data": {
+                "ticketId": ticket_id,
+                "trainCode": body['newTrainCode'],
+                "fromStation": body['newFromStation'],
+                "toStation": body['newToStation'],
+                "travelDate": body['newTravelDate'],
+                "seatNumber": seat,
+            },
+        }
+
+    async def change_tickets(self, request):
+        """团体票批量改签：{"changes": [{ticketId, newTrainCode, ...}, ...]}，全部成功或全部不变"""
+        items = request['body']['changes']
+        try:
+            if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+                raise ValueError("改签参数不完整")
+            changes = [(item.get('ticketId'), parse_order(item, prefix='new')) for item in items]
+            results = await self.writer.change_tickets(request['user']['id'], changes)
+        except ValueError as e:
+            return {"code": 1, "msg": str(e)}
+        tickets = [{
+            "ticketId": ticket_id,
+            "trainCode": item['newTrainCode'],
+            "fromStation": item['newFromStation'],
+            "toStation": item['newToStation'],
+            "travelDate": item['newTravelDate'],
+            "seatNumber": seat,
+        } for item, (ticket_id, seat) in zip(items, results)]
+        return {"code": 0, "msg": "改签成功", "data": {"tickets": tickets}}
+
+    async def user_tickets(self, request):
+        tickets = await self.writer.user_tickets(request['user']['id'])
+        return {"code": 0, "data": {"tickets": tickets}}
+
+    async def dispatch(self, method, target, headers, body):
+        """处理一个请求，返回 (HTTP 状态码, JSON 响应)"""
+        url = urlsplit(target)
+        entry = self.handlers.get((method, url.path))
+        if entry is None:
+            return 404, {"code": 404, "msg": "接口不存在"}
+        handler, needs_auth = entry
+
+        request = {"query": {k: v[0] for k, v in parse_qs(url.query).items()}, "body": {}, "user": None}
+        if needs_auth:
+            scheme, _, token = headers.get('authorization', '').partition(' ')
+            if not token:
+                return 401, {"code": 401, "msg": "未授权，请先登录"}
+            request['user'] = verify_token(token, self.secret)
+            if request['user'] is None:
+                return 401, {"code": 401, "msg": "令牌无效或已过期"}
+        if body:
+            try:
+                request['body'] = json.loads(body)
+            except ValueError:
+                return 400, {"code": 400, "msg": "请求体不是有效的JSON"}
+            if not isinstance(request['body'], dict):
+                return 400, {"code": 400, "msg": "请求体不是有效的JSON"}
+
+        try:
+            return 200, await handler(request)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            return 200, {"code": 500, "msg": "服务器繁忙，请稍后重试"}
+
+    async def handle_client(self, reader, writer):
+        """HTTP/1.1 连接处理（支持 keep-alive 和 CORS 预检）"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+
+                if method == 'OPTIONS':
+                    status, data = 204, b''
+                else:
+                    status, payload = await self.dispatch(method, target, headers, body)
+                    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write((
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Access-Control-Allow-Origin: *\r\n"
+                    "Access-Control-Allow-Methods: GET,POST,OPTIONS\r\n"
+                    "Access-Control-Allow-Headers: Content-Type,Authorization\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                ).encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=None, port=3000, **kwargs):
+    """启动服务直到被中断；默认端口与 server.js 相同，前端无需修改即可切换"""
+    service = ApiService(**kwargs)
+    await service.start()
+    server = await asyncio.start_server(service.handle_client, host, port)
+    print(f"Python 后端已启动: http://localhost:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    # 用法: python api_service.py [端口] [--strategy=first_fit|best_fit|consolidate]
+    #       [--shards=shards.json]       按 (车次, 日期) 分库存放车票；不是性能选项，单库的购票吞吐更高
+    #       [--snapshot=ticket.db.inv]   启动时从座位库存快照恢复，停止时更新快照（仅单库）
+    options = {}
+    port = 3000
+    for arg in sys.argv[1:]:
+        if arg.startswith('--strategy='):
+            options['strategy'] = arg.partition('=')[2]
+        elif arg.startswith('--shards='):
+            options['shard_map'] = ShardMap.load(arg.partition('=')[2])
+        elif arg.startswith('--snapshot='):
+            options['snapshot_path'] = arg.partition('=')[2]
+        else:
+            port = int(arg)
+    try:
+        asyncio.run(serve(port=port, **options))
+    except KeyboardInterrupt:
+        print("服务器已关闭")
@@ -0,0 +1,321 @@
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from database import connect
+from index_advisor import CANDIDATE_INDEXES
+from seat_allocator import SeatAllocator, record_occupancy
+from seat_inventory import SeatInventory, availability_calendar, booking_window
+from time_columns import add_minute_columns
+from timetable_index import TimetableIndex
+
+# 默认规模：车次数、每车次站数、车站数、城市数、日期数、座位数、已售比例
+DEFAULT_SCALE = {
+    'trains': 500,
+    'stops': 12,
+    'stations': 300,
+    'cities': 60,
+    'dates': 7,
+    'seats': 100,
+    'occupancy': 0.3,
+}
+
+# 基准结果默认保存位置
+BASELINE_PATH = 'bench_baseline.json'
+
+
+def generate_timetable(trains_db, stations_db, scale, seed=1):
+    """生成合成时刻表：stations.db 的 stations 表和 trains.db 的 train_routes 表，结构与正式库一致"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(stations_db)
+    try:
+        conn.execute("""
+            CREATE TABLE stations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                city TEXT
+            )
+        """)
+        conn.executemany("INSERT INTO stations (id, name, city) VALUES (?, ?, ?)", [
+            (i, f"站{i}", f"城{i % scale['cities']}") for i in range(1, scale['stations'] + 1)
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    rows = []
+    for t in range(scale['trains']):
+        train_code = f"{'GDKZ'[t % 4]}{t + 1}"
+        stations = rng.sample(range(1, scale['stations'] + 1), scale['stops'])
+        for station_no, station_id in enumerate(stations, 1):
+            rows.append((train_code, station_id, station_no, f"城{station_id % scale['cities']}",
+                         f"24000{train_code}0A"))
+
+    conn = sqlite3.connect(trains_db)
+    try:
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                train_code TEXT NOT NULL,
+                station_id INTEGER,
+                station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+                UNIQUE(train_code, station_id)
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO train_routes (train_code, station_id, station_no, city, train_full_code)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+        # 与 time_columns.py 处理后的表结构、index_advisor.py 建议的索引集合一致
+        add_minute_columns(conn)
+        for sql in CANDIDATE_INDEXES['trains.db']:
+            conn.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def generate_occupancy(ticket_db, train_codes, dates, scale, seed=1):
+    """生成合成的 tickets 和 seat_occupancy，按 occupancy 比例随机售出区间票"""
+    rng = random.Random(seed)
+    stops = scale['stops']
+    conn = sqlite3.connect(ticket_db)
+    try:
+        conn.execute("""
+            CREATE TABLE tickets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, train_code TEXT NOT NULL,
+                train_full_code TEXT, from_station TEXT NOT NULL, from_station_no INTEGER NOT NULL,
+                to_station TEXT NOT NULL, to_station_no INTEGER NOT NULL, travel_date DATE NOT NULL,
+                seat_number INTEGER NOT NULL, status TEXT DEFAULT 'booked',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                changed_from INTEGER NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE seat_occupancy (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, travel_date DATE NOT NULL,
+                seat_number INTEGER NOT NULL, start_station_no INTEGER NOT NULL, end_station_no INTEGER NOT NULL,
+                ticket_id INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("CREATE INDEX seat_occupancy_train_code_travel_date_index ON seat_occupancy(train_code, travel_date)")
+        for sql in CANDIDATE_INDEXES['ticket.db']:
+            conn.execute(sql)
+
+        tickets = []
+        occupancy = []
+        ticket_id = 0
+        for train_code in train_codes:
+            for travel_date in dates:
+                for seat in range(1, scale['seats'] + 1):
+                    if rng.random() >= scale['occupancy']:
+                        continue
+                    start_no = rng.randint(1, stops - 1)
+                    end_no = rng.randint(start_no + 1, stops)
+                    ticket_id += 1
+                    tickets.append((ticket_id, 1, train_code, f"站{start_no}", start_no, f"站{end_no}", end_no,
+                                    travel_date, seat))
+                    occupancy.append((train_code, travel_date, seat, start_no, end_no, ticket_id))
+        conn.executemany("""
+            INSERT INTO tickets (id, user_id, train_code, from_station, from_station_no, to_station, to_station_no,
+                                 travel_date, seat_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, tickets)
+        conn.executemany("""
+            INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no, ticket_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, occupancy)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(occupancy)
+
+
+def measure(func, cases):
+    """逐个执行用例并统计延迟分位数（微秒）和吞吐量（次/秒）"""
+    latencies = []
+    start = time.perf_counter()
+    for case in cases:
+        t0 = time.perf_counter()
+        func(*case)
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "ops": n,
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p95_us": latencies[min(n - 1, int(n * 0.95))] * 1e6,
+        "p99_us": latencies[min(n - 1, int(n * 0.99))] * 1e6,
+        "throughput": n / total if total else 0.0,
+    }
+
+
+def run_suite(scale=None, operations=200, seed=1, workdir=None):
+    """
+    在临时目录生成合成数据并依次测量：直达查询（内存索引/SQL）、余票计数、余票日历、购票、退票
+    返回 {基准名: 统计结果}
+    """
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        trains_db = os.path.join(tmpdir, 'trains.db')
+        stations_db = os.path.join(tmpdir, 'stations.db')
+        ticket_db = os.path.join(tmpdir, 'ticket.db')
+        generate_timetable(trains_db, stations_db, scale, seed)
+        index = TimetableIndex.load(trains_db, stations_db)
+        dates = booking_window('2025-01-01', scale['dates'])
+        generate_occupancy(ticket_db, index.train_codes, dates, scale, seed)
+
+        results = {}
+        station_names = sorted(index.station_ids)
+        pairs = [(rng.sample(station_names, 3), rng.sample(station_names, 3)) for _ in range(operations)]
+
+        # 直达查询：内存索引
+        results['direct_search_index'] = measure(index.direct_routes, pairs)
+
+        # 直达查询：SQL 自连接
+        conn_trains = connect(trains_db, profile='query', readonly=True)
+
+        def direct_sql(start_stations, end_stations):
+            start_ids = index.resolve_stations(start_stations)
+            end_ids = index.resolve_stations(end_stations)
+            conn_trains.execute(f"""
+                SELECT s.train_code, s.station_id, s.station_no, e.station_id, e.station_no
+                FROM train_routes s JOIN train_routes e ON s.train_code = e.train_code
+                WHERE s.station_id IN ({','.join('?' * len(start_ids))})
+                  AND e.station_id IN ({','.join('?' * len(end_ids))})
+                  AND s.station_no < e.station_no
+                ORDER BY s.train_code
+            """, start_ids + end_ids).fetchall()
+
+        try:
+            results['direct_search_sql'] = measure(direct_sql, pairs)
+        finally:
+            conn_trains.close()
+
+        # 余票计数：位图库存
+        inventory = SeatInventory.from_db(ticket_db, total_seats=scale['seats'])
+        stops = scale['stops']
+        segments = []
+        for _ in range(operations):
+            start_no = rng.randint(1, stops - 1)
+            segments.append((rng.choice(index.train_codes), rng.choice(dates), start_no, rng.randint(start_no + 1, stops)))
+        results['count_available'] = measure(inventory.count_available, segments)
+
+        # 余票日历：一次扫描多个车次全部日期
+        conn_ticket = connect(ticket_db, profile='query', readonly=True)
+        try:
+            routes = [[(code, s, e) for code, _, s, e in rng.sample(segments, 10)] for _ in range(max(1, operations // 10))]
+            results['availability_calendar'] = measure(
+                lambda batch: availability_calendar(conn_ticket, batch, dates, scale['seats']),
+                [(batch,) for batch in routes]
+            )
+        finally:
+            conn_ticket.close()
+
+        # 购票与退票：选座 + 写 tickets/seat_occupancy，每次一个事务
+        allocator = SeatAllocator(inventory, 'best_fit')
+        conn = connect(ticket_db, profile='oltp')
+        booked = []
+
+        def book(train_code, travel_date, start_no, end_no):
+            seat = allocator.choose(train_code, travel_date, start_no, end_no)
+            if seat is None:
+                return
+            with conn:
+                ticket_id = conn.execute("""
+                    INSERT INTO tickets (user_id, train_code, from_station, from_station_no, to_station, to_station_no,
+                                         travel_date, seat_number)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (2, train_code, f"站{start_no}", start_no, f"站{end_no}", end_no, travel_date, seat)).lastrowid
+                record_occupancy(conn, train_code, travel_date, seat, start_no, end_no, ticket_id)
+            allocator.inventory.occupy(train_code, travel_date, seat, start_no, end_no)
+            booked.append((ticket_id, train_code, travel_date, seat, start_no, end_no))
+
+        def refund(ticket_id, train_code, travel_date, seat, start_no, end_no):
+            with conn:
+                conn.execute("UPDATE tickets SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                             (ticket_id,))
+                conn.execute("DELETE FROM seat_occupancy WHERE ticket_id = ?", (ticket_id,))
+            allocator.release(train_code, travel_date, seat, start_no, end_no)
+
+        try:
+            results['book'] = measure(book, segments)
+            results['refund'] = measure(refund, list(booked))
+        finally:
+            conn.close()
+    return results
+
+
+def save_baseline(results, path=BASELINE_PATH, scale=None):
+    """把基准结果连同规模写入 JSON 文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"scale": dict(DEFAULT_SCALE, **(scale or {})), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def load_baseline(path=BASELINE_PATH):
+    """读取 JSON 基准，不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_baseline(results, baseline, tolerance=0.5, metric='p95_us'):
+    """
+    与基准比较，返回回归列表 [(基准名, 基准值, 当前值), ...]
+    当前值超过 基准值 × (1 + tolerance) 视为回归
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None or metric not in previous:
+            continue
+        if current[metric] > previous[metric] * (1 + tolerance):
+            regressions.append((name, previous[metric], current[metric]))
+    return regressions
+
+
+def print_results(results):
+    """打印基准结果表"""
+    print("基准                  | 次数  | P50(微秒)  | P95(微秒)  | P99(微秒)  | 吞吐(次/秒)")
+    print("-" * 85)
+    for name, r in results.items():
+        print(f"{name:<21} | {r['ops']:<5} | {r['p50_us']:<10.2f} | {r['p95_us']:<10.2f} | {r['p99_us']:<10.2f} |"
+              f" {r['throughput']:.0f}")
+
+
+if __name__ == '__main__':
+    # 用法: python benchmark_suite.py [--save] [--check] [trains=1000 stops=20 ...]
+    scale = {}
+    for arg in sys.argv[1:]:
+        if '=' in arg:
+            key, _, value = arg.partition('=')
+            scale[key] = float(value) if key == 'occupancy' else int(value)
+    results = run_suite(scale)
+    print_results(results)
+
+    if '--check' in sys.argv:
+        baseline = load_baseline()
+        if baseline is None:
+            print(f"\n未找到基准文件 {BASELINE_PATH}，请先使用 --save 生成")
+            sys.exit(1)
+        if baseline.get("scale") != dict(DEFAULT_SCALE, **scale):
+            print("\n警告: 当前规模与基准规模不一致，比较结果仅供参考")
+        regressions = compare_baseline(results, baseline)
+        if regressions:
+            print("\n发现性能回归:")
+            for name, before, after in regressions:
+                print(f"  {name}: P95 {before:.2f} -> {after:.2f} 微秒")
+            sys.exit(1)
+        print("\n未发现性能回归")
+    if '--save' in sys.argv:
+        save_baseline(results, scale=scale)
+        print(f"\n基准已保存到 {BASELINE_PATH}")
@@ -0,0 +1,659 @@
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from database import connect, pooled
+from seat_allocator import STRATEGIES, record_occupancy
+from inventory_snapshot import (SnapshotInventory, changed_keys, ensure_change_log, high_water, restore_inventory,
+                                take_snapshot)
+from seat_inventory import DEFAULT_TOTAL_SEATS, SeatInventory, TrainDayInventory, booking_window
+
+# 与 server.js 的 ensureTicketTablesExist 建出的表结构一致
+TICKET_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS tickets (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, train_code VARCHAR(255) NOT NULL,
+        train_full_code VARCHAR(255), from_station VARCHAR(255) NOT NULL, from_station_no INTEGER NOT NULL,
+        to_station VARCHAR(255) NOT NULL, to_station_no INTEGER NOT NULL, travel_date DATE NOT NULL,
+        seat_number INTEGER NOT NULL, status VARCHAR(255) DEFAULT 'booked', changed_from INTEGER NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS seat_occupancy (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, train_code VARCHAR(255) NOT NULL, travel_date DATE NOT NULL,
+        seat_number INTEGER NOT NULL, start_station_no INTEGER NOT NULL, end_station_no INTEGER NOT NULL,
+        ticket_id INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (train_code, travel_date, seat_number, start_station_no, end_station_no)
+    )
+    """,
+    # 按车次+日期读取占用由唯一约束的索引覆盖；退票/改签按票ID删除占用
+    "CREATE INDEX IF NOT EXISTS idx_seat_occupancy_ticket ON seat_occupancy(ticket_id)",
+]
+
+# 一批最多合并的请求数
+DEFAULT_MAX_BATCH = 64
+
+# 分片库的车票ID = 分片内序号 × MAX_SHARDS + 分片号，各分片的车票ID互不重复
+MAX_SHARDS = 64
+
+
+def ensure_ticket_tables(conn):
+    """创建车票表和座位占用表（已存在时补上 changed_from 列）"""
+    for sql in TICKET_SCHEMA:
+        conn.execute(sql)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tickets)")}
+    if 'changed_from' not in columns:
+        conn.execute("ALTER TABLE tickets ADD COLUMN changed_from INTEGER NULL")
+
+
+def ensure_shard_meta(conn, shard_index):
+    """分片库的元数据表：记录分片号和车票序号（序号只增不减，车票迁出后也不会重复分配ID）"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS shard_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("INSERT OR IGNORE INTO shard_meta (key, value) VALUES ('ticket_seq', 0)")
+    conn.execute("INSERT INTO shard_meta (key, value) VALUES ('shard_index', ?) "
+                 "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (shard_index,))
+
+
+def next_ticket_id(conn, shard_index):
+    """分配分片内的下一个车票ID，由调用方的事务保护"""
+    seq = conn.execute("UPDATE shard_meta SET value = value + 1 WHERE key = 'ticket_seq' RETURNING value").fetchone()[0]
+    return seq * MAX_SHARDS + shard_index
+
+
+class TicketWriter:
+    """
+    ticket.db 的唯一写者：写请求排入 asyncio 队列，写任务每次取出队列中积压的全部请求（最多 max_batch 个），
+    交给专用写线程在一个事务中依次执行后一次提交（group commit）
+    每个请求在自己的 SAVEPOINT 中执行，失败只回滚自己，结果分别返回给各自的调用方
+    座位在内存占用矩阵上分配：批内修改的是矩阵副本，提交成功后才替换 inventory 中的矩阵，
+    读路径（余票）只读内存，不与写事务争锁
+    写者提交过的矩阵与数据库一致，之后直接复制使用，不再读取 seat_occupancy；
+    PRAGMA data_version 变化说明有其它连接（如 server.js）改过数据库：按变更日志（inventory_snapshot.py）
+    找出之后新增、删除或改写过占用记录的 (车次, 日期)，只重新读取这些矩阵；日志无法衔接时全部重新读取
+    查询余票前的 ensure_date 同样做这一检查，读路径不会一直停留在旧矩阵上
+    指定 snapshot_path 时启动从座位库存快照恢复（inventory_snapshot.py）：余票直接读映射的快照，
+    矩阵在第一次写入时才由快照重建；停止时更新快照
+    """
+
+    def __init__(self, ticket_db='ticket.db', inventory=None, strategy='first_fit', max_batch=DEFAULT_MAX_BATCH,
+                 shard_index=None, snapshot_path=None):
+        self.ticket_db = ticket_db
+        self.shard_index = shard_index
+        self.snapshot_path = snapshot_path
+        self.restore_stats = None
+        self.inventory = inventory if inventory is not None else SeatInventory()
+        self.strategy = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+        self.max_batch = max_batch
+        self.loaded_dates = set()
+        self.scans = 0
+        self._trusted = set()       # 内存矩阵与数据库一致的 (车次, 日期)
+        self._data_version = None
+        self._occupancy_hw = 0      # 内存矩阵已包含的 seat_occupancy 最大 id
+        self._change_hw = 0         # 内存矩阵已包含的变更日志序号
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ticket-writer')
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._conn = None
+
+    async def start(self):
+        """建表并启动写任务"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._ensure_tables)
+        if self.snapshot_path:
+            await loop.run_in_executor(self.executor, self._warm_start)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """处理完队列中已有的请求后停止写任务并关闭连接"""
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            self._task = None
+        if self.snapshot_path:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._save_snapshot)
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._close)
+        self.executor.shutdown()
+
+    async def submit(self, func, *args):
+        """
+        把写操作排入队列，等待所在批次提交后返回结果（异常原样抛出）
+        func 为本类的 book/refund/change，在写线程中以 func(conn, days, *args) 调用
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, future))
+        return await future
+
+    async def book_ticket(self, user_id, order, changed_from=None):
+        """购票，返回 (车票ID, 座位号)；没有空座时抛出 ValueError"""
+        return await self.submit(self.book, user_id, order, changed_from)
+
+    async def refund_ticket(self, user_id, ticket_id):
+        """退票；车票不存在或不属于该用户时抛出 ValueError"""
+        await self.submit(self.refund, user_id, ticket_id)
+
+    async def cancel_ticket(self, user_id, ticket_id, status='cancelled'):
+        """把有效车票标记为 status 并释放座位，返回是否找到该车票"""
+        return await self.submit(self.cancel, user_id, ticket_id, status)
+
+    async def change_ticket(self, user_id, ticket_id, order):
+        """改签，返回 (新车票ID, 座位号)"""
+        return await self.submit(self.change, user_id, ticket_id, order)
+
+    async def change_tickets(self, user_id, changes):
+        """批量改签（团体票），changes 为 [(车票ID, 订单), ...]；全部成功或全部不变，返回 [(新车票ID, 座位号), ...]"""
+        return await self.submit(self.change_many, user_id, changes)
+
+    def _find_ticket(self, user_id, ticket_id):
+        with pooled(self.ticket_db) as conn:
+            return conn.execute("SELECT 1 FROM tickets WHERE id = ? AND user_id = ? AND status = 'booked'",
+                                (ticket_id, user_id)).fetchone() is not None
+
+    async def has_ticket(self, user_id, ticket_id):
+        """该用户在本库中是否有这张有效车票（只读查询）"""
+        return await asyncio.to_thread(self._find_ticket, user_id, ticket_id)
+
+    def _user_tickets(self, user_id):
+        with pooled(self.ticket_db) as conn:
+            rows = conn.execute("""
+                SELECT id, train_code, from_station, to_station, travel_date, seat_number
+                FROM tickets WHERE user_id = ? AND status = 'booked'
+                ORDER BY travel_date, id
+            """, (user_id,)).fetchall()
+        keys = ('id', 'trainCode', 'fromStation', 'toStation', 'travelDate', 'seatNumber')
+        return [dict(zip(keys, row)) for row in rows]
+
+    async def user_tickets(self, user_id):
+        """用户的有效车票，按乘车日期排序（字段名与 server.js 的 /api/user/tickets 一致）"""
+        return await asyncio.to_thread(self._user_tickets, user_id)
+
+    def count_available_many(self, queries):
+        """按内存占用矩阵批量查询余票，queries 为 (train_code, travel_date, start_no, end_no) 序列"""
+        return self.inventory.count_available_many(queries)
+
+    async def ensure_date(self, travel_date):
+        """
+        查询余票前调用：先重新读取被其它连接改过的矩阵，再把尚未载入的日期整日载入内存
+        与写批次在同一线程中串行执行
+        """
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.load_date, travel_date)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                outcomes = await loop.run_in_executor(
+                    self.executor, self._run_batch, [(func, args) for func, args, _ in batch])
+            except Exception as e:
+                outcomes = [(False, e)] * len(batch)
+            for (_, _, future), (ok, value) in zip(batch, outcomes):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                self._queue.task_done()
+
+    def stats(self):
+        """批次统计"""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch": self.requests / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "scans": self.scans,
+        }
+
+    # 以下方法只在写线程中执行
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = connect(self.ticket_db, profile='oltp')
+            self._conn.isolation_level = None
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if isinstance(self.inventory, SnapshotInventory):
+            self.inventory.close()
+
+    def _ensure_tables(self):
+        conn = self._connection()
+        ensure_ticket_tables(conn)
+        ensure_change_log(conn)
+        if self.shard_index is not None:
+            ensure_shard_meta(conn, self.shard_index)
+
+    def _warm_start(self):
+        """
+        从快照恢复预售期内的库存（以映射为底层，只重建回放涉及的矩阵），之后查询余票不再按日期读取 seat_occupancy
+        恢复前先记下 data_version，高水位取自恢复所用的读事务：恢复期间其它连接的写入已包含在恢复的库存中
+        """
+        self._check_version(self._connection())
+        today = date.today().isoformat()
+        restored, self.restore_stats = restore_inventory(self.ticket_db, self.snapshot_path,
+                                                         self.inventory.total_seats, date_from=today, lazy=True)
+        self.inventory = restored
+        self._trusted.update(restored.trains)
+        self._occupancy_hw, self._change_hw = self.restore_stats['occupancy_hw'], self.restore_stats['change_hw']
+        self.loaded_dates.update(booking_window())
+
+    def _save_snapshot(self):
+        try:
+            take_snapshot(self.ticket_db, self.snapshot_path, self.inventory.total_seats,
+                          date_from=date.today().isoformat())
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"保存座位库存快照失败: {e}")
+
+    def _run_batch(self, batch):
+        """一个事务执行一批请求，返回与 batch 对齐的 [(是否成功, 结果或异常), ...]"""
+        conn = self._connection()
+        days = {}
+        outcomes = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._check_version(conn)
+            for func, args in batch:
+                conn.execute("SAVEPOINT request")
+                try:
+                    outcomes.append((True, func(conn, days, *args)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO request")
+                    outcomes.append((False, e))
+                conn.execute("RELEASE request")
+            # 持有写锁期间没有其它写入，本批的变化不必在下次检查时重新读取
+            self._occupancy_hw, self._change_hw = high_water(conn)
+            if not self.snapshot_path:
+                # 没有快照依赖变更日志时，已处理过的日志随本批一起清理；有快照时由 take_snapshot 清理
+                conn.execute("DELETE FROM seat_occupancy_changes WHERE id <= ?", (self._change_hw,))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self._publish(days)
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        return outcomes
+
+    def _check_version(self, conn):
+        """
+        其它连接提交过写入时，重新读取受影响的 (车次, 日期)：已载入日期的矩阵立即重读，其余的不再信任
+        变更日志无法衔接时全部不再信任，已载入的日期在下次 ensure_date 时整日重读
+        须在事务中调用：日志与高水位分两次读取，之间提交的写入会被高水位跳过
+        """
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        first = self._data_version is None
+        self._data_version = version
+        keys = None if first else changed_keys(conn, self._occupancy_hw, self._change_hw)
+        self._occupancy_hw, self._change_hw = high_water(conn)
+        if keys is None:
+            self._trusted.clear()
+            self.loaded_dates.clear()
+            if isinstance(self.inventory, SnapshotInventory):
+                self.inventory.detach()
+            return
+        fresh = {}
+        for key in keys:
+            self._trusted.discard(key)
+            if key[1] in self.loaded_dates:
+                fresh[key] = self._read_day(conn, key)
+            else:
+                self.inventory.forget(*key)
+        self._publish(fresh)
+
+    def _day(self, conn, days, key):
+        """
+        批内的车次当日占用矩阵（副本）：可信时复制内存矩阵，其次由快照重建（快照中未被遮盖的矩阵与数据库一致），
+        否则从 seat_occupancy 读取；同一批内再次用到时直接返回同一副本
+        """
+        day = days.get(key)
+        if day is None:
+            current = self.inventory.trains.get(key)
+            if key in self._trusted and current is not None:
+                day = days[key] = current.copy()
+                return day
+            if current is None:
+                day = self.inventory.base_day(*key)
+                if day is not None:
+                    days[key] = day
+                    return day
+            day = days[key] = self._read_day(conn, key)
+        return day
+
+    def _read_day(self, conn, key):
+        """从 seat_occupancy 读取一个车次当日的占用矩阵（按唯一约束的索引定位）"""
+        day = TrainDayInventory(self.inventory.total_seats)
+        for seat_number, start_no, end_no in conn.execute("""
+            SELECT seat_number, start_station_no, end_station_no FROM seat_occupancy
+            WHERE train_code = ? AND travel_date = ?
+        """, key):
+            day.occupy(int(seat_number), int(start_no), int(end_no))
+        self.scans += 1
+        return day
+
+    def _choose_seat(self, day, start_no, end_no):
+        free_mask = day.free_mask(start_no, end_no)
+        if not free_mask:
+            raise ValueError("该车次在所选区间已无可用座位")
+        return self.strategy(day, free_mask, start_no, end_no)
+
+    def _insert_ticket(self, conn, user_id, order, seat, changed_from=None):
+        ticket_id = None if self.shard_index is None else next_ticket_id(conn, self.shard_index)
+        ticket_id = conn.execute("""
+            INSERT INTO tickets (id, user_id, train_code, train_full_code, from_station, from_station_no,
+                                 to_station, to_station_no, travel_date, seat_number, status, changed_from)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'booked', ?)
+        """, (ticket_id, user_id, order['train_code'], order['train_full_code'], order['from_station'], order['from_no'],
+              order['to_station'], order['to_no'], order['travel_date'], seat, changed_from)).lastrowid
+        record_occupancy(conn, order['train_code'], order['travel_date'], seat,
+                         order['from_no'], order['to_no'], ticket_id)
+        return ticket_id
+
+    def _mark_ticket(self, conn, days, user_id, ticket_id, status):
+        """
+        把有效车票标记为 status（一条 UPDATE ... RETURNING，按主键定位）
+        返回 (占用矩阵, 座位号, 起始站序, 终止站序)，由调用方处理座位占用；无权或已失效时返回 None
+        """
+        ticket = conn.execute("""
+            UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ? AND status = 'booked'
+            RETURNING train_code, travel_date, seat_number, from_station_no, to_station_no
+        """, (status, ticket_id, user_id)).fetchone()
+        if ticket is None:
+            return None
+        day = self._day(conn, days, (ticket[0], ticket[1]))
+        return day, int(ticket[2]), int(ticket[3]), int(ticket[4])
+
+    def _cancel_ticket(self, conn, days, user_id, ticket_id, status):
+        """同 _mark_ticket，并删除其座位占用记录"""
+        cancelled = self._mark_ticket(conn, days, user_id, ticket_id, status)
+        if cancelled is not None:
+            conn.execute("DELETE FROM seat_occupancy WHERE ticket_id = ?", (ticket_id,))
+        return cancelled
+
+    def _publish(self, days):
+        """提交成功后替换内存中的占用矩阵（整体替换，读路径不会看到写了一半的矩阵）"""
+        for key, day in days.items():
+            self.inventory.trains[key] = day
+        self._trusted.update(days)
+
+    def load_date(self, travel_date):
+        """
+        在一个读事务中检查其它连接的写入并载入日期：变更日志、高水位和重读的矩阵来自同一时刻的数据库，
+        检查期间提交的写入不会被高水位跳过
+        """
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            self._check_version(conn)
+            if travel_date not in self.loaded_dates:
+                fresh = SeatInventory(self.inventory.total_seats)
+                fresh.load(conn, travel_date=travel_date)
+                self.inventory.replace_date(travel_date, fresh.trains)
+                self._trusted.update(fresh.trains)
+                self.loaded_dates.add(travel_date)
+        finally:
+            conn.execute("COMMIT")
+
+    # 批内操作：SQL 全部成功后才修改内存矩阵，失败时 SAVEPOINT 回滚后内存矩阵保持不变
+
+    def book(self, conn, days, user_id, order, changed_from=None):
+        """购票：分配座位并写入车票和占用记录，返回 (车票ID, 座位号)"""
+        day = self._day(conn, days, (order['train_code'], order['travel_date']))
+        seat = self._choose_seat(day, order['from_no'], order['to_no'])
+        ticket_id = self._insert_ticket(conn, user_id, order, seat, changed_from)
+        day.occupy(seat, order['from_no'], order['to_no'])
+        return ticket_id, seat
+
+    def cancel(self, conn, days, user_id, ticket_id, status='cancelled'):
+        """车票标记为 status 并释放座位，返回是否找到该车票"""
+        cancelled = self._cancel_ticket(conn, days, user_id, ticket_id, status)
+        if cancelled is None:
+            return False
+        day, seat, start_no, end_no = cancelled
+        day.release(seat, start_no, end_no)
+        return True
+
+    def refund(self, conn, days, user_id, ticket_id):
+        """退票：车票标记为 cancelled 并释放座位"""
+        if not self.cancel(conn, days, user_id, ticket_id):
+            raise ValueError("未找到有效车票或无权退票")
+
+    def _change_one(self, conn, days, user_id, ticket_id, order, undo):
+        """
+        改签一张票：原车票标记为 changed，在目标矩阵上预留座位、在原矩阵上释放座位，
+        座位占用记录原地改写为新车票（一条 UPDATE，按票ID索引定位）
+        内存修改的逆操作记入 undo，失败时由调用方按逆序撤销
+        """
+        marked = self._mark_ticket(conn, days, user_id, ticket_id, 'changed')
+        if marked is None:
+            raise ValueError("未找到有效车票或无权改签")
+        old_day, old_seat, old_start, old_end = marked
+        day = self._day(conn, days, (order['train_code'], order['travel_date']))
+        # 先释放原座位，新区间可以复用自己原来的座位
+        old_day.release(old_seat, old_start, old_end)
+        undo.append(lambda: old_day.occupy(old_seat, old_start, old_end))
+        seat = self._choose_seat(day, order['from_no'], order['to_no'])
+        day.occupy(seat, order['from_no'], order['to_no'])
+        undo.append(lambda: day.release(seat, order['from_no'], order['to_no']))
+
+        ticket_id_new = None if self.shard_index is None else next_ticket_id(conn, self.shard_index)
+        new_id = conn.execute("""
+            INSERT INTO tickets (id, user_id, train_code, train_full_code, from_station, from_station_no,
+                                 to_station, to_station_no, travel_date, seat_number, status, changed_from)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'booked', ?)
+        """, (ticket_id_new, user_id, order['train_code'], order['train_full_code'], order['from_station'],
+              order['from_no'], order['to_station'], order['to_no'], order['travel_date'], seat,
+              ticket_id)).lastrowid
+        moved = conn.execute("""
+            UPDATE seat_occupancy
+            SET train_code = ?, travel_date = ?, seat_number = ?, start_station_no = ?, end_station_no = ?,
+                ticket_id = ?
+            WHERE ticket_id = ?
+        """, (order['train_code'], order['travel_date'], seat, order['from_no'], order['to_no'],
+              new_id, ticket_id)).rowcount
+        if not moved:
+            record_occupancy(conn, order['train_code'], order['travel_date'], seat,
+                             order['from_no'], order['to_no'], new_id)
+        return new_id, seat
+
+    def change(self, conn, days, user_id, ticket_id, order):
+        """改签：原车票标记为 changed，在新车次上分配座位（可复用自己原来的区间），返回 (新车票ID, 座位号)"""
+        return self.change_many(conn, days, user_id, [(ticket_id, order)])[0]
+
+    def change_many(self, conn, days, user_id, changes):
+        """
+        批量改签：在同一个 SAVEPOINT 中依次改签，任一张失败时数据库回滚、内存矩阵按逆序撤销，全部保持原状
+        列车停运时整批改签到其它车次，每个 (车次, 日期) 的占用矩阵在批内只取一次
+        """
+        undo = []
+        try:
+            return [self._change_one(conn, days, user_id, ticket_id, order, undo) for ticket_id, order in changes]
+        except BaseException:
+            for step in reversed(undo):
+                step()
+            raise
+
+
+def book_per_request(conn, user_id, order, total_seats=DEFAULT_TOTAL_SEATS):
+    """
+    server.js 现有做法：每个请求一个事务，读出该车次当日全部占用记录，取第一个空座后插入
+    用于负载测试对比；没有空座时返回 None
+    """
+    conn.execute("BEGIN")
+    try:
+        day = TrainDayInventory(total_seats)
+        for seat_number, start_no, end_no in conn.execute("""
+            SELECT seat_number, start_station_no, end_station_no FROM seat_occupancy
+            WHERE train_code = ? AND travel_date = ?
+        """, (order['train_code'], order['travel_date'])):
+            day.occupy(seat_number, start_no, end_no)
+        seat = day.first_free_seat(order['from_no'], order['to_no'])
+        if seat is None:
+            conn.execute("ROLLBACK")
+            return None
+        ticket_id = conn.execute("""
+            INSERT INTO tickets (user_id, train_code, train_full_code, from_station, from_station_no,
+                                 to_station, to_station_no, travel_date, seat_number, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'booked')
+        """, (user_id, order['train_code'], order['train_full_code'], order['from_station'], order['from_no'],
+              order['to_station'], order['to_no'], order['travel_date'], seat)).lastrowid
+        record_occupancy(conn, order['train_code'], order['travel_date'], seat,
+                         order['from_no'], order['to_no'], ticket_id)
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    return ticket_id, seat
+
+
+def generate_orders(count, trains=20, stops=10, days=3, seed=1):
+    """生成随机购票请求（订单 dict，格式同 api_service.parse_order 的返回值）"""
+    rng = random.Random(seed)
+    start = date.today() + timedelta(days=1)
+    orders = []
+    for _ in range(count):
+        start_no = rng.randint(1, stops - 1)
+        end_no = rng.randint(start_no + 1, stops)
+        train_code = f"G{rng.randint(1, trains)}"
+        orders.append({
+            "train_code": train_code,
+            "train_full_code": train_code,
+            "from_station": f"站{start_no}",
+            "to_station": f"站{end_no}",
+            "from_no": start_no,
+            "to_no": end_no,
+            "travel_date": (start + timedelta(days=rng.randrange(days))).isoformat(),
+        })
+    return orders
+
+
+def _new_ticket_db(path):
+    conn = connect(path, profile='oltp')
+    ensure_ticket_tables(conn)
+    conn.commit()
+    conn.close()
+
+
+def load_test_per_request(ticket_db, orders, concurrency=32, busy_timeout=None):
+    """
+    每个请求一个事务、多个工作线程并发写（模拟 server.js）
+    busy_timeout 为 None 时沿用 oltp 配置档；设为 0 与 node-sqlite3 默认行为一致（遇锁立即报错）
+    """
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+    results = {"sold": 0, "sold_out": 0, "busy": 0}
+
+    def worker(item):
+        user_id, order = item
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = connect(ticket_db, profile='oltp', check_same_thread=False)
+            conn.isolation_level = None
+            if busy_timeout is not None:
+                conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+            with lock:
+                connections.append(conn)
+        try:
+            outcome = 'sold' if book_per_request(conn, user_id, order) else 'sold_out'
+        except sqlite3.OperationalError:
+            outcome = 'busy'
+        with lock:
+            results[outcome] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, enumerate(orders)))
+    results["seconds"] = time.perf_counter() - start
+    for conn in connections:
+        conn.close()
+    return results
+
+
+async def _load_test_group_commit(ticket_db, orders, concurrency, max_batch):
+    writer = TicketWriter(ticket_db, max_batch=max_batch)
+    await writer.start()
+    results = {"sold": 0, "sold_out": 0, "busy": 0}
+    pending = iter(enumerate(orders))
+
+    async def client():
+        for user_id, order in pending:
+            try:
+                await writer.submit(writer.book, user_id, order)
+                results["sold"] += 1
+            except ValueError:
+                results["sold_out"] += 1
+            except sqlite3.OperationalError:
+                results["busy"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    results["seconds"] = time.perf_counter() - start
+    await writer.stop()
+    results.update(writer.stats())
+    return results
+
+
+def load_test_group_commit(ticket_db, orders, concurrency=32, max_batch=DEFAULT_MAX_BATCH):
+    """concurrency 个并发客户端经由 TicketWriter 购票（批量提交）"""
+    return asyncio.run(_load_test_group_commit(ticket_db, orders, concurrency, max_batch))
+
+
+def benchmark_booking(requests=2000, concurrency=32, max_batch=DEFAULT_MAX_BATCH, seed=1, workdir=None):
+    """
+    并发购票负载测试：同一组请求分别用每请求一个事务和单写者批量提交执行，各自使用全新的 ticket.db
+    返回 {"per_request": {...}, "per_request_no_wait": {...}, "group_commit": {...}}
+    throughput 为每秒正常处理（出票或确认无票）的请求数，因锁冲突失败的请求不计入
+    """
+    orders = generate_orders(requests, seed=seed)
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        runs = (
+            ('per_request', lambda path: load_test_per_request(path, orders, concurrency)),
+            ('per_request_no_wait', lambda path: load_test_per_request(path, orders, concurrency, busy_timeout=0)),
+            ('group_commit', lambda path: load_test_group_commit(path, orders, concurrency, max_batch)),
+        )
+        for name, run in runs:
+            path = os.path.join(tmpdir, f'{name}.db')
+            _new_ticket_db(path)
+            r = run(path)
+            r["throughput"] = (r["sold"] + r["sold_out"]) / r["seconds"]
+            results[name] = r
+    return results
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    print(f"并发购票负载测试: {count} 个请求，并发 {concurrency}")
+    print("方式                 | 耗时(秒) | 有效吞吐(请求/秒) | 成功 | 无票 | 锁冲突失败 | 平均批大小")
+    print("-" * 90)
+    for name, r in benchmark_booking(count, concurrency).items():
+        print(f"{name:<20} | {r['seconds']:<8.3f} | {r['throughput']:<17.0f} | {r['sold']:<4} |"
+              f" {r['sold_out']:<4} | {r['busy']:<10} | {r.get('avg_batch', 1):.1f}")
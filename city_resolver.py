@@ -0,0 +1,79 @@
+import os
+import threading
+
+from database import connect, file_signature
+from station_search import CITY_ALIASES
+
+
+class CityResolver:
+    """城市 -> 车站解析：启动时从 stations.db 一次性加载，之后全部是字典查找"""
+
+    def __init__(self):
+        self.city_stations = {}     # 城市 -> [站名, ...]（按车站ID排序）
+        self.station_ids = {}       # 站名 -> 车站ID
+        self.station_city = {}      # 站名 -> 城市
+        self.signature = None
+
+    @classmethod
+    def load(cls, stations_db='stations.db'):
+        """从 stations.db 的 stations(id, name, city) 构建映射"""
+        resolver = cls()
+        resolver.signature = file_signature(stations_db)
+        conn = connect(stations_db, profile='query', readonly=True)
+        try:
+            for station_id, name, city in conn.execute("SELECT id, name, city FROM stations ORDER BY id"):
+                city = city or name
+                resolver.station_ids[name] = station_id
+                resolver.station_city[name] = city
+                resolver.city_stations.setdefault(city, []).append(name)
+        finally:
+            conn.close()
+        return resolver
+
+    def canonical_city(self, name):
+        """城市名、别名或站名 -> 标准城市名，无法识别时返回 None"""
+        name = (name or '').strip()
+        if name in self.city_stations:
+            return name
+        city = CITY_ALIASES.get(name)
+        if city in self.city_stations:
+            return city
+        return self.station_city.get(name)
+
+    def resolve(self, name):
+        """
+        城市名/别名 -> 该城市全部站名；不是城市但恰好是站名时只返回该站
+        无法识别时返回空列表
+        """
+        name = (name or '').strip()
+        stations = self.city_stations.get(name) or self.city_stations.get(CITY_ALIASES.get(name))
+        if stations:
+            return list(stations)
+        if name in self.station_ids:
+            return [name]
+        return []
+
+    def resolve_ids(self, name):
+        """同 resolve，返回 [(站名, 车站ID), ...]"""
+        return [(station, self.station_ids[station]) for station in self.resolve(name)]
+
+    def cities(self):
+        """全部城市名"""
+        return sorted(self.city_stations)
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_resolver(stations_db='stations.db'):
+    """获取进程内共享的解析器；stations.db（含 WAL）变化后自动重新加载"""
+    key = os.path.abspath(stations_db)
+    resolver = _resolvers.get(key)
+    if resolver is not None and resolver.signature == file_signature(stations_db):
+        return resolver
+    with _resolvers_lock:
+        resolver = _resolvers.get(key)
+        if resolver is None or resolver.signature != file_signature(stations_db):
+            resolver = _resolvers[key] = CityResolver.load(stations_db)
+        return resolver
@@ -0,0 +1,140 @@
+import sqlite3
+import sys
+import time
+
+from database import bump_timetable_version, connect
+
+# 数据清洗规则：每条规则是 train_shape 临时表上的条件
+# delete 为默认处理方式；train_routes 只保存主要城市经停站，站序不连续是常态，因此只报告不删除
+HYGIENE_RULES = {
+    'single_station': {
+        'desc': '只有一个站点的车次',
+        'where': 'stops = 1',
+        'delete': True,
+    },
+    'single_city': {
+        'desc': '所有站点都在同一城市的车次',
+        'where': 'stops > 1 AND cities <= 1',
+        'delete': False,
+    },
+    'non_contiguous': {
+        'desc': '站序不连续的车次',
+        'where': 'stops > 1 AND max_no - min_no + 1 != stops',
+        'delete': False,
+    },
+    'missing_times': {
+        'desc': '没有任何到发时刻的车次',
+        'where': 'timed = 0',
+        'delete': False,
+    },
+}
+
+
+def build_train_shape(conn):
+    """单次聚合 train_routes，得到每个车次的站点数、站序范围、城市数和有时刻的站点数"""
+    conn.execute("DROP TABLE IF EXISTS temp.train_shape")
+    conn.execute("""
+        CREATE TEMP TABLE train_shape AS
+        SELECT train_code,
+               COUNT(*) AS stops,
+               MIN(station_no) AS min_no,
+               MAX(station_no) AS max_no,
+               COUNT(DISTINCT city) AS cities,
+               SUM(arrive_time IS NOT NULL OR depart_time IS NOT NULL) AS timed
+        FROM train_routes
+        GROUP BY train_code
+    """)
+    conn.execute("CREATE INDEX temp.idx_train_shape_code ON train_shape(train_code)")
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM temp.train_shape").fetchone()[0]
+
+
+def delete_trains(conn, train_codes, batch_size=500):
+    """按车次分批删除 train_routes 记录，每批一个短事务，返回删除的行数"""
+    deleted = 0
+    for i in range(0, len(train_codes), batch_size):
+        batch = train_codes[i:i + batch_size]
+        placeholders = ','.join('?' * len(batch))
+        deleted += conn.execute(f"DELETE FROM train_routes WHERE train_code IN ({placeholders})", batch).rowcount
+        conn.execute(f"DELETE FROM temp.train_shape WHERE train_code IN ({placeholders})", batch)
+        conn.commit()
+    return deleted
+
+
+def run_hygiene(db_path='trains.db', rules=None, delete=None, dry_run=False, batch_size=500):
+    """
+    依次执行清洗规则，返回 {规则名: {"trains", "rows", "deleted", "seconds", "examples"}}
+    delete 为需要删除的规则名集合，None 表示按规则默认；dry_run=True 时只读
+    """
+    rules = list(rules or HYGIENE_RULES)
+    if delete is None:
+        delete = {name for name in rules if HYGIENE_RULES[name]['delete']}
+    # 试运行只读打开，临时表写在 temp 库中，不会修改 trains.db
+    conn = connect(db_path, profile='query' if dry_run else 'etl', readonly=dry_run)
+    report = {}
+    total_deleted = 0
+    try:
+        start = time.perf_counter()
+        trains = build_train_shape(conn)
+        report['_shape'] = {"trains": trains, "seconds": time.perf_counter() - start}
+
+        for name in rules:
+            rule = HYGIENE_RULES[name]
+            start = time.perf_counter()
+            matched = conn.execute(f"""
+                SELECT train_code, stops FROM temp.train_shape WHERE {rule['where']} ORDER BY train_code
+            """).fetchall()
+            result = {
+                "trains": len(matched),
+                "rows": sum(stops for _, stops in matched),
+                "deleted": 0,
+                "examples": [code for code, _ in matched[:5]],
+            }
+            if matched and name in delete and not dry_run:
+                result["deleted"] = delete_trains(conn, [code for code, _ in matched], batch_size)
+                total_deleted += result["deleted"]
+            result["seconds"] = time.perf_counter() - start
+            report[name] = result
+
+        if total_deleted:
+            bump_timetable_version(conn)
+            conn.commit()
+        return report
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.train_shape")
+        conn.close()
+
+
+def print_report(report, delete=()):
+    """打印清洗报告"""
+    shape = report.get('_shape')
+    if shape:
+        print(f"统计 {shape['trains']} 个车次的形状，耗时 {shape['seconds'] * 1000:.1f} 毫秒")
+    for name, result in report.items():
+        if name == '_shape':
+            continue
+        action = f"已删除 {result['deleted']} 行" if result['deleted'] else ("待删除" if name in delete else "仅报告")
+        examples = '、'.join(result['examples'])
+        print(f"{HYGIENE_RULES[name]['desc']}: {result['trains']} 个车次 / {result['rows']} 行，{action}，"
+              f"耗时 {result['seconds'] * 1000:.1f} 毫秒" + (f"（如 {examples}）" if examples else ""))
+
+
+if __name__ == '__main__':
+    # 用法: python data_hygiene.py [--dry-run] [--delete=single_station,single_city]
+    delete = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--delete='):
+            delete = {name for name in arg.split('=', 1)[1].split(',') if name}
+            unknown = delete - set(HYGIENE_RULES)
+            if unknown:
+                print(f"未知规则: {', '.join(sorted(unknown))}")
+                sys.exit(1)
+    dry_run = '--dry-run' in sys.argv
+    try:
+        report = run_hygiene(delete=delete, dry_run=dry_run)
+    except sqlite3.Error as e:
+        print(f"数据库错误: {e}")
+        sys.exit(1)
+    print_report(report, delete if delete is not None else {n for n, r in HYGIENE_RULES.items() if r['delete']})
+    if dry_run:
+        print("\n试运行模式，未修改数据库")
@@ -0,0 +1,238 @@
+import os
+import queue
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# PRAGMA 配置档：所有脚本统一在这里调优
+# cache_size 为负数时单位是 KiB；mmap_size 单位是字节
+PRAGMA_PROFILES = {
+    # sqlite3 默认设置，仅用于对比
+    'default': {},
+    # 只读查询：大缓存 + 内存映射，临时表放内存
+    'query': {
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+    # 批量导入/清洗：WAL + NORMAL 同步，减少 fsync；分批提交时与其它写者冲突则等待
+    'etl': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -131072,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+    # 在线读写（购票）：WAL 让读不阻塞写，写冲突时等待而不是立即报 SQLITE_BUSY
+    'oltp': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -32768,
+        'mmap_size': 134217728,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# 只读连接不能修改日志模式和同步方式
+_WRITE_ONLY_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def apply_profile(conn, profile='default', readonly=False):
+    """对连接应用 PRAGMA 配置档"""
+    for name, value in PRAGMA_PROFILES[profile].items():
+        if readonly and name in _WRITE_ONLY_PRAGMAS:
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def connect(path, profile='default', readonly=False, check_same_thread=True):
+    """
+    创建按配置档调优的连接
+    readonly=True 时使用 URI 只读模式打开，查询路径不会意外写库或持有写锁
+    """
+    if readonly:
+        uri = f"file:{os.path.abspath(path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+    return apply_profile(conn, profile, readonly)
+
+
+def file_signature(path):
+    """数据库文件签名：主文件和 WAL 文件的 (修改时间, 大小)，任一变化即视为数据已更新"""
+    signature = []
+    for name in (path, path + '-wal'):
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def bump_timetable_version(conn):
+    """
+    时刻表版本号加一，ETL 脚本在提交写入前调用（与数据修改在同一事务中）
+    查询结果缓存以版本号判断是否失效
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS timetable_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO timetable_meta (key, value) VALUES ('timetable_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
+
+
+def read_timetable_version(conn):
+    """读取时刻表版本号，从未写入过时返回 0"""
+    try:
+        row = conn.execute("SELECT value FROM timetable_meta WHERE key = 'timetable_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+class ConnectionPool:
+    """单个数据库文件的线程安全连接池，连接在归还后保持打开（热连接）"""
+
+    def __init__(self, path, profile='default', readonly=False, max_size=8):
+        self.path = path
+        self.profile = profile
+        self.readonly = readonly
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("连接池已关闭")
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return connect(self.path, self.profile, self.readonly, check_same_thread=False)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"获取 {self.path} 连接超时") from None
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._closed:
+                conn.close()
+                self._created -= 1
+                return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, timeout=30):
+        """借出一个连接，退出时自动归还（未提交的事务会回滚）"""
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """关闭所有空闲连接，借出的连接在归还时关闭"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path, profile='query', readonly=True, max_size=8):
+    """按 (文件, 配置档, 只读) 获取进程内共享的连接池"""
+    key = (os.path.abspath(path), profile, readonly)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = _pools[key] = ConnectionPool(path, profile, readonly, max_size)
+        return pool
+
+
+@contextmanager
+def pooled(path, profile='query', readonly=True):
+    """从共享连接池借出连接的快捷方式"""
+    with get_pool(path, profile, readonly).connection() as conn:
+        yield conn
+
+
+def close_all():
+    """关闭所有共享连接池"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def benchmark_profiles(path, sql, params=(), profiles=('default', 'query'), repeat=50):
+    """在同一个只读查询上对比各配置档的耗时（秒）"""
+    results = {}
+    for profile in profiles:
+        conn = connect(path, profile, readonly=True)
+        try:
+            conn.execute(sql, params).fetchall()  # 预热
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                timings.append(time.perf_counter() - start)
+        finally:
+            conn.close()
+        timings.sort()
+        results[profile] = {
+            "p50": statistics.median(timings),
+            "p95": timings[int(len(timings) * 0.95)],
+        }
+    return results
+
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'trains.db'
+    query = sys.argv[2] if len(sys.argv) > 2 else """
+        SELECT a.train_code, a.station_no, b.station_no
+        FROM train_routes a JOIN train_routes b ON a.train_code = b.train_code
+        WHERE a.city = '北京' AND b.city = '上海' AND a.station_no < b.station_no
+    """
+    print(f"对比 {db_path} 上的 PRAGMA 配置档:")
+    for name, r in benchmark_profiles(db_path, query, profiles=('default', 'query', 'etl', 'oltp')).items():
+        print(f"{name:<8} P50 {r['p50'] * 1000:.3f} 毫秒  P95 {r['p95'] * 1000:.3f} 毫秒")
@@ -0,0 +1,474 @@
+import re
+import sqlite3
+import sys
+
+from database import connect
+from route_search import build_route_query
+from time_columns import MINUTE_INDEXES
+
+# 带时间窗、车次类型、时长排序和翻页游标的直达查询
+_FILTERED_ROUTES_SQL, _FILTERED_ROUTES_PARAMS = build_route_query(
+    [1, 2], [3, 4], depart_window=(840, 1439), max_minutes=600, classes=['G', 'D'],
+    sort='duration', cursor=[300, 'G1', 1, 3], limit=30)
+
+# 实际查询负载：与 server.js / scripts / ETL 中的语句保持一致
+# hot=True 的查询在在线路径或逐车次循环中执行，不允许退化为全表扫描
+WORKLOAD = {
+    'trains.db': [
+        {
+            'name': 'route_self_join',
+            'source': 'server.js /api/routes/direct (无筛选条件)',
+            'hot': True,
+            'sql': """
+                SELECT DISTINCT a.train_code, a.train_full_code, a.station_id, b.station_id,
+                       a.station_no, b.station_no, a.run_time
+                FROM train_routes a
+                JOIN train_routes b ON a.train_code = b.train_code
+                WHERE a.station_id IN (?, ?) AND b.station_id IN (?, ?)
+                AND a.station_no < b.station_no
+                ORDER BY a.train_code
+                LIMIT 30
+            """,
+            'params': (1, 2, 3, 4),
+        },
+        {
+            'name': 'direct_routes',
+            'source': 'scripts/query_routes.py find_direct_routes',
+            'hot': True,
+            'sql': """
+                WITH start_routes AS (
+                    SELECT DISTINCT train_code, station_id, station_no
+                    FROM train_routes
+                    WHERE station_id IN (?, ?)
+                ),
+                end_routes AS (
+                    SELECT DISTINCT train_code, station_id, station_no
+                    FROM train_routes
+                    WHERE station_id IN (?, ?)
+                )
+                SELECT DISTINCT s.train_code, s.station_id, e.station_id, s.station_no, e.station_no
+                FROM start_routes s
+                JOIN end_routes e ON s.train_code = e.train_code
+                WHERE s.station_no < e.station_no
+                ORDER BY s.train_code
+            """,
+            'params': (1, 2, 3, 4),
+        },
+        {
+            'name': 'run_time_update',
+            'source': 'update_train_times.py apply_run_times',
+            'hot': True,
+            # UPDATE ... FROM 按车次逐行连接 train_routes，暂存表以常量子查询代替
+            'sql': """
+                UPDATE train_routes
+                SET run_time = latest.run_time
+                FROM (SELECT ? AS train_code, ? AS run_time) AS latest
+                WHERE train_routes.train_code = latest.train_code
+                AND train_routes.run_time IS NOT latest.run_time
+            """,
+            'params': ('G1', '10:00'),
+        },
+        {
+            'name': 'delete_trains',
+            'source': 'data_hygiene.py delete_trains',
+            'hot': True,
+            'sql': "DELETE FROM train_routes WHERE train_code IN (?, ?)",
+            'params': ('G1', 'G2'),
+        },
+        {
+            'name': 'departures_window',
+            'source': 'time_columns.py departures',
+            'hot': True,
+            'sql': """
+                SELECT train_code, station_id, station_no, depart_min, depart_day
+                FROM train_routes
+                WHERE station_id IN (?, ?) AND depart_min BETWEEN ? AND ?
+                ORDER BY depart_min, train_code
+            """,
+            'params': (1, 2, 840, 1439),
+        },
+        {
+            'name': 'filtered_routes',
+            'source': 'server.js /api/routes/direct, route_search.py',
+            'hot': True,
+            'sql': _FILTERED_ROUTES_SQL,
+            'params': tuple(_FILTERED_ROUTES_PARAMS),
+        },
+        {
+            'name': 'trains_by_run_time',
+            'source': 'time_columns.py trains_by_run_time',
+            'hot': True,
+            'sql': """
+                SELECT DISTINCT run_minutes, train_code
+                FROM train_routes
+                WHERE run_minutes <= ?
+                ORDER BY run_minutes, train_code
+                LIMIT ?
+            """,
+            'params': (600, 20),
+        },
+        {
+            'name': 'station_trains',
+            'source': 'timetable_index.py load',
+            'hot': False,
+            'sql': """
+                SELECT station_id, train_code, station_no
+                FROM train_routes
+                WHERE station_id IS NOT NULL AND station_no IS NOT NULL
+                ORDER BY station_id, train_code
+            """,
+            'params': (),
+        },
+        {
+            'name': 'train_stops',
+            'source': 'traindata.py / journey_planner.py',
+            'hot': False,
+            'sql': "SELECT train_code, station_no, city FROM train_routes ORDER BY train_code, station_no",
+            'params': (),
+        },
+    ],
+    'ticket.db': [
+        {
+            'name': 'route_availability',
+            'source': 'server.js /api/routes/direct',
+            'hot': True,
+            'sql': """
+                SELECT train_code, seat_number, start_station_no, end_station_no
+                FROM seat_occupancy
+                WHERE train_code IN (?, ?) AND travel_date = ?
+            """,
+            'params': ('G1', 'G2', '2025-01-01'),
+        },
+        {
+            'name': 'book_seats',
+            'source': 'server.js POST /api/tickets, /api/tickets/change',
+            'hot': True,
+            'sql': """
+                SELECT seat_number, start_station_no, end_station_no
+                FROM seat_occupancy
+                WHERE train_code = ? AND travel_date = ?
+            """,
+            'params': ('G1', '2025-01-01'),
+        },
+        {
+            'name': 'release_seat',
+            'source': 'server.js /api/tickets/refund, /api/tickets/change',
+            'hot': True,
+            'sql': "DELETE FROM seat_occupancy WHERE ticket_id = ?",
+            'params': (1,),
+        },
+        {
+            'name': 'move_seat',
+            'source': 'booking_queue.py change',
+            'hot': True,
+            'sql': """
+                UPDATE seat_occupancy
+                SET train_code = ?, travel_date = ?, seat_number = ?, start_station_no = ?, end_station_no = ?,
+                    ticket_id = ?
+                WHERE ticket_id = ?
+            """,
+            'params': ('G2', '2025-01-02', 1, 1, 3, 2, 1),
+        },
+        {
+            'name': 'ticket_by_id',
+            'source': 'server.js /api/tickets/refund, /api/tickets/change',
+            'hot': True,
+            'sql': "SELECT * FROM tickets WHERE id = ? AND user_id = ? AND status = ?",
+            'params': (1, 1, 'booked'),
+        },
+        {
+            'name': 'user_tickets',
+            'source': 'server.js /api/user/tickets',
+            'hot': True,
+            'sql': """
+                SELECT id, train_code, from_station, to_station, travel_date, seat_number
+                FROM tickets
+                WHERE user_id = ? AND status = ?
+            """,
+            'params': (1, 'booked'),
+        },
+        # rebalance 按 (车次, 日期) 逐组统计、复制、删除，属于逐车次循环
+        {
+            'name': 'rebalance_count_tickets',
+            'source': 'ticket_shards.py rebalance',
+            'hot': True,
+            'sql': "SELECT COUNT(*) FROM tickets WHERE train_code = ? AND travel_date = ?",
+            'params': ('G1', '2025-01-01'),
+        },
+        {
+            'name': 'rebalance_copy_tickets',
+            'source': 'ticket_shards.py _move_key',
+            'hot': True,
+            'sql': "SELECT * FROM tickets WHERE train_code = ? AND travel_date = ?",
+            'params': ('G1', '2025-01-01'),
+        },
+        {
+            'name': 'rebalance_delete_tickets',
+            'source': 'ticket_shards.py _move_key',
+            'hot': True,
+            'sql': "DELETE FROM tickets WHERE train_code = ? AND travel_date = ?",
+            'params': ('G1', '2025-01-01'),
+        },
+        {
+            'name': 'rebalance_delete_occupancy',
+            'source': 'ticket_shards.py _move_key',
+            'hot': True,
+            'sql': "DELETE FROM seat_occupancy WHERE train_code = ? AND travel_date = ?",
+            'params': ('G1', '2025-01-01'),
+        },
+        {
+            'name': 'occupancy_range',
+            'source': 'seat_inventory.py load, server.js /api/routes/calendar',
+            'hot': False,
+            'sql': """
+                SELECT train_code, travel_date, seat_number, start_station_no, end_station_no
+                FROM seat_occupancy
+                WHERE travel_date >= ? AND travel_date <= ?
+            """,
+            'params': ('2025-01-01', '2025-01-31'),
+        },
+    ],
+}
+
+# 现有索引之外的候选索引
+CANDIDATE_INDEXES = {
+    'trains.db': [
+        # 按车站查车次并直接取站序和车次，自连接两侧都不回表
+        "CREATE INDEX IF NOT EXISTS idx_route_station ON train_routes(station_id, station_no, train_code)",
+    ] + MINUTE_INDEXES,
+    'ticket.db': [
+        # 退票/改签按票ID释放座位
+        "CREATE INDEX IF NOT EXISTS idx_seat_occupancy_ticket ON seat_occupancy(ticket_id)",
+        # 分片迁移按 (车次, 日期) 读取和删除车票
+        "CREATE INDEX IF NOT EXISTS idx_tickets_train_date ON tickets(train_code, travel_date)",
+    ],
+}
+
+# 计划代价：在线查询全表扫描不可接受，其余每项为一次回表或临时排序
+# 索引每多用上一个条件（如时间范围），扫描的区间更窄，代价略减
+SCAN_COST = 1000
+LOOKUP_COST = 1
+TEMP_BTREE_COST = 1
+CONSTRAINT_BONUS = 0.1
+
+_SQL_KEYWORDS = {
+    'WHERE', 'JOIN', 'ON', 'SET', 'ORDER', 'GROUP', 'LIMIT', 'INDEXED', 'NOT', 'LEFT',
+    'INNER', 'CROSS', 'USING', 'UNION', 'HAVING', 'AS',
+}
+
+
+def base_table_names(sql, tables):
+    """SQL 中引用的实际表名及其别名（CTE 和子查询不计）"""
+    names = set()
+    for table, alias in re.findall(r'(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.I):
+        if table not in tables:
+            continue
+        names.add(table)
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            names.add(alias)
+    return names
+
+
+def explain(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN 的明细行"""
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def full_scans(details, names):
+    """计划中对实际表的全表/全索引扫描"""
+    scans = []
+    for detail in details:
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and match.group(1) in names:
+            scans.append(detail)
+    return scans
+
+
+def plan_cost(details, names, hot):
+    """按计划明细估算代价；非在线查询本来就要读全表，扫描不计"""
+    cost = 0
+    for detail in details:
+        if full_scans([detail], names):
+            cost += SCAN_COST if hot else 0
+        elif detail.startswith('SEARCH'):
+            if 'COVERING INDEX' not in detail and 'PRIMARY KEY' not in detail:
+                cost += LOOKUP_COST
+            terms = re.search(r'\((.*)\)$', detail)
+            if terms:
+                cost -= CONSTRAINT_BONUS * len(terms.group(1).split(' AND '))
+        elif detail.startswith('USE TEMP B-TREE'):
+            cost += TEMP_BTREE_COST
+    return round(cost, 2)
+
+
+def applicable(conn, workload):
+    """过滤掉当前表结构下无法执行的查询（如尚未运行 time_columns.py 时的分钟列查询）"""
+    queries = []
+    for query in workload:
+        try:
+            explain(conn, query['sql'], query['params'])
+        except sqlite3.OperationalError:
+            continue
+        queries.append(query)
+    return queries
+
+
+def check_plans(conn, workload):
+    """回归检查：返回 [(查询名, 计划明细), ...]，在线查询出现全表扫描时非空"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    violations = []
+    for query in applicable(conn, workload):
+        if not query['hot']:
+            continue
+        names = base_table_names(query['sql'], tables)
+        for detail in full_scans(explain(conn, query['sql'], query['params']), names):
+            violations.append((query['name'], detail))
+    return violations
+
+
+def index_name(sql):
+    return re.search(r'INDEX\s+(?:IF NOT EXISTS\s+)?(\w+)', sql, re.I).group(1)
+
+
+def index_columns(sql):
+    return [col.strip().strip('`"').split()[0] for col in sql[sql.index('(') + 1:sql.rindex(')')].split(',')]
+
+
+class IndexAdvisor:
+    """
+    在内存中的空表副本上比较候选索引集合的查询计划，逐个去掉不影响计划代价的索引
+    唯一索引（含 UNIQUE 约束）承担约束，始终保留
+    副本不带 sqlite_stat1，计划基于 SQLite 的默认估算
+    """
+
+    def __init__(self, conn, workload, candidates=()):
+        tables = set()
+        for query in workload:
+            tables |= {t for t in re.findall(r'(?:FROM|JOIN|UPDATE)\s+(\w+)', query['sql'], re.I)}
+        self.table_sql = [sql for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql IS NOT NULL ORDER BY rowid")
+            if name in tables]
+        self.tables = {re.search(r'TABLE\s+[`"]?(\w+)', sql, re.I).group(1) for sql in self.table_sql}
+
+        self.existing = {}     # 索引名 -> 建索引语句（不含唯一索引）
+        self.unique = {}
+        for name, tbl, sql in conn.execute(
+                "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"):
+            if tbl not in self.tables:
+                continue
+            if re.match(r'\s*CREATE\s+UNIQUE', sql, re.I):
+                self.unique[name] = sql
+            else:
+                self.existing[name] = sql
+        self.candidates = dict(self.existing)
+        for sql in candidates:
+            if re.search(r'\bON\s+[`"]?(\w+)', sql, re.I).group(1) in self.tables:
+                self.candidates.setdefault(index_name(sql), sql)
+
+        # 只保留当前表结构下可执行的查询和可创建的候选索引
+        conn = self._shadow([])
+        try:
+            self.workload = applicable(conn, workload)
+            for name in list(self.candidates):
+                try:
+                    conn.execute(self.candidates[name])
+                except sqlite3.OperationalError:
+                    del self.candidates[name]
+        finally:
+            conn.close()
+
+    def _shadow(self, names):
+        conn = sqlite3.connect(':memory:')
+        for sql in self.table_sql:
+            conn.execute(sql)
+        for sql in list(self.unique.values()) + [self.candidates[name] for name in names]:
+            conn.execute(sql)
+        return conn
+
+    def evaluate(self, names):
+        """给定索引集合下的 (总代价, {查询名: 计划明细})"""
+        conn = self._shadow(names)
+        try:
+            total = 0
+            plans = {}
+            for query in self.workload:
+                details = explain(conn, query['sql'], query['params'])
+                total += plan_cost(details, base_table_names(query['sql'], self.tables), query['hot'])
+                plans[query['name']] = details
+            return round(total, 2), plans
+        finally:
+            conn.close()
+
+    def advise(self):
+        """
+        从全部候选出发，按列数从少到多尝试删除，代价不升高就删除
+        返回 {"keep", "drop", "create", "cost", "baseline_cost", "plans", "violations"}
+        """
+        baseline_cost, _ = self.evaluate(list(self.existing))
+        keep = list(self.candidates)
+        cost, _ = self.evaluate(keep)
+        for name in sorted(self.candidates, key=lambda n: (len(index_columns(self.candidates[n])), n)):
+            trial = [n for n in keep if n != name]
+            trial_cost, _ = self.evaluate(trial)
+            if trial_cost <= cost:
+                keep, cost = trial, trial_cost
+        cost, plans = self.evaluate(keep)
+
+        conn = self._shadow(keep)
+        try:
+            violations = check_plans(conn, self.workload)
+        finally:
+            conn.close()
+        return {
+            "keep": sorted(keep),
+            "drop": sorted(name for name in self.existing if name not in keep),
+            "create": [self.candidates[name] for name in sorted(keep) if name not in self.existing],
+            "cost": cost,
+            "baseline_cost": baseline_cost,
+            "plans": plans,
+            "violations": violations,
+        }
+
+
+def apply_advice(conn, advice):
+    """按建议删除冗余索引、创建缺失索引"""
+    for name in advice['drop']:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for sql in advice['create']:
+        conn.execute(sql)
+    conn.commit()
+
+
+def advise_database(db_path, workload=None, candidates=None):
+    """对数据库文件给出索引建议（只读）"""
+    workload = WORKLOAD[db_path] if workload is None else workload
+    candidates = CANDIDATE_INDEXES.get(db_path, ()) if candidates is None else candidates
+    conn = connect(db_path, profile='query', readonly=True)
+    try:
+        return IndexAdvisor(conn, workload, candidates).advise()
+    finally:
+        conn.close()
+
+
+def print_advice(db_path, advice):
+    """打印索引建议与各查询的计划"""
+    print(f"\n{db_path}: 计划代价 {advice['baseline_cost']} -> {advice['cost']}")
+    print(f"保留索引: {', '.join(advice['keep']) or '无'}")
+    for name in advice['drop']:
+        print(f"  删除 {name}")
+    for sql in advice['create']:
+        print(f"  创建 {sql}")
+    for name, details in advice['plans'].items():
+        print(f"  [{name}]")
+        for detail in details:
+            print(f"    {detail}")
+    for name, detail in advice['violations']:
+        print(f"警告: 在线查询 {name} 仍为全表扫描: {detail}")
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or list(WORKLOAD):
+        try:
+            print_advice(path, advise_database(path))
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
@@ -0,0 +1,562 @@
+import mmap
+import os
+import random
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from datetime import date
+
+from database import connect
+from seat_inventory import DEFAULT_TOTAL_SEATS, SeatInventory, TrainDayInventory
+
+# 快照文件格式（小端）：
+#   文件头  魔数、版本、座位数、每个位图的字节数、(车次, 日期) 组数、seat_occupancy 高水位 id、变更日志高水位 id、生成时间、
+#           起始日期（更早的日期没有写入快照，空表示全部日期）
+#   目录    按 (车次, 日期) 排序的定长条目：车次、日期、区间数、位图数据的文件偏移，可直接在映射上二分查找
+#   数据    每组 区间数 × 位图字节数，第 k 个位图为 [k, k+1) 区间的座位占用位图
+MAGIC = b'12306INV'
+VERSION = 2
+HEADER = struct.Struct('<8sHxxIIIqqd12s')
+ENTRY = struct.Struct('<24s12sIQ')
+KEY_SIZE = 36
+
+# 快照默认与数据库放在一起
+SNAPSHOT_SUFFIX = '.inv'
+
+# seat_occupancy 的删除和原地改写（退票、改签、迁移）由触发器记入变更日志；新增记录按自增 id 回放
+CHANGE_LOG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS seat_occupancy_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        train_code VARCHAR(255) NOT NULL,
+        travel_date DATE NOT NULL
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS seat_occupancy_log_delete AFTER DELETE ON seat_occupancy
+    BEGIN
+        INSERT INTO seat_occupancy_changes (train_code, travel_date) VALUES (OLD.train_code, OLD.travel_date);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS seat_occupancy_log_update AFTER UPDATE ON seat_occupancy
+    BEGIN
+        INSERT INTO seat_occupancy_changes (train_code, travel_date)
+        VALUES (OLD.train_code, OLD.travel_date), (NEW.train_code, NEW.travel_date);
+    END
+    """,
+]
+
+
+def ensure_change_log(conn):
+    """创建座位占用变更日志表和触发器（幂等）"""
+    for sql in CHANGE_LOG_SCHEMA:
+        conn.execute(sql)
+
+
+def _pack_key(train_code, travel_date):
+    code, day = str(train_code).encode('utf-8'), str(travel_date).encode('utf-8')
+    if len(code) > 24 or len(day) > 12:
+        raise ValueError(f"车次或日期过长，无法写入快照: {train_code} {travel_date}")
+    return code.ljust(24, b'\0') + day.ljust(12, b'\0')
+
+
+def write_snapshot(inventory, path, occupancy_hw=0, change_hw=0, date_from=None):
+    """
+    把 SeatInventory 写成快照文件，返回写入的 (车次, 日期) 组数
+    date_from 记录 inventory 只含该日期及以后的矩阵，恢复更早的日期时不能使用这份快照
+    先写临时文件再替换：已映射旧文件的读进程继续读旧内容，不会读到写了一半的文件
+    """
+    total_seats = inventory.total_seats
+    seat_bytes = (total_seats + 7) // 8
+    items = sorted((_pack_key(*key), day) for key, day in inventory.trains.items())
+    offset = HEADER.size + ENTRY.size * len(items)
+    directory, data = [], []
+    for packed, day in items:
+        directory.append(ENTRY.pack(packed[:24], packed[24:], len(day.segments), offset))
+        data.extend(segment.to_bytes(seat_bytes, 'little') for segment in day.segments)
+        offset += seat_bytes * len(day.segments)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, total_seats, seat_bytes, len(items), occupancy_hw, change_hw, time.time(),
+                            (date_from or '').encode('utf-8')))
+        f.write(b''.join(directory))
+        f.write(b''.join(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(items)
+
+
+class InventorySnapshot:
+    """
+    只读映射一个快照文件：余票查询直接读映射中的位图，不把文件读入内存
+    多个进程映射同一文件时共享操作系统的页缓存
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"不是座位库存快照文件: {path}") from None
+        try:
+            if len(self._mm) < HEADER.size:
+                raise ValueError(f"不是座位库存快照文件: {path}")
+            (magic, version, self.total_seats, self.seat_bytes, self.count, self.occupancy_hw,
+             self.change_hw, self.created_at, date_from) = HEADER.unpack_from(self._mm)
+            self.date_from = date_from.rstrip(b'\0').decode('utf-8') or None
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不是座位库存快照文件: {path}")
+            if len(self._mm) < HEADER.size + ENTRY.size * self.count:
+                raise ValueError(f"快照文件不完整: {path}")
+        except ValueError:
+            self._mm.close()
+            raise
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, index):
+        return ENTRY.unpack_from(self._mm, HEADER.size + ENTRY.size * index)
+
+    def find(self, train_code, travel_date):
+        """二分查找目录，返回 (区间数, 数据偏移)，不存在时返回 None"""
+        target = _pack_key(train_code, travel_date)
+        mm = self._mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = HEADER.size + ENTRY.size * mid
+            current = mm[position:position + KEY_SIZE]
+            if current < target:
+                lo = mid + 1
+            elif current > target:
+                hi = mid
+            else:
+                _, _, segment_count, offset = self._entry(mid)
+                return segment_count, offset
+        return None
+
+    def index(self):
+        """整个目录转换为 {定长的车次+日期键: (区间数, 数据偏移)}，大量查询时代替逐次二分查找"""
+        directory = self._mm[HEADER.size:HEADER.size + ENTRY.size * self.count]
+        return {code + day: (segment_count, offset) for code, day, segment_count, offset in ENTRY.iter_unpack(directory)}
+
+    def _segments(self, segment_count, offset, start_no=0, end_no=None):
+        size = self.seat_bytes
+        end_no = segment_count if end_no is None else min(end_no, segment_count)
+        if start_no >= end_no:
+            return []
+        # 连续的几个位图一次转换为整数再按位切开，比逐个切片转换快
+        block = int.from_bytes(self._mm[offset + start_no * size:offset + end_no * size], 'little')
+        bits, mask = size * 8, (1 << size * 8) - 1
+        return [block >> (k * bits) & mask for k in range(end_no - start_no)]
+
+    def keys(self):
+        """快照中的全部 (车次, 日期)，按目录顺序"""
+        for index in range(self.count):
+            code, day, _, _ = self._entry(index)
+            yield code.rstrip(b'\0').decode('utf-8'), day.rstrip(b'\0').decode('utf-8')
+
+    def get(self, train_code, travel_date):
+        """重建某车次某日的占用矩阵，不存在时返回 None"""
+        found = self.find(train_code, travel_date)
+        if found is None:
+            return None
+        return TrainDayInventory.from_segments(self._segments(*found), self.total_seats)
+
+    def count_available(self, train_code, travel_date, start_no, end_no):
+        """某车次某日 [start_no, end_no) 的空闲座位数，只读取这几个区间的位图"""
+        found = self.find(train_code, travel_date)
+        if found is None:
+            return self.total_seats
+        return self.count_free(found, start_no, end_no)
+
+    def count_free(self, found, start_no, end_no):
+        """find 找到的矩阵在 [start_no, end_no) 全程空闲的座位数"""
+        mask = 0
+        for segment in self._segments(*found, start_no, end_no):
+            mask |= segment
+        return ((1 << self.total_seats) - 1 & ~mask).bit_count()
+
+    def count_available_many(self, queries):
+        """批量查询空闲座位数，接口与 SeatInventory.count_available_many 相同"""
+        return [self.count_available(*query) for query in queries]
+
+    def load_into(self, inventory, date_from=None):
+        """把快照中的矩阵（可只取 date_from 及以后的日期）放入 SeatInventory，返回组数"""
+        count = 0
+        for index in range(self.count):
+            code, day, segment_count, offset = self._entry(index)
+            key = (code.rstrip(b'\0').decode('utf-8'), day.rstrip(b'\0').decode('utf-8'))
+            if date_from is not None and key[1] < date_from:
+                continue
+            inventory.trains[key] = TrainDayInventory.from_segments(
+                self._segments(segment_count, offset), self.total_seats)
+            count += 1
+        return count
+
+
+class SnapshotInventory(SeatInventory):
+    """
+    以映射的快照为底层的座位库存：trains 中只放回放时改过的和之后用到（写入、选座）的矩阵，
+    其余 (车次, 日期) 的余票读映射中的区间位图（第一次查询时转换，之后缓存），启动时不必重建全部矩阵
+    被 forget / replace_date 遮盖的车次和日期不再读取底层；date_from 之前的日期不属于这份库存
+    """
+
+    def __init__(self, snapshot, date_from=None):
+        super().__init__(snapshot.total_seats)
+        self.snapshot = snapshot
+        self.date_from = date_from
+        self.hidden = set()
+        self.hidden_dates = set()
+        self._mapping = snapshot
+        self._index = snapshot.index()
+        self._segments = {}     # (车次, 日期) -> 快照中的区间位图列表，不在快照中为空元组
+
+    def _base_segments(self, train_code, travel_date):
+        """底层中某车次某日的区间位图，已被遮盖或不在快照中时返回 None"""
+        # 读路径在事件循环线程中调用，写线程可能同时 detach：快照和缓存各取一次，之后只用局部变量
+        snapshot, cache = self.snapshot, self._segments
+        if (snapshot is None or (self.date_from is not None and travel_date < self.date_from)
+                or travel_date in self.hidden_dates or (train_code, travel_date) in self.hidden):
+            return None
+        key = (train_code, travel_date)
+        segments = cache.get(key)
+        if segments is None:
+            found = self._index.get(_pack_key(train_code, travel_date))
+            segments = cache[key] = () if found is None else snapshot._segments(*found)
+        return segments or None
+
+    def base_day(self, train_code, travel_date):
+        """由快照重建的矩阵（每次新建，不放入 trains），已被遮盖或不在快照中时返回 None"""
+        segments = self._base_segments(train_code, travel_date)
+        return None if segments is None else TrainDayInventory.from_segments(segments, self.total_seats)
+
+    def get(self, train_code, travel_date):
+        """获取车次当日的占用矩阵：不在 trains 中时由快照重建，快照中也没有时创建空矩阵"""
+        key = (train_code, travel_date)
+        inventory = self.trains.get(key)
+        if inventory is None:
+            inventory = self.base_day(train_code, travel_date)
+            if inventory is None:
+                inventory = TrainDayInventory(self.total_seats)
+            self.trains[key] = inventory
+        return inventory
+
+    def forget(self, train_code, travel_date):
+        super().forget(train_code, travel_date)
+        self.hidden.add((train_code, travel_date))
+
+    def replace_date(self, travel_date, trains):
+        super().replace_date(travel_date, trains)
+        self.hidden_dates.add(travel_date)
+
+    def detach(self):
+        """
+        快照不再可信（变更日志无法衔接）时停止读取底层，只保留 trains
+        先置空快照再整体换掉缓存：正在读取的线程用自己取到的快照读完，写入的缓存项不会再被读到
+        """
+        self.snapshot = None
+        self._segments = {}
+
+    def close(self):
+        self.detach()
+        self._mapping.close()
+
+    def count_available(self, train_code, travel_date, start_no, end_no):
+        return self.count_available_many([(train_code, travel_date, start_no, end_no)])[0]
+
+    def count_available_many(self, queries):
+        trains = self.trains
+        total = self.total_seats
+        all_seats = (1 << total) - 1
+        counts = []
+        for train_code, travel_date, start_no, end_no in queries:
+            inventory = trains.get((train_code, travel_date))
+            if inventory is not None:
+                counts.append(inventory.count_free(start_no, end_no))
+                continue
+            segments = self._base_segments(train_code, travel_date)
+            if segments is None:
+                counts.append(total)
+                continue
+            mask = 0
+            for segment in segments[start_no:end_no]:
+                mask |= segment
+            counts.append((all_seats & ~mask).bit_count())
+        return counts
+
+
+def _change_log_state(conn):
+    """变更日志的 (自增序号, 最小 id)；日志表不存在时返回 None"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seat_occupancy_changes'").fetchone()
+    if exists is None:
+        return None
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'seat_occupancy_changes'").fetchone()
+    first = conn.execute("SELECT MIN(id) FROM seat_occupancy_changes").fetchone()[0]
+    return (seq[0] if seq else 0), first
+
+
+def _log_covers(log_state, change_hw):
+    """变更日志能否接上 change_hw：日志没有被重建，且 change_hw 之后的日志没有被清理"""
+    if log_state is None:
+        return False
+    seq, first = log_state
+    if seq < change_hw:
+        return False
+    return seq == change_hw or (first is not None and first <= change_hw + 1)
+
+
+def _replayable(snapshot, total_seats, log_state, date_from=None):
+    """
+    快照能否与变更日志衔接：座位数一致，快照包含 date_from 及以后的全部日期，且日志能接上快照的高水位
+    """
+    if snapshot is None or snapshot.total_seats != total_seats:
+        return False
+    if snapshot.date_from is not None and (date_from is None or date_from < snapshot.date_from):
+        return False
+    return _log_covers(log_state, snapshot.change_hw)
+
+
+def high_water(conn):
+    """seat_occupancy 的最大 id 与变更日志的自增序号（日志表不存在时为 0）"""
+    log_state = _change_log_state(conn)
+    occupancy_hw = conn.execute("SELECT COALESCE(MAX(id), 0) FROM seat_occupancy").fetchone()[0]
+    return occupancy_hw, log_state[0] if log_state else 0
+
+
+def changed_keys(conn, occupancy_hw, change_hw):
+    """
+    两个高水位之后新增、删除或改写过占用记录的 (车次, 日期) 集合
+    变更日志无法衔接（不存在、被重建或已被清理）时返回 None，调用方只能整体重新读取
+    """
+    if not _log_covers(_change_log_state(conn), change_hw):
+        return None
+    keys = set(conn.execute("SELECT DISTINCT train_code, travel_date FROM seat_occupancy WHERE id > ?",
+                            (occupancy_hw,)))
+    keys.update(conn.execute("SELECT DISTINCT train_code, travel_date FROM seat_occupancy_changes WHERE id > ?",
+                             (change_hw,)))
+    return keys
+
+
+def _open_snapshot(path):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return InventorySnapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"快照不可用，将从数据库完整加载: {e}")
+        return None
+
+
+def restore_conn(conn, snapshot_path, total_seats=DEFAULT_TOTAL_SEATS, date_from=None, lazy=False):
+    """
+    在 conn 的一个读事务中恢复座位库存：映射快照，再回放快照之后的变化
+      - seat_occupancy 中 id 大于快照高水位的新记录直接加到矩阵上
+      - 变更日志中快照之后被删除或改写过的 (车次, 日期) 按索引重新读取整组
+    耗时只与快照大小和快照之后的变化量有关，与历史记录总数无关
+    lazy=True 时返回以映射为底层的 SnapshotInventory，只重建回放涉及的矩阵（映射由它持有，用完调用 close）；
+    否则把快照中的矩阵全部重建为普通 SeatInventory
+    快照缺失、损坏、起始日期晚于 date_from 或无法与日志衔接时退回完整加载（返回普通 SeatInventory）
+    返回 (库存, 统计信息)，统计信息中的两个高水位可用于写下一份快照
+    """
+    inventory = SeatInventory(total_seats)
+    stats = {"full_load": False, "snapshot_keys": 0, "replayed_rows": 0, "reloaded_keys": 0}
+    snapshot = _open_snapshot(snapshot_path)
+    keep_mapping = False
+    conn.execute("BEGIN")
+    try:
+        log_state = _change_log_state(conn)
+        stats["occupancy_hw"], stats["change_hw"] = high_water(conn)
+        if not _replayable(snapshot, total_seats, log_state, date_from):
+            stats["full_load"] = True
+            inventory.load(conn, date_from=date_from)
+            return inventory, stats
+
+        if lazy:
+            inventory = SnapshotInventory(snapshot, date_from)
+            stats["snapshot_keys"] = len(snapshot)
+        else:
+            stats["snapshot_keys"] = snapshot.load_into(inventory, date_from)
+        dirty = set(conn.execute("""
+            SELECT DISTINCT train_code, travel_date FROM seat_occupancy_changes WHERE id > ?
+        """, (snapshot.change_hw,)))
+        if date_from is not None:
+            dirty = {key for key in dirty if key[1] >= date_from}
+        rows = conn.execute("""
+            SELECT train_code, travel_date, seat_number, start_station_no, end_station_no
+            FROM seat_occupancy WHERE id > ? AND id <= ?
+        """, (snapshot.occupancy_hw, stats["occupancy_hw"]))
+        stats["replayed_rows"] = inventory.add_rows(
+            row for row in rows
+            if (row[0], row[1]) not in dirty and (date_from is None or row[1] >= date_from))
+        for train_code, travel_date in dirty:
+            inventory.forget(train_code, travel_date)
+            inventory.load(conn, train_codes=[train_code], travel_date=travel_date)
+        stats["reloaded_keys"] = len(dirty)
+        keep_mapping = lazy
+        return inventory, stats
+    finally:
+        conn.execute("COMMIT")
+        if snapshot is not None and not keep_mapping:
+            snapshot.close()
+
+
+def restore_inventory(ticket_db, snapshot_path, total_seats=DEFAULT_TOTAL_SEATS, date_from=None, lazy=False):
+    """从快照加回放恢复 ticket_db 的座位库存，见 restore_conn"""
+    conn = connect(ticket_db, profile='query', readonly=True)
+    conn.isolation_level = None
+    try:
+        return restore_conn(conn, snapshot_path, total_seats, date_from, lazy)
+    finally:
+        conn.close()
+
+
+def take_snapshot(ticket_db, snapshot_path=None, total_seats=DEFAULT_TOTAL_SEATS, date_from=None, prune=True):
+    """
+    生成（或更新）ticket_db 的座位库存快照，默认写到 ticket_db + '.inv'
+    已有快照时在其基础上回放变化，不重新扫描全部占用记录；date_from 之前的日期不再写入快照
+    prune=True 时清理新快照已包含的变更日志，更早的快照随之失效（恢复时会退回完整加载）
+    返回统计信息
+    """
+    snapshot_path = snapshot_path or ticket_db + SNAPSHOT_SUFFIX
+    conn = connect(ticket_db, profile='oltp')
+    try:
+        ensure_change_log(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    inventory, stats = restore_inventory(ticket_db, snapshot_path, total_seats, date_from)
+    stats["keys"] = write_snapshot(inventory, snapshot_path, stats["occupancy_hw"], stats["change_hw"], date_from)
+    if prune:
+        conn = connect(ticket_db, profile='oltp')
+        try:
+            conn.execute("DELETE FROM seat_occupancy_changes WHERE id <= ?", (stats["change_hw"],))
+            conn.commit()
+        finally:
+            conn.close()
+    return stats
+
+
+def benchmark_restart(rows=200000, trains=500, stops=20, recent=1000, total_seats=DEFAULT_TOTAL_SEATS, seed=1,
+                      workdir=None):
+    """
+    对比进程启动时的两种库存加载方式：从 seat_occupancy 完整加载，以及映射快照加回放最近 recent 条变化（lazy）
+    另外对比两者查询余票的耗时：映射快照第一次查询某车次/日期时要转换位图，之后与内存矩阵相当
+    历史记录为 rows 条（分布在过去的日期上），未来日期的记录占一小部分
+    """
+    rng = random.Random(seed)
+    today = date.today().toordinal()
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        ticket_db = os.path.join(tmpdir, 'ticket.db')
+        conn = connect(ticket_db, profile='etl')
+        conn.execute("""
+            CREATE TABLE seat_occupancy (
+                id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, train_code VARCHAR(255) NOT NULL,
+                travel_date DATE NOT NULL, seat_number INTEGER NOT NULL, start_station_no INTEGER NOT NULL,
+                end_station_no INTEGER NOT NULL, ticket_id INTEGER NOT NULL,
+                UNIQUE (train_code, travel_date, seat_number, start_station_no, end_station_no)
+            )
+        """)
+
+        def generate(count, first_day, last_day):
+            for _ in range(count):
+                start_no = rng.randint(1, stops - 1)
+                yield (f"G{rng.randint(1, trains)}", date.fromordinal(rng.randint(first_day, last_day)).isoformat(),
+                       rng.randint(1, total_seats), start_no, rng.randint(start_no + 1, stops), 0)
+
+        insert = """
+            INSERT OR IGNORE INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no,
+                                                  end_station_no, ticket_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """
+        conn.executemany(insert, generate(rows, today - 365, today + 30))
+        conn.commit()
+        conn.close()
+        today_iso = date.fromordinal(today).isoformat()
+        take_snapshot(ticket_db, total_seats=total_seats, date_from=today_iso)
+
+        conn = connect(ticket_db, profile='etl')
+        conn.executemany(insert, generate(recent, today + 1, today + 30))
+        conn.execute("DELETE FROM seat_occupancy WHERE id IN (SELECT id FROM seat_occupancy ORDER BY id DESC LIMIT ?)",
+                     (recent // 10,))
+        conn.commit()
+        conn.close()
+
+        start = time.perf_counter()
+        full = SeatInventory.from_db(ticket_db, total_seats, date_from=today_iso)
+        full_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        warm, stats = restore_inventory(ticket_db, ticket_db + SNAPSHOT_SUFFIX, total_seats, today_iso, lazy=True)
+        warm_seconds = time.perf_counter() - start
+
+        # 每个 (车次, 日期) 查一次全程余票：内存矩阵与映射读取的查询耗时
+        queries = [(train_code, travel_date, 1, stops) for train_code, travel_date in full.trains]
+        queries.extend((f"G{rng.randint(1, trains)}", date.fromordinal(rng.randint(today, today + 30)).isoformat(),
+                        1, stops) for _ in range(1000))
+        start = time.perf_counter()
+        expected = full.count_available_many(queries)
+        full_query_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        counts = warm.count_available_many(queries)
+        warm_query_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        warm.count_available_many(queries)
+        warm_requery_seconds = time.perf_counter() - start
+        if isinstance(warm, SnapshotInventory):
+            warm.close()
+
+    assert counts == expected
+    return {"full_seconds": full_seconds, "warm_seconds": warm_seconds, "queries": len(queries),
+            "full_query_seconds": full_query_seconds, "warm_query_seconds": warm_query_seconds,
+            "warm_requery_seconds": warm_requery_seconds,
+            "materialized_keys": len(warm.trains), **stats}
+
+
+if __name__ == '__main__':
+    # 用法:
+    #   python inventory_snapshot.py save [ticket.db] [快照路径]   生成/更新快照（只保留今天及以后的日期）
+    #   python inventory_snapshot.py info [快照路径]               查看快照信息
+    #   python inventory_snapshot.py bench [历史记录数]            完整加载与快照恢复的启动耗时对比
+    command = sys.argv[1] if len(sys.argv) > 1 else 'bench'
+    args = sys.argv[2:]
+    if command == 'save':
+        ticket_db = args[0] if args else 'ticket.db'
+        try:
+            stats = take_snapshot(ticket_db, args[1] if len(args) > 1 else None, date_from=date.today().isoformat())
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            sys.exit(1)
+        mode = "完整加载" if stats['full_load'] else f"回放 {stats['replayed_rows']} 条、重读 {stats['reloaded_keys']} 组"
+        print(f"快照已更新（{mode}）：{stats['keys']} 组车次/日期，占用记录高水位 {stats['occupancy_hw']}")
+    elif command == 'info':
+        with InventorySnapshot(args[0] if args else 'ticket.db' + SNAPSHOT_SUFFIX) as snapshot:
+            print(f"座位数 {snapshot.total_seats}，{len(snapshot)} 组车次/日期，"
+                  f"占用记录高水位 {snapshot.occupancy_hw}，变更日志高水位 {snapshot.change_hw}，"
+                  f"起始日期 {snapshot.date_from or '全部'}，"
+                  f"生成于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.created_at))}")
+    else:
+        count = int(args[0]) if args else 200000
+        r = benchmark_restart(count)
+        print(f"历史占用记录 {count} 条；快照之后回放新记录 {r['replayed_rows']} 条，重读 {r['reloaded_keys']} 组")
+        print(f"完整加载: {r['full_seconds'] * 1000:.1f} 毫秒")
+        print(f"快照恢复: {r['warm_seconds'] * 1000:.1f} 毫秒（快照 {r['snapshot_keys']} 组，重建 {r['materialized_keys']} 组）")
+        print(f"查询余票 {r['queries']} 次: 内存矩阵 {r['full_query_seconds'] * 1000:.1f} 毫秒，"
+              f"映射快照 {r['warm_query_seconds'] * 1000:.1f} 毫秒（首次，位图转换后缓存），"
+              f"再查一遍 {r['warm_requery_seconds'] * 1000:.1f} 毫秒")
@@ -0,0 +1,297 @@
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+
+from database import connect
+
+MINUTES_PER_DAY = 1440
+INF = float('inf')
+
+
+def parse_hhmm(text):
+    """'HH:MM' -> 当天分钟数，无效时返回 None"""
+    if not text or ':' not in text:
+        return None
+    hours, _, minutes = text.partition(':')
+    try:
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes):
+    """分钟数 -> 'HH:MM'，跨天时追加 (+N)"""
+    day, rest = divmod(int(minutes), MINUTES_PER_DAY)
+    text = f"{rest // 60:02d}:{rest % 60:02d}"
+    return f"{text}(+{day})" if day else text
+
+
+def stop_times(stops):
+    """
+    计算一个车次各站的绝对时刻（分钟，相对始发当天0点）
+    stops 为按站序排列的 (station_id, station_no, arrive_time, depart_time)
+    时刻回退时视为跨天，累加1440分钟；无时刻的站点跳过
+    返回 [(station_id, station_no, 到达分钟, 出发分钟), ...]
+    """
+    result = []
+    last = None
+    day_offset = 0
+    for station_id, station_no, arrive_text, depart_text in stops:
+        arrive = parse_hhmm(arrive_text)
+        depart = parse_hhmm(depart_text)
+        if arrive is None and depart is None:
+            continue
+        if arrive is None:
+            arrive = depart
+        if depart is None:
+            depart = arrive
+
+        arrive += day_offset
+        if last is not None and arrive < last:
+            day_offset += MINUTES_PER_DAY
+            arrive += MINUTES_PER_DAY
+        depart += day_offset
+        if depart < arrive:
+            day_offset += MINUTES_PER_DAY
+            depart += MINUTES_PER_DAY
+        last = depart
+        result.append((station_id, station_no, arrive, depart))
+    return result
+
+
+class JourneyPlanner:
+    """
+    基于连接扫描（Connection Scan）的换乘规划器
+    连接按出发时刻排序存放在紧凑数组中，每一轮换乘只需顺序扫描一遍
+    """
+
+    def __init__(self, min_transfer=10, city_transfer=60, days=2):
+        self.min_transfer = min_transfer      # 同站换乘最短时间（分钟）
+        self.city_transfer = city_transfer    # 同城不同站换乘最短时间（分钟）
+        self.days = days                      # 规划时考虑的运行天数
+        self.train_codes = []
+        self.station_names = {}
+        self.station_city = {}
+        self.city_stations = {}
+        self.skipped_trains = 0
+        self.load_seconds = 0.0
+        # 连接数组：出发、到达、车次、出发站、到达站、出发站序、到达站序
+        self.c_dep = array('i')
+        self.c_arr = array('i')
+        self.c_trip = array('i')
+        self.c_from = array('i')
+        self.c_to = array('i')
+        self.c_from_no = array('i')
+        self.c_to_no = array('i')
+
+    @classmethod
+    def load(cls, trains_db='trains.db', stations_db='stations.db', **kwargs):
+        """从数据库加载车站和车次时刻，构建按出发时刻排序的连接数组"""
+        planner = cls(**kwargs)
+        start = time.perf_counter()
+
+        conn_stations = connect(stations_db, profile='query', readonly=True)
+        try:
+            for station_id, name, city in conn_stations.execute("SELECT id, name, city FROM stations"):
+                city = city or name
+                planner.station_names[station_id] = name
+                planner.station_city[station_id] = city
+                planner.city_stations.setdefault(city, []).append(station_id)
+        finally:
+            conn_stations.close()
+
+        connections = []
+        conn_trains = connect(trains_db, profile='query', readonly=True)
+        try:
+            cursor = conn_trains.execute("""
+                SELECT train_code, station_id, station_no, arrive_time, depart_time
+                FROM train_routes
+                WHERE station_id IS NOT NULL AND station_no IS NOT NULL
+                ORDER BY train_code, station_no
+            """)
+            for train_code, rows in groupby(cursor, key=lambda row: row[0]):
+                timed = stop_times([row[1:] for row in rows])
+                if len(timed) < 2:
+                    planner.skipped_trains += 1
+                    continue
+                trip = len(planner.train_codes)
+                planner.train_codes.append(train_code)
+                for (from_id, from_no, _, dep), (to_id, to_no, arr, _) in zip(timed, timed[1:]):
+                    connections.append((dep, arr, trip, from_id, to_id, from_no, to_no))
+        finally:
+            conn_trains.close()
+
+        planner._build_connections(connections)
+        planner.load_seconds = time.perf_counter() - start
+        return planner
+
+    def _build_connections(self, connections):
+        """按天复制连接（车次ID按天偏移），整体按出发时刻排序"""
+        trains = len(self.train_codes)
+        expanded = []
+        for day in range(self.days):
+            shift = day * MINUTES_PER_DAY
+            trip_shift = day * trains
+            expanded.extend(
+                (dep + shift, arr + shift, trip + trip_shift, f, t, fn, tn)
+                for dep, arr, trip, f, t, fn, tn in connections
+            )
+        expanded.sort()
+        for dep, arr, trip, from_id, to_id, from_no, to_no in expanded:
+            self.c_dep.append(dep)
+            self.c_arr.append(arr)
+            self.c_trip.append(trip)
+            self.c_from.append(from_id)
+            self.c_to.append(to_id)
+            self.c_from_no.append(from_no)
+            self.c_to_no.append(to_no)
+
+    def _transfer_targets(self, station_id):
+        """换乘可达车站及所需时间：本站 min_transfer，同城其它车站 city_transfer"""
+        city = self.station_city.get(station_id)
+        for other in self.city_stations.get(city, (station_id,)):
+            yield other, self.min_transfer if other == station_id else self.city_transfer
+
+    def plan(self, from_city, to_city, depart_after=0, max_transfers=2):
+        """查询两城市间的行程，返回按换乘次数递增、到达时刻递减的帕累托最优行程"""
+        return self.plan_stations(
+            self.city_stations.get(from_city, []),
+            self.city_stations.get(to_city, []),
+            depart_after=depart_after,
+            max_transfers=max_transfers,
+        )
+
+    def plan_stations(self, origin_ids, destination_ids, depart_after=0, max_transfers=2):
+        """
+        车站级别的行程规划
+        每一轮只扫描一遍连接数组：第k轮得到最多乘坐k趟车的最早到达时刻
+        """
+        destinations = set(destination_ids)
+        if not origin_ids or not destinations:
+            return []
+
+        c_dep, c_arr, c_trip = self.c_dep, self.c_arr, self.c_trip
+        c_from, c_to = self.c_from, self.c_to
+        n = len(c_dep)
+
+        # ready[车站] = (可上车时刻, 来源轮次, 来源车站)
+        ready = {station_id: (depart_after, 0, None) for station_id in origin_ids}
+        labels = [None]   # labels[k][车站] = (到达时刻, 上车连接, 下车连接, 上车站ready)
+        best_arrival = INF
+        itineraries = []
+
+        for k in range(1, max_transfers + 2):
+            arrivals = {}
+            boarded = {}
+            earliest = min(entry[0] for entry in ready.values())
+            for idx in range(bisect_left(c_dep, earliest), n):
+                dep = c_dep[idx]
+                if dep >= best_arrival:
+                    break
+                trip = c_trip[idx]
+                board = boarded.get(trip)
+                if board is None:
+                    entry = ready.get(c_from[idx])
+                    if entry is None or entry[0] > dep:
+                        continue
+                    board = boarded[trip] = (idx, entry)
+                arr = c_arr[idx]
+                to_id = c_to[idx]
+                current = arrivals.get(to_id)
+                if current is None or arr < current[0]:
+                    arrivals[to_id] = (arr, board[0], idx, board[1])
+            labels.append(arrivals)
+
+            reached = [(arrivals[s][0], s) for s in destinations if s in arrivals]
+            if reached:
+                arrival, station_id = min(reached)
+                if arrival < best_arrival:
+                    best_arrival = arrival
+                    itineraries.append(self._reconstruct(labels, k, station_id))
+
+            # 本轮到达的车站加上换乘时间，作为下一轮的上车条件（保留更早轮次的结果）
+            next_ready = dict(ready)
+            for station_id, (arr, _, _, _) in arrivals.items():
+                if station_id in destinations:
+                    continue
+                for target, transfer in self._transfer_targets(station_id):
+                    t = arr + transfer
+                    if target not in next_ready or t < next_ready[target][0]:
+                        next_ready[target] = (t, k, station_id)
+            if next_ready == ready:
+                break
+            ready = next_ready
+
+        return itineraries
+
+    def _reconstruct(self, labels, k, station_id):
+        """根据每轮的标签回溯出完整行程"""
+        legs = []
+        while k > 0 and station_id is not None:
+            _, board_idx, alight_idx, (_, prev_round, prev_station) = labels[k][station_id]
+            legs.append({
+                "train_code": self.train_codes[self.c_trip[board_idx] % len(self.train_codes)],
+                "from_station": self.station_names.get(self.c_from[board_idx]),
+                "from_no": self.c_from_no[board_idx],
+                "to_station": self.station_names.get(self.c_to[alight_idx]),
+                "to_no": self.c_to_no[alight_idx],
+                "depart": self.c_dep[board_idx],
+                "arrive": self.c_arr[alight_idx],
+            })
+            k, station_id = prev_round, prev_station
+        legs.reverse()
+        return {
+            "legs": legs,
+            "depart": legs[0]["depart"],
+            "arrive": legs[-1]["arrive"],
+            "duration": legs[-1]["arrive"] - legs[0]["depart"],
+            "transfers": len(legs) - 1,
+        }
+
+    def stats(self):
+        """返回规划器规模信息"""
+        return {
+            "trains": len(self.train_codes),
+            "connections": len(self.c_dep),
+            "skipped_trains": self.skipped_trains,
+            "load_seconds": self.load_seconds,
+        }
+
+
+def print_itineraries(itineraries):
+    """打印行程列表"""
+    for i, itinerary in enumerate(itineraries, 1):
+        print(f"\n方案{i}: 换乘{itinerary['transfers']}次，"
+              f"{format_minutes(itinerary['depart'])} -> {format_minutes(itinerary['arrive'])}，"
+              f"历时 {itinerary['duration'] // 60}小时{itinerary['duration'] % 60}分")
+        for leg in itinerary["legs"]:
+            print(f"  {leg['train_code']:<8} {leg['from_station']}({leg['from_no']}) {format_minutes(leg['depart'])}"
+                  f" -> {leg['to_station']}({leg['to_no']}) {format_minutes(leg['arrive'])}")
+
+
+if __name__ == '__main__':
+    planner = JourneyPlanner.load('trains.db', 'stations.db')
+    stats = planner.stats()
+    print(f"已加载 {stats['trains']} 个车次，{stats['connections']} 条连接，耗时 {stats['load_seconds']:.3f} 秒")
+    if stats['skipped_trains']:
+        print(f"有 {stats['skipped_trains']} 个车次缺少 arrive_time/depart_time，未参与换乘规划")
+    if not stats['connections']:
+        print("没有可用的时刻数据，请先导入 arrive_time/depart_time")
+        sys.exit(1)
+
+    start = input("请输入出发城市：")
+    end = input("请输入到达城市：")
+    depart = parse_hhmm(input("请输入最早出发时间(HH:MM，默认00:00)：") or "00:00") or 0
+    t0 = time.perf_counter()
+    results = planner.plan(start, end, depart_after=depart, max_transfers=2)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if not results:
+        print(f"\n未找到从 {start} 到 {end} 的行程")
+    else:
+        print_itineraries(results)
+        print(f"\n共 {len(results)} 个方案，查询耗时 {elapsed:.3f} 毫秒")
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import statistics
+import sys
+import time
+
+from database import connect
+
+# 所有源表都按整数ID关联，字符串只在字典表中保存一次
+SCHEMA = [
+    '''
+    CREATE TABLE cities (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''',
+    '''
+    CREATE TABLE stations (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        city_id INTEGER REFERENCES cities(id)
+    )
+    ''',
+    '''
+    CREATE TABLE train_classes (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''',
+    '''
+    CREATE TABLE trains (
+        id INTEGER PRIMARY KEY,
+        code TEXT NOT NULL UNIQUE,
+        full_code TEXT,
+        class_id INTEGER REFERENCES train_classes(id),
+        run_time TEXT
+    )
+    ''',
+    # 经停表按 (车次, 站序) 聚簇，同一车次的所有站点物理相邻
+    # city_id 冗余保存，城市间查询无需再关联 stations
+    '''
+    CREATE TABLE stops (
+        train_id INTEGER NOT NULL,
+        station_no INTEGER NOT NULL,
+        station_id INTEGER NOT NULL,
+        city_id INTEGER,
+        PRIMARY KEY (train_id, station_no)
+    ) WITHOUT ROWID
+    ''',
+    # WITHOUT ROWID 表的二级索引自带主键列，按城市查 (train_id, station_no) 是覆盖索引
+    'CREATE INDEX idx_stops_city ON stops(city_id)',
+    'CREATE INDEX idx_stops_station ON stops(station_id)',
+]
+
+
+def create_schema(conn):
+    """创建规范化时刻表结构"""
+    for sql in SCHEMA:
+        conn.execute(sql)
+
+
+def decode_full_code(full_code):
+    """完整车次号 -> 车次代码，如 '6c000D36180E' -> 'D3618'（去掉十六进制前缀和两位后缀）"""
+    if not full_code or len(full_code) < 4:
+        return None
+    code = re.sub(r'^[0-9a-f]+', '', full_code[:-2])
+    return code or None
+
+
+class Dictionary:
+    """字符串字典编码：同一字符串只分配一个整数ID"""
+
+    def __init__(self):
+        self.ids = {}
+
+    def encode(self, value):
+        if value is None:
+            return None
+        key = self.ids.get(value)
+        if key is None:
+            key = self.ids[value] = len(self.ids) + 1
+        return key
+
+    def rows(self):
+        return [(key, value) for value, key in self.ids.items()]
+
+
+def migrate(output='timetable.db', trains_db='trains.db', stations_db='stations.db',
+            basic_db='train_basic.db', legacy_db='12306.db'):
+    """
+    把分散在多个库中的时刻表数据合并为一个规范化的整数键数据库
+    先写入临时文件，成功后再替换目标文件；返回各表行数
+    """
+    for path in (trains_db, stations_db):
+        if not os.path.exists(path):
+            print(f"错误: {path} 文件不存在")
+            return None
+
+    start = time.perf_counter()
+    cities = Dictionary()
+    classes = Dictionary()
+
+    # 车站：沿用 stations.db 的ID，train_routes.station_id 无需转换
+    stations = {}
+    conn = connect(stations_db, profile='query', readonly=True)
+    try:
+        for station_id, name, city in conn.execute("SELECT id, name, city FROM stations ORDER BY id"):
+            stations[name] = (station_id, cities.encode(city or name))
+    finally:
+        conn.close()
+    station_by_id = {station_id: (name, city_id) for name, (station_id, city_id) in stations.items()}
+
+    def station_id_for(name):
+        entry = stations.get(name)
+        if entry is None:
+            entry = stations[name] = (max(station_by_id, default=0) + 1, None)
+            station_by_id[entry[0]] = (name, None)
+        return entry[0]
+
+    # 经停站：trains.db 的 train_routes，以及 12306.db 中按 (站名, 车次) 记录的站序
+    trains = {}     # 车次代码 -> [完整车次号, 运行时间, 车型ID]
+    stops = {}      # (车次代码, 车站ID) -> 站序
+    conn = connect(trains_db, profile='query', readonly=True)
+    try:
+        for code, station_id, station_no, full_code, run_time in conn.execute("""
+            SELECT train_code, station_id, station_no, train_full_code, run_time
+            FROM train_routes
+            WHERE station_id IS NOT NULL AND station_no IS NOT NULL
+        """):
+            info = trains.setdefault(code, [None, None, None])
+            info[0] = info[0] or full_code
+            info[1] = info[1] or run_time
+            stops[(code, station_id)] = station_no
+    finally:
+        conn.close()
+
+    legacy_stops = 0
+    if legacy_db and os.path.exists(legacy_db):
+        conn = connect(legacy_db, profile='query', readonly=True)
+        try:
+            has_table = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='stations'"
+            ).fetchone()
+            if has_table:
+                for name, code, station_no in conn.execute(
+                    "SELECT name, code, station_no FROM stations WHERE station_no IS NOT NULL"
+                ):
+                    trains.setdefault(code, [None, None, None])
+                    key = (code, station_id_for(name))
+                    if key not in stops:
+                        stops[key] = station_no
+                        legacy_stops += 1
+        finally:
+            conn.close()
+
+    # 车次基本信息：train_basic.db 各字母表，按完整车次号或解码出的车次代码匹配
+    if basic_db and os.path.exists(basic_db):
+        by_full_code = {info[0]: code for code, info in trains.items() if info[0]}
+        conn = connect(basic_db, profile='query', readonly=True)
+        try:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+            for table in sorted(tables):
+                columns = [col[1] for col in conn.execute(f'PRAGMA table_info("{table}")')]
+                if 'train_full_code' not in columns or 'run_time' not in columns:
+                    continue
+                class_column = 'train_class' if 'train_class' in columns else 'NULL'
+                for full_code, run_time, train_class in conn.execute(
+                    f'SELECT train_full_code, run_time, {class_column} FROM "{table}"'
+                ):
+                    code = by_full_code.get(full_code) or decode_full_code(full_code)
+                    info = trains.get(code)
+                    if info is None:
+                        continue
+                    if info[0] is None:
+                        info[0] = full_code
+                    info[1] = info[1] or run_time
+                    if info[2] is None:
+                        info[2] = classes.encode(train_class)
+        finally:
+            conn.close()
+
+    # 车次ID按车次代码排序分配，按ID排序即按车次代码排序
+    train_ids = {code: i for i, code in enumerate(sorted(trains), 1)}
+
+    tmp_path = output + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = connect(tmp_path, profile='etl')
+    try:
+        create_schema(conn)
+        conn.executemany("INSERT INTO cities (id, name) VALUES (?, ?)", cities.rows())
+        conn.executemany("INSERT INTO train_classes (id, name) VALUES (?, ?)", classes.rows())
+        conn.executemany("INSERT INTO stations (id, name, city_id) VALUES (?, ?, ?)", [
+            (station_id, name, city_id) for station_id, (name, city_id) in sorted(station_by_id.items())
+        ])
+        conn.executemany("INSERT INTO trains (id, code, full_code, class_id, run_time) VALUES (?, ?, ?, ?, ?)", [
+            (train_ids[code], code, full_code, class_id, run_time)
+            for code, (full_code, run_time, class_id) in trains.items()
+        ])
+        # 按聚簇主键顺序插入，B树只在尾部追加
+        conn.executemany("INSERT OR IGNORE INTO stops (train_id, station_no, station_id, city_id) VALUES (?, ?, ?, ?)", sorted(
+            (train_ids[code], station_no, station_id, station_by_id[station_id][1])
+            for (code, station_id), station_no in stops.items()
+        ))
+        conn.commit()
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('cities', 'stations', 'train_classes', 'trains', 'stops')
+        }
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, output)
+
+    counts['legacy_stops'] = legacy_stops
+    counts['seconds'] = time.perf_counter() - start
+    return counts
+
+
+def direct_trains_legacy(conn, from_city, to_city):
+    """旧库：train_routes 上按城市名和车次代码（TEXT）自连接"""
+    return conn.execute("""
+        SELECT a.train_code, a.station_no, b.station_no
+        FROM train_routes a JOIN train_routes b ON a.train_code = b.train_code
+        WHERE a.city = ? AND b.city = ? AND a.station_no < b.station_no
+    """, (from_city, to_city)).fetchall()
+
+
+def direct_trains(conn, from_city, to_city, city_ids=None):
+    """新库：城市名先转为ID，之后全部按整数键连接"""
+    if city_ids is None:
+        city_ids = dict(conn.execute("SELECT name, id FROM cities"))
+    from_id = city_ids.get(from_city)
+    to_id = city_ids.get(to_city)
+    if from_id is None or to_id is None:
+        return []
+    return conn.execute("""
+        SELECT t.code, a.station_no, b.station_no
+        FROM stops a
+        JOIN stops b ON b.train_id = a.train_id AND b.station_no > a.station_no
+        JOIN trains t ON t.id = a.train_id
+        WHERE a.city_id = ? AND b.city_id = ?
+        ORDER BY a.train_id, a.station_no, b.station_no
+    """, (from_id, to_id)).fetchall()
+
+
+def _time_queries(func, pairs, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        for from_city, to_city in pairs:
+            t0 = time.perf_counter()
+            rows += len(func(from_city, to_city))
+            timings.append(time.perf_counter() - t0)
+    return statistics.median(timings), rows // repeat
+
+
+def migration_report(output='timetable.db', trains_db='trains.db', stations_db='stations.db',
+                     sources=('trains.db', 'stations.db', 'train_basic.db', '12306.db'), repeat=5):
+    """对比迁移前后的文件大小和城市间直达查询耗时"""
+    source_size = sum(os.path.getsize(path) for path in sources if os.path.exists(path))
+    report = {"source_bytes": source_size, "output_bytes": os.path.getsize(output)}
+
+    conn_new = connect(output, profile='query', readonly=True)
+    conn_old = connect(trains_db, profile='query', readonly=True)
+    try:
+        city_ids = dict(conn_new.execute("SELECT name, id FROM cities"))
+        cities = sorted(city_ids)
+        pairs = [(a, b) for a in cities for b in cities if a != b]
+        report["pairs"] = len(pairs)
+        report["legacy_p50"], report["legacy_rows"] = _time_queries(
+            lambda a, b: direct_trains_legacy(conn_old, a, b), pairs, repeat)
+        report["new_p50"], report["new_rows"] = _time_queries(
+            lambda a, b: direct_trains(conn_new, a, b, city_ids), pairs, repeat)
+    finally:
+        conn_new.close()
+        conn_old.close()
+    return report
+
+
+if __name__ == '__main__':
+    output = sys.argv[1] if len(sys.argv) > 1 else 'timetable.db'
+    print(f"开始迁移到 {output} ...")
+    counts = migrate(output)
+    if counts is None:
+        sys.exit(1)
+    print(f"迁移完成，耗时 {counts['seconds']:.2f} 秒")
+    print(f"城市 {counts['cities']}，车站 {counts['stations']}，车型 {counts['train_classes']}，"
+          f"车次 {counts['trains']}，经停 {counts['stops']}（其中来自12306.db {counts['legacy_stops']}）")
+
+    report = migration_report(output)
+    print(f"\n文件大小: {report['source_bytes'] / 1024:.0f} KB -> {report['output_bytes'] / 1024:.0f} KB")
+    print(f"城市间直达查询（{report['pairs']} 个城市对）:")
+    print(f"  旧库 P50 {report['legacy_p50'] * 1000:.3f} 毫秒，共 {report['legacy_rows']} 条结果")
+    print(f"  新库 P50 {report['new_p50'] * 1000:.3f} 毫秒，共 {report['new_rows']} 条结果")
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from database import connect, file_signature, read_timetable_version
+
+
+def estimate_size(value):
+    """粗略估算缓存值占用的字节数（递归统计 list/tuple/dict/str/int）"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class RouteCache:
+    """
+    直达查询结果的 LRU/TTL 缓存
+    每个条目记录写入时的时刻表版本号；ETL 脚本提交时递增版本号，旧条目在下次访问时失效
+    版本号只在数据库文件签名变化时重新读取，命中路径不访问数据库
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, databases=('trains.db', 'stations.db')):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.databases = tuple(databases)
+        self._entries = OrderedDict()   # key -> (版本号, 过期时刻, 结果, 字节数)
+        self._lock = threading.Lock()
+        self._signatures = None
+        self._version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def version(self):
+        """当前时刻表版本：各数据库版本号组成的元组"""
+        signatures = tuple(file_signature(path) for path in self.databases)
+        if signatures != self._signatures:
+            versions = []
+            for path in self.databases:
+                if not os.path.exists(path):
+                    versions.append(None)
+                    continue
+                conn = connect(path, profile='query', readonly=True)
+                try:
+                    versions.append(read_timetable_version(conn))
+                finally:
+                    conn.close()
+            self._version = tuple(versions)
+            self._signatures = signatures
+        return self._version
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[3]
+
+    def get(self, key, loader):
+        """命中则返回缓存结果，否则调用 loader() 计算并写入缓存"""
+        version = self.version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] != version:
+                    self.stale += 1
+                    self._remove(key)
+                elif entry[1] <= now:
+                    self.expired += 1
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+            self.misses += 1
+
+        value = loader()
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, now + self.ttl, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return value
+
+    def invalidate(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """命中率与内存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stale": self.stale,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "version": self._version,
+            }
@@ -0,0 +1,157 @@
+import base64
+import json
+
+from journey_planner import parse_hhmm
+from time_columns import MINUTE_COLUMNS, TRAIN_LETTERS
+
+# 车次类型即车次代码首字母
+TRAIN_CLASSES = TRAIN_LETTERS
+
+# 没有时刻的车次排在最后
+NO_TIME = 99999
+
+# 排序键：(SQL 表达式, 是否依赖分钟列)
+# 区间时长优先用上下车站时刻计算，缺少站点时刻时退回全程运行时长
+SORT_KEYS = {
+    'train_code': ("''", False),
+    'depart': (f"COALESCE(a.depart_min, {NO_TIME})", True),
+    'arrive': (f"COALESCE(b.arrive_min, {NO_TIME})", True),
+    'duration': (f"COALESCE((b.arrive_day * 1440 + b.arrive_min) - (a.depart_day * 1440 + a.depart_min), "
+                 f"a.run_minutes, {NO_TIME})", True),
+}
+
+MAX_LIMIT = 100
+
+
+def has_minute_columns(conn):
+    """train_routes 是否已由 time_columns.py 生成整数分钟列"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(train_routes)")}
+    return set(MINUTE_COLUMNS) <= columns
+
+
+def encode_cursor(key):
+    """
+    排序键元组 -> URL 安全的翻页游标（Python 与 server.js 通用）
+    与 Node 的 JSON.stringify + Buffer 'base64url' 输出完全相同：紧凑 JSON、不带 '=' 填充
+    """
+    text = json.dumps(list(key), ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """翻页游标 -> [排序值, 车次, 出发站ID, 到达站ID]，格式不对时抛出 ValueError；有无 '=' 填充均可"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的翻页游标: {cursor}") from e
+    if not isinstance(key, list) or len(key) != 4:
+        raise ValueError(f"无效的翻页游标: {cursor}")
+    return key
+
+
+def parse_window(text):
+    """'14:00-18:00' -> (840, 1080)；只给一端时另一端取当天起止，如 '14:00-'"""
+    start, _, end = (text or '').partition('-')
+    window = (parse_hhmm(start) if start else 0, parse_hhmm(end) if end else 1439)
+    if None in window:
+        raise ValueError(f"无效的时间窗: {text}")
+    return window
+
+
+def build_route_query(start_ids, end_ids, depart_window=None, arrive_window=None, max_minutes=None,
+                      classes=None, sort='train_code', cursor=None, limit=30, minute_columns=True, train_code=None):
+    """
+    生成直达路线查询 (sql, params)
+    时间窗为 (起, 止) 当天分钟数；所有过滤条件都在 SQL 中，出发侧走 (station_id, depart_min) 索引，
+    到达侧按 (train_code, station_id) 唯一索引查找；按 (排序值, 车次, 出发站, 到达站) 做 keyset 翻页
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"不支持的排序方式: {sort}")
+    sort_sql, needs_minutes = SORT_KEYS[sort]
+    if not minute_columns and (needs_minutes or depart_window or arrive_window or max_minutes is not None):
+        raise ValueError("train_routes 缺少分钟列，请先运行 time_columns.py")
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    minute_select = ("a.depart_min, a.depart_day, b.arrive_min, b.arrive_day, a.run_minutes"
+                     if minute_columns else "NULL, NULL, NULL, NULL, NULL")
+    conditions = [
+        f"a.station_id IN ({','.join('?' * len(start_ids))})",
+        f"b.station_id IN ({','.join('?' * len(end_ids))})",
+        "a.station_no < b.station_no",
+    ]
+    params = list(start_ids) + list(end_ids)
+
+    if depart_window:
+        conditions.append("a.depart_min BETWEEN ? AND ?")
+        params.extend(depart_window)
+    if arrive_window:
+        conditions.append("b.arrive_min BETWEEN ? AND ?")
+        params.extend(arrive_window)
+    if max_minutes is not None:
+        conditions.append(f"{SORT_KEYS['duration'][0]} <= ?")
+        params.append(max_minutes)
+    if classes:
+        unknown = set(classes) - set(TRAIN_CLASSES)
+        if unknown:
+            raise ValueError(f"不支持的车次类型: {', '.join(sorted(unknown))}")
+        conditions.append(f"substr(a.train_code, 1, 1) IN ({','.join('?' * len(classes))})")
+        params.extend(classes)
+    if train_code:
+        conditions.append("a.train_code = ?")
+        params.append(train_code)
+    if cursor is not None:
+        conditions.append(f"({sort_sql}, a.train_code, a.station_id, b.station_id) > (?, ?, ?, ?)")
+        params.extend(decode_cursor(cursor) if isinstance(cursor, str) else cursor)
+
+    sql = f"""
+        SELECT {sort_sql} AS sort_key, a.train_code, a.train_full_code,
+               a.station_id, b.station_id, a.station_no, b.station_no, a.run_time,
+               {minute_select}
+        FROM train_routes a
+        JOIN train_routes b ON a.train_code = b.train_code
+        WHERE {' AND '.join(conditions)}
+        ORDER BY sort_key, a.train_code, a.station_id, b.station_id
+        LIMIT ?
+    """
+    params.append(limit)
+    return sql, params
+
+
+def search_routes(conn, start_ids, end_ids, limit=30, **filters):
+    """
+    执行直达路线查询，返回 (路线列表, 下一页游标)；没有下一页时游标为 None
+    路线为 dict：train_code, train_full_code, start_id, end_id, start_no, end_no, run_time,
+    depart_min, depart_day, arrive_min, arrive_day, duration
+    """
+    start_ids, end_ids = list(start_ids), list(end_ids)
+    if not start_ids or not end_ids:
+        return [], None
+    sql, params = build_route_query(start_ids, end_ids, limit=limit,
+                                    minute_columns=has_minute_columns(conn), **filters)
+    routes = []
+    last = None
+    for row in conn.execute(sql, params):
+        (sort_key, train_code, full_code, start_id, end_id, start_no, end_no, run_time,
+         depart_min, depart_day, arrive_min, arrive_day, run_minutes) = row
+        if depart_min is not None and arrive_min is not None:
+            duration = (arrive_day * 1440 + arrive_min) - (depart_day * 1440 + depart_min)
+        else:
+            duration = run_minutes
+        routes.append({
+            "train_code": train_code,
+            "train_full_code": full_code,
+            "start_id": start_id,
+            "end_id": end_id,
+            "start_no": start_no,
+            "end_no": end_no,
+            "run_time": run_time,
+            "depart_min": depart_min,
+            "depart_day": depart_day,
+            "arrive_min": arrive_min,
+            "arrive_day": arrive_day,
+            "duration": duration,
+        })
+        last = (sort_key, train_code, start_id, end_id)
+    next_cursor = encode_cursor(last) if last is not None and len(routes) == params[-1] else None
+    return routes, next_cursor
@@ -4,7 +4,7 @@ import sys
 
 def run_tests_with_coverage():
     """运行测试并生成覆盖率报告"""
-    print("运行 SQLite 性能测试覆盖率测试...")
+    print("运行单元测试覆盖率测试...")
     
     # 获取当前文件所在目录
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,8 +13,10 @@ def run_tests_with_coverage():
     cmd = [
         sys.executable,
         "-m", "pytest",
-        "tests/test_sqlite_performance.py",
-        "--cov=sqlite_performance_test",
+        "tests",
+        # 在线接口性能测试需要本地启动 server.js，不计入离线覆盖率
+        "--ignore=tests/test_sqlite_performance.py",
+        "--cov=.",
         "--cov-report=term",
         "--cov-report=html",
         "-v"
@@ -1,8 +1,14 @@
+import os
 import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect
 
 def create_user_db():
     try:
-        conn = sqlite3.connect('user.db')
+        conn = connect('user.db', profile='etl')
         cursor = conn.cursor()
         
         # 创建用户表
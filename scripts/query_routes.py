@@ -1,104 +1,123 @@
+import os
 import sqlite3
+import sys
+import time
 
-# 城市到多个车站的映射
-city_stations = {
-    "北京": ["北京", "北京西", "北京南", "北京东"],
-    "上海": ["上海", "上海虹桥", "上海南", "上海西"],
-    "天津": ["天津", "天津西", "天津南"],
-    "重庆": ["重庆", "重庆北", "重庆西", "重庆南"],
-    "长沙": ["长沙", "长沙南", "长沙西"],
-    "长春": ["长春", "长春西", "长春南"],
-    "成都": ["成都", "成都东", "成都南", "成都西"],
-    "福州": ["福州", "福州南"],
-    "广州": ["广州", "广州南", "广州东", "广州北"],
-    "贵阳": ["贵阳", "贵阳北"],
-    "呼和浩特": ["呼和浩特", "呼和浩特东"],
-    "哈尔滨": ["哈尔滨", "哈尔滨西", "哈尔滨东"],
-    "合肥": ["合肥", "合肥南"],
-    "杭州": ["杭州", "杭州东", "杭州南"],
-    "海口": ["海口", "海口东"],
-    "济南": ["济南", "济南西"],
-    "昆明": ["昆明", "昆明南", "昆明西"],
-    "拉萨": ["拉萨"],
-    "兰州": ["兰州", "兰州西"],
-    "南宁": ["南宁", "南宁东"],
-    "南京": ["南京", "南京南"],
-    "南昌": ["南昌", "南昌西"],
-    "沈阳": ["沈阳", "沈阳北", "沈阳南"],
-    "石家庄": ["石家庄", "石家庄北"],
-    "太原": ["太原", "太原南"],
-    "乌鲁木齐": ["乌鲁木齐", "乌鲁木齐南"],
-    "武汉": ["武汉", "汉口", "武昌"],
-    "西宁": ["西宁"],
-    "西安": ["西安", "西安北", "西安南", "西安西"],
-    "银川": ["银川"],
-    "郑州": ["郑州", "郑州东"],
-    "深圳": ["深圳", "深圳北", "深圳西", "深圳东"],
-    "厦门": ["厦门", "厦门北", "厦门高崎"]
-}
-
-def query_direct_routes(start_city, end_city):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from city_resolver import get_resolver
+from database import pooled
+from journey_planner import format_minutes
+from route_cache import RouteCache
+from route_search import TRAIN_CLASSES, parse_window, search_routes
+from seat_inventory import availability_calendar, booking_window
+from timetable_index import TimetableIndex
+
+
+_index = None
+_index_version = None
+# 直达查询结果缓存：按 (出发城市, 到达城市) 缓存车次列表，余票另行叠加
+route_cache = RouteCache(databases=('trains.db', 'stations.db'))
+
+
+def get_index():
+    """获取进程内共享的时刻表索引，首次调用或时刻表版本变化时加载"""
+    global _index, _index_version
+    version = route_cache.version()
+    if _index is None or _index_version != version:
+        _index = TimetableIndex.load('trains.db', 'stations.db')
+        _index_version = version
+    return _index
+
+
+def find_direct_routes(start_city, end_city, index=None, resolver=None):
     """
-    查询两个城市之间所有车站的直达路线，使用索引优化
+    库接口：查询两个城市之间的直达线路（内存索引）
+    城市名支持 stations.db 中的任意城市、别名或单个站名
+    返回 [(车次, 上车站, 上车站序, 下车站, 下车站序), ...]
+    未指定 index/resolver 时走结果缓存
     """
-    try:
-        # 连接数据库
-        conn_stations = sqlite3.connect('stations.db')
-        conn_trains = sqlite3.connect('trains.db')
+    if index is None and resolver is None:
+        resolver = get_resolver()
+        key = (start_city.strip(), end_city.strip())
+        return list(route_cache.get(key, lambda: get_index().direct_routes(
+            resolver.resolve(start_city), resolver.resolve(end_city))))
+    if index is None:
+        index = get_index()
+    if resolver is None:
+        resolver = get_resolver()
+    return index.direct_routes(resolver.resolve(start_city), resolver.resolve(end_city))
 
-        # 获取车站游标
-        cursor_stations = conn_stations.cursor()
-        cursor_trains = conn_trains.cursor()
 
-        # 获取城市对应车站名列表
-        start_stations = city_stations.get(start_city, [])
-        end_stations = city_stations.get(end_city, [])
-
-        if not start_stations:
-            print(f"未找到出发城市：{start_city}")
-            return
-        if not end_stations:
-            print(f"未找到到达城市：{end_city}")
-            return
-
-        # 使用 IN 子句和索引获取车站ID
-        placeholders = ','.join(['?'] * len(start_stations))
-        cursor_stations.execute(f"""
-            SELECT name, id 
-            FROM stations 
-            WHERE name IN ({placeholders})
-            /* 使用stations表的name索引 */
-        """, start_stations)
-        start_ids = cursor_stations.fetchall()
-
-        placeholders = ','.join(['?'] * len(end_stations))
-        cursor_stations.execute(f"""
-            SELECT name, id 
-            FROM stations 
-            WHERE name IN ({placeholders})
-            /* 使用stations表的name索引 */
-        """, end_stations)
-        end_ids = cursor_stations.fetchall()
-
-        if not start_ids or not end_ids:
-            print("未能找到城市中的有效车站")
-            return
+def search_direct_routes(start_city, end_city, trains_db='trains.db', stations_db='stations.db', limit=30, **filters):
+    """
+    库接口：带过滤、排序和翻页的直达查询（SQL，过滤条件下推到索引查询中）
+    filters 见 route_search.build_route_query：depart_window、arrive_window、max_minutes、classes、sort、cursor
+    返回 (路线列表, 下一页游标)，路线中附带 from_station/to_station 站名
+    """
+    resolver = get_resolver(stations_db)
+    start_ids = resolver.resolve_ids(start_city)
+    end_ids = resolver.resolve_ids(end_city)
+    names = {station_id: name for name, station_id in start_ids + end_ids}
+    with pooled(trains_db) as conn:
+        routes, next_cursor = search_routes(conn, [i for _, i in start_ids], [i for _, i in end_ids],
+                                            limit=limit, **filters)
+    for route in routes:
+        route["from_station"] = names[route["start_id"]]
+        route["to_station"] = names[route["end_id"]]
+    return routes, next_cursor
+
+
+def find_route_calendar(start_city, end_city, start_date=None, days=30, ticket_db='ticket.db', index=None):
+    """
+    库接口：查询两个城市之间每个直达车次在预售期内每天的余票
+    返回 (日期列表, [{"train_code", "from_station", "from_no", "to_station", "to_no", "tickets_left": [...]}, ...])
+    """
+    routes = find_direct_routes(start_city, end_city, index=index)
+    dates = booking_window(start_date, days)
+    with pooled(ticket_db) as conn:
+        calendar = availability_calendar(conn, [(r[0], r[2], r[4]) for r in routes], dates)
+    return dates, [
+        {
+            "train_code": train_code,
+            "from_station": from_station,
+            "from_no": from_no,
+            "to_station": to_station,
+            "to_no": to_no,
+            "tickets_left": calendar[(train_code, from_no, to_no)],
+        }
+        for train_code, from_station, from_no, to_station, to_no in routes
+    ]
+
+
+def query_direct_routes_sql(start_city, end_city, stations_db='stations.db', trains_db='trains.db'):
+    """
+    查询两个城市之间所有车站的直达路线，使用索引优化（SQL版本，用于校验内存索引结果）
+    """
+    # 城市 -> (站名, 车站ID) 由缓存的解析器完成，不再查询 stations.db
+    resolver = get_resolver(stations_db)
+    start_ids = resolver.resolve_ids(start_city)
+    end_ids = resolver.resolve_ids(end_city)
+    if not start_ids or not end_ids:
+        return []
+
+    # 从共享连接池借出只读热连接，重复查询不再重新打开数据库
+    with pooled(trains_db) as conn_trains:
+        cursor_trains = conn_trains.cursor()
 
         # 建立ID->站名映射
         station_id_to_name = {name_id[1]: name_id[0] for name_id in start_ids + end_ids}
 
-        # 使用CTE和索引优化查询
+        # 使用CTE查询；索引由 index_advisor.py 维护（station_id 开头的覆盖索引），不强制指定
         query = """
         WITH start_routes AS (
             SELECT DISTINCT train_code, station_id, station_no
             FROM train_routes
-            INDEXED BY idx_route_search  /* 使用综合索引 */
             WHERE station_id IN ({})
         ),
         end_routes AS (
             SELECT DISTINCT train_code, station_id, station_no
             FROM train_routes
-            INDEXED BY idx_route_search  /* 使用综合索引 */
             WHERE station_id IN ({})
         )
         SELECT DISTINCT 
@@ -133,24 +152,112 @@ def query_direct_routes(start_city, end_city):
             for row in cursor_trains.fetchall()
         ]
 
-        # 打印结果
-        if not routes:
-            print(f"\n未找到从 {start_city} 到 {end_city} 的直达线路")
-        else:
-            print(f"\n从 {start_city} 到 {end_city} 的直达线路：")
-            print("\n车次代码    | 上车站(序号) -> 下车站(序号)")
-            print("-" * 50)
-            for route in routes:
-                print(f"{route[0]:<12} | {route[1]}({route[2]}) -> {route[3]}({route[4]})")
-            print(f"\n共找到 {len(routes)} 条直达线路")
+        return routes
 
+
+def query_direct_routes(start_city, end_city, **filters):
+    """
+    查询两个城市之间所有车站的直达路线（命令行输出）
+    指定过滤/排序条件时走 search_direct_routes
+    """
+    if filters:
+        return query_filtered_routes(start_city, end_city, **filters)
+    resolver = get_resolver()
+    if not resolver.resolve(start_city):
+        print(f"未找到出发城市：{start_city}")
+        return
+    if not resolver.resolve(end_city):
+        print(f"未找到到达城市：{end_city}")
+        return
+
+    try:
+        start = time.perf_counter()
+        routes = find_direct_routes(start_city, end_city)
+        elapsed = (time.perf_counter() - start) * 1000
+    except sqlite3.Error as e:
+        print(f"数据库错误: {e}")
+        return
+
+    # 打印结果
+    if not routes:
+        print(f"\n未找到从 {start_city} 到 {end_city} 的直达线路")
+    else:
+        print(f"\n从 {start_city} 到 {end_city} 的直达线路：")
+        print("\n车次代码    | 上车站(序号) -> 下车站(序号)")
+        print("-" * 50)
+        for route in routes:
+            print(f"{route[0]:<12} | {route[1]}({route[2]}) -> {route[3]}({route[4]})")
+        print(f"\n共找到 {len(routes)} 条直达线路，查询耗时 {elapsed:.3f} 毫秒")
+
+
+def query_filtered_routes(start_city, end_city, **filters):
+    """带过滤、排序的直达查询（命令行输出，显示第一页）"""
+    try:
+        start = time.perf_counter()
+        routes, next_cursor = search_direct_routes(start_city, end_city, **filters)
+        elapsed = (time.perf_counter() - start) * 1000
+    except (sqlite3.Error, ValueError) as e:
+        print(f"查询失败: {e}")
+        return
+
+    if not routes:
+        print(f"\n未找到从 {start_city} 到 {end_city} 符合条件的直达线路")
+        return
+    print(f"\n从 {start_city} 到 {end_city} 的直达线路：")
+    print("\n车次代码    | 上车站(序号) -> 下车站(序号) | 出发  | 历时(分钟)")
+    print("-" * 70)
+    for route in routes:
+        depart = format_minutes(route["depart_min"]) if route["depart_min"] is not None else "--:--"
+        print(f"{route['train_code']:<12} | {route['from_station']}({route['start_no']}) -> "
+              f"{route['to_station']}({route['end_no']}) | {depart} | {route['duration'] or '未知'}")
+    print(f"\n本页 {len(routes)} 条，查询耗时 {elapsed:.3f} 毫秒" + ("，还有下一页" if next_cursor else ""))
+
+
+def query_route_calendar(start_city, end_city, days=30):
+    """
+    查询两个城市之间直达车次未来若干天的余票（命令行输出）
+    """
+    resolver = get_resolver()
+    if not resolver.resolve(start_city) or not resolver.resolve(end_city):
+        print(f"不支持的城市：{start_city} -> {end_city}")
+        return
+
+    try:
+        start = time.perf_counter()
+        dates, calendar = find_route_calendar(start_city, end_city, days=days)
+        elapsed = (time.perf_counter() - start) * 1000
     except sqlite3.Error as e:
         print(f"数据库错误: {e}")
-    finally:
-        conn_stations.close()
-        conn_trains.close()
+        return
+
+    if not calendar:
+        print(f"\n未找到从 {start_city} 到 {end_city} 的直达线路")
+        return
+    print(f"\n从 {start_city} 到 {end_city} 未来 {days} 天余票（{dates[0]} 起）：")
+    for item in calendar:
+        counts = ' '.join(f"{n:>3}" for n in item["tickets_left"])
+        print(f"{item['train_code']:<8} {item['from_station']}->{item['to_station']} | {counts}")
+    print(f"\n共 {len(calendar)} 个车次，查询耗时 {elapsed:.3f} 毫秒")
+
 
 if __name__ == '__main__':
     start = input("请输入出发城市：")
     end = input("请输入到达城市：")
-    query_direct_routes(start, end)
+    # 可选参数: --depart=14:00-18:00 --arrive=-22:00 --max=300 --class=G,D --sort=depart|arrive|duration
+    filters = {}
+    for arg in sys.argv[1:]:
+        name, _, value = arg.partition('=')
+        if name == '--depart':
+            filters['depart_window'] = parse_window(value)
+        elif name == '--arrive':
+            filters['arrive_window'] = parse_window(value)
+        elif name == '--max':
+            filters['max_minutes'] = int(value)
+        elif name == '--class':
+            filters['classes'] = [c for c in value.upper().split(',') if c in TRAIN_CLASSES]
+        elif name == '--sort':
+            filters['sort'] = value
+    if '--calendar' in sys.argv:
+        query_route_calendar(start, end)
+    else:
+        query_direct_routes(start, end, **filters)
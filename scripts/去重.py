@@ -1,55 +1,131 @@
+import os
 import sqlite3
+import sys
+import time
 
-def remove_duplicates():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import bump_timetable_version, connect
+
+# 判定完全重复的列（NULL 视为相同，与 GROUP BY 语义一致）
+DEDUP_COLUMNS = ('train_code', 'station_id', 'station_no', 'train_full_code')
+
+# 按组内顺序编号，保留每组 id 最小的记录，其余为待删除
+DUPLICATE_IDS_SQL = f"""
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY {', '.join(DEDUP_COLUMNS)} ORDER BY id) AS rn
+        FROM train_routes
+    )
+    WHERE rn > 1
+"""
+
+
+def duplicate_summary(conn, sample=5):
+    """统计重复组数、多余记录数，并返回若干示例组（只读）"""
+    groups, extra = conn.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(cnt - 1), 0) FROM (
+            SELECT COUNT(*) AS cnt FROM train_routes
+            GROUP BY {', '.join(DEDUP_COLUMNS)}
+            HAVING COUNT(*) > 1
+        )
+    """).fetchone()
+    examples = conn.execute(f"""
+        SELECT {', '.join(DEDUP_COLUMNS)}, COUNT(*) AS cnt, MIN(id)
+        FROM train_routes
+        GROUP BY {', '.join(DEDUP_COLUMNS)}
+        HAVING COUNT(*) > 1
+        ORDER BY cnt DESC
+        LIMIT ?
+    """, (sample,)).fetchall()
+    return groups, extra, examples
+
+
+def delete_duplicates(conn, chunk_size=5000, progress=None):
+    """
+    分批删除重复记录
+    待删除 id 先写入临时表（只读主库，不持有写锁），之后每批一个短事务，WAL 下读者不受影响
+    删除前再次确认组内仍有更小 id 的记录，避免与并发写入冲突时误删
+    返回删除的记录数
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.dedup_ids")
+    conn.execute("CREATE TEMP TABLE dedup_ids (id INTEGER PRIMARY KEY)")
+    conn.execute(f"INSERT INTO temp.dedup_ids (id) {DUPLICATE_IDS_SQL}")
+    conn.commit()
+    total = conn.execute("SELECT COUNT(*) FROM temp.dedup_ids").fetchone()[0]
+
+    still_duplicate = ' AND '.join(f"k.{col} IS train_routes.{col}" for col in DEDUP_COLUMNS)
+    deleted = 0
+    processed = 0
+    last_id = -1
+    while True:
+        bounds = conn.execute("""
+            SELECT MAX(id), COUNT(*) FROM (
+                SELECT id FROM temp.dedup_ids WHERE id > ? ORDER BY id LIMIT ?
+            )
+        """, (last_id, chunk_size)).fetchone()
+        if not bounds[1]:
+            break
+        upper = bounds[0]
+        cursor = conn.execute(f"""
+            DELETE FROM train_routes
+            WHERE id IN (SELECT id FROM temp.dedup_ids WHERE id > ? AND id <= ?)
+              AND EXISTS (
+                  SELECT 1 FROM train_routes k
+                  WHERE k.id < train_routes.id AND {still_duplicate}
+              )
+        """, (last_id, upper))
+        deleted += cursor.rowcount
+        processed += bounds[1]
+        conn.commit()
+        last_id = upper
+        if progress:
+            progress(processed, total, deleted)
+
+    if deleted:
+        bump_timetable_version(conn)
+        conn.commit()
+    conn.execute("DROP TABLE IF EXISTS temp.dedup_ids")
+    return deleted
+
+
+def remove_duplicates(db_path='trains.db', dry_run=False, chunk_size=5000):
+    """删除 train_routes 中完全重复的记录；dry_run=True 时只读统计，返回重复组数"""
+    conn = None
     try:
-        conn = sqlite3.connect('trains.db')
+        conn = connect(db_path, profile='query' if dry_run else 'etl', readonly=dry_run)
         cursor = conn.cursor()
 
         print("开始查找重复记录...")
+        groups, extra, examples = duplicate_summary(conn)
+        print(f"\n找到 {groups} 组完全重复的记录，共 {extra} 条多余记录")
+
+        if dry_run:
+            if examples:
+                print("\n重复最多的组:")
+                print("车次代码  | 站点ID | 站序 | 完整车次代码 | 重复数 | 保留ID")
+                print("-" * 60)
+                for row in examples:
+                    print(f"{row[0]:<8} | {row[1]!s:<6} | {row[2]!s:<4} | {row[3]} | {row[4]} | {row[5]}")
+            print("\n试运行模式，未修改数据库")
+            return groups
+
+        if groups > 0:
+            start = time.perf_counter()
+
+            def report(processed, total, deleted):
+                rate = processed / (time.perf_counter() - start or 1e-9)
+                print(f"  进度 {processed}/{total}（{processed / total:.1%}），已删除 {deleted} 条，{rate:,.0f} 条/秒")
+
+            deleted_count = delete_duplicates(conn, chunk_size, progress=report)
 
-        # 找出完全重复的记录
-        cursor.execute("""
-            WITH duplicates AS (
-                SELECT 
-                    train_code,
-                    station_id,
-                    station_no,
-                    train_full_code,
-                    COUNT(*) as cnt,
-                    MIN(id) as min_id
-                FROM train_routes
-                GROUP BY train_code, station_id, station_no, train_full_code
-                HAVING COUNT(*) > 1
-            )
-            SELECT COUNT(*) as total_duplicates
-            FROM duplicates
-        """)
-        
-        duplicate_count = cursor.fetchone()[0]
-        print(f"\n找到 {duplicate_count} 组完全重复的记录")
-
-        if duplicate_count > 0:
-            # 删除重复记录，保留最小ID的记录
-            cursor.execute("""
-                DELETE FROM train_routes
-                WHERE id NOT IN (
-                    SELECT MIN(id)
-                    FROM train_routes
-                    GROUP BY train_code, station_id, station_no, train_full_code
-                )
-            """)
-            
-            deleted_count = cursor.rowcount
-            conn.commit()
-            
             # 验证结果
             cursor.execute("SELECT COUNT(*) FROM train_routes")
             remaining_records = cursor.fetchone()[0]
-            
+
             print(f"\n清理完成:")
             print(f"删除的重复记录数: {deleted_count}")
             print(f"剩余记录总数: {remaining_records}")
-            
+
             # 显示一些示例数据
             print("\n剩余记录示例:")
             cursor.execute("""
@@ -57,19 +133,28 @@ def remove_duplicates():
                 FROM train_routes
                 LIMIT 5
             """)
-            
+
             print("\nID     | 车次代码  | 站点ID | 站序 | 完整车次代码")
             print("-" * 60)
             for row in cursor.fetchall():
                 print(f"{row[0]:<6} | {row[1]:<8} | {row[2]:<6} | {row[3]:<4} | {row[4]}")
+            return deleted_count
         else:
             print("数据库中没有找到完全重复的记录")
+            return 0
 
     except sqlite3.Error as e:
         print(f"数据库错误: {e}")
-        conn.rollback()
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+        return None
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 if __name__ == '__main__':
-    remove_duplicates()
\ No newline at end of file
+    chunk = 5000
+    for arg in sys.argv[1:]:
+        if arg.startswith('--chunk='):
+            chunk = int(arg.split('=', 1)[1])
+    remove_duplicates(dry_run='--dry-run' in sys.argv, chunk_size=chunk)
@@ -1,67 +1,56 @@
+import os
 import sqlite3
+import sys
 
-def create_indexes():
-    try:
-        conn = sqlite3.connect('trains.db')
-        cursor = conn.cursor()
-        
-        # 先删除现有索引
-        print("正在删除现有索引...")
-        cursor.execute("DROP INDEX IF EXISTS idx_train_station_no")
-        cursor.execute("DROP INDEX IF EXISTS idx_station_order")
-        
-        print("正在创建新索引...")
-        
-        # 1. 为车次代码创建索引 - 支持快速查找特定车次
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_train_code 
-        ON train_routes(train_code)
-        ''')
-        
-        # 2. 为站序和车次创建复合索引 - 优化站序查询
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_station_train 
-        ON train_routes(station_no, train_code)
-        ''')
-        
-        # 3. 站点ID索引 - 优化站点查找
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_station_id
-        ON train_routes(station_id)
-        ''')
-        
-        # 4. 完整车次代码索引 - 支持全车次号查询
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_train_full_code
-        ON train_routes(train_full_code)
-        ''')
-        
-        # 5. 综合索引 - 优化多条件查询
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_route_search
-        ON train_routes(train_code, station_id, station_no)
-        ''')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-        conn.commit()
-        
-        # 验证索引创建
-        cursor.execute("""
-            SELECT name, tbl_name 
-            FROM sqlite_master 
-            WHERE type='index' AND tbl_name='train_routes'
-        """)
-        
-        indexes = cursor.fetchall()
-        print("\n已创建的索引:")
-        for idx in indexes:
-            print(f"- {idx[0]}")
-        
-        print("\n索引创建完成")
-        
-    except sqlite3.Error as e:
-        print(f"创建索引时发生错误: {e}")
-    finally:
-        conn.close()
+from database import connect
+from index_advisor import WORKLOAD, advise_database, apply_advice, check_plans, print_advice
+
+def create_indexes(databases=('trains.db', 'ticket.db'), dry_run=False):
+    """
+    按实际查询负载维护索引：删除冗余索引，创建缺失的覆盖索引
+    完成后对真实数据库再做一次 EXPLAIN QUERY PLAN 检查，返回仍为全表扫描的在线查询
+    """
+    violations = []
+    for db_path in databases:
+        conn = None
+        try:
+            advice = advise_database(db_path)
+            print_advice(db_path, advice)
+            if dry_run:
+                continue
+
+            conn = connect(db_path, profile='etl')
+            print(f"\n正在更新 {db_path} 的索引...")
+            apply_advice(conn, advice)
+
+            # 验证索引
+            cursor = conn.execute("""
+                SELECT name, tbl_name
+                FROM sqlite_master
+                WHERE type='index'
+                ORDER BY tbl_name, name
+            """)
+            print("当前索引:")
+            for name, table in cursor.fetchall():
+                print(f"- {table}.{name}")
+
+            for name, detail in check_plans(conn, WORKLOAD[db_path]):
+                print(f"警告: 在线查询 {name} 为全表扫描: {detail}")
+                violations.append((db_path, name, detail))
+
+        except sqlite3.Error as e:
+            print(f"更新 {db_path} 索引时发生错误: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    if dry_run:
+        print("\n试运行模式，未修改数据库")
+    else:
+        print("\n索引更新完成")
+    return violations
 
 if __name__ == '__main__':
-    create_indexes()
\ No newline at end of file
+    create_indexes(dry_run='--dry-run' in sys.argv)
@@ -0,0 +1,184 @@
+import random
+import statistics
+import sys
+import time
+
+from seat_inventory import DEFAULT_TOTAL_SEATS, SeatInventory
+
+
+def _lowest_seat(mask):
+    """位图中编号最小的座位"""
+    return (mask & -mask).bit_length()
+
+
+def _extension_masks(free_mask, segments):
+    """
+    按距离划分空闲座位：返回列表 exact，exact[d] 为空闲区间恰好再延伸 d 段的座位位图
+    segments 为从请求区间向外逐段排列的区间占用位图
+    """
+    exact = []
+    reach = free_mask
+    for segment in segments:
+        extended = reach & ~segment
+        exact.append(reach & ~extended)
+        reach = extended
+        if not reach:
+            break
+    exact.append(reach)
+    return exact
+
+
+def first_fit(day, free_mask, start_no, end_no):
+    """首次适应：编号最小的空闲座位（server.js 现有做法）"""
+    return _lowest_seat(free_mask)
+
+
+def best_fit(day, free_mask, start_no, end_no):
+    """
+    最佳适应：选择所在空闲区间最短的座位，尽量不切开长途旅客需要的整段空座
+    按左右两侧可延伸的段数分组，按剩余段数从小到大求交集，全部为位图运算
+    """
+    segments = day.segments
+    left = _extension_masks(free_mask, (segments[k] for k in range(min(start_no, len(segments)) - 1, 0, -1)))
+    right = _extension_masks(free_mask, (segments[k] for k in range(end_no, len(segments))))
+    for waste in range(len(left) + len(right) - 1):
+        for d in range(max(0, waste - len(right) + 1), min(waste, len(left) - 1) + 1):
+            hit = left[d] & right[waste - d]
+            if hit:
+                return _lowest_seat(hit)
+    return _lowest_seat(free_mask)
+
+
+def consolidate(day, free_mask, start_no, end_no):
+    """
+    集中分配：优先选择与已售区间首尾相接的座位，其次选择已有占用的座位，把整段空座留给长途需求
+    """
+    segments = day.segments
+    before = segments[start_no - 1] if 0 < start_no <= len(segments) else 0
+    after = segments[end_no] if end_no < len(segments) else 0
+    used = 0
+    for segment in segments:
+        used |= segment
+    for tier in (before & after, before | after, used):
+        hit = free_mask & tier
+        if hit:
+            return _lowest_seat(hit)
+    return _lowest_seat(free_mask)
+
+
+# 选座策略注册表：策略函数签名为 (车次当日矩阵, 空闲座位位图, 起始站序, 终止站序) -> 座位号
+STRATEGIES = {
+    'first_fit': first_fit,
+    'best_fit': best_fit,
+    'consolidate': consolidate,
+}
+
+
+def register_strategy(name, func):
+    """注册自定义选座策略"""
+    STRATEGIES[name] = func
+
+
+class SeatAllocator:
+    """在 SeatInventory 之上按可插拔策略分配座位"""
+
+    def __init__(self, inventory=None, strategy='best_fit'):
+        self.inventory = inventory if inventory is not None else SeatInventory()
+        self.strategy = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+
+    @classmethod
+    def from_db(cls, db_path='ticket.db', strategy='best_fit', total_seats=DEFAULT_TOTAL_SEATS, **filters):
+        """从 ticket.db 的 seat_occupancy 加载库存并创建分配器"""
+        return cls(SeatInventory.from_db(db_path, total_seats=total_seats, **filters), strategy)
+
+    def choose(self, train_code, travel_date, start_no, end_no):
+        """按策略选出座位但不占用，没有空座时返回 None"""
+        day = self.inventory.get(train_code, travel_date)
+        free_mask = day.free_mask(start_no, end_no)
+        if not free_mask:
+            return None
+        return self.strategy(day, free_mask, start_no, end_no)
+
+    def allocate(self, train_code, travel_date, start_no, end_no):
+        """分配并占用座位，没有空座时返回 None"""
+        seat = self.choose(train_code, travel_date, start_no, end_no)
+        if seat is not None:
+            self.inventory.occupy(train_code, travel_date, seat, start_no, end_no)
+        return seat
+
+    def release(self, train_code, travel_date, seat_number, start_no, end_no):
+        """释放座位（退票/改签）"""
+        self.inventory.release(train_code, travel_date, seat_number, start_no, end_no)
+
+
+def record_occupancy(conn, train_code, travel_date, seat_number, start_no, end_no, ticket_id):
+    """写入 seat_occupancy 记录，由调用方负责提交事务"""
+    conn.execute("""
+        INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no, ticket_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (train_code, travel_date, seat_number, start_no, end_no, ticket_id))
+
+
+def generate_requests(count, stops, seed=1):
+    """生成随机区间购票请求：短途居多，也有一定比例的全程长途"""
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            start_no = rng.randint(1, 2)
+            end_no = rng.randint(stops - 1, stops)
+        else:
+            start_no = rng.randint(1, stops - 1)
+            end_no = min(stops, start_no + rng.randint(1, 4))
+        requests.append((start_no, end_no))
+    return requests
+
+
+def benchmark_strategies(total_seats=DEFAULT_TOTAL_SEATS, stops=20, requests=None, strategies=None, seed=1):
+    """
+    用同一组请求对比各策略的售出率和分配延迟
+    售出率 = 成功出票数 / 请求数；长途售出率只统计跨越一半以上区间的请求
+    座位利用率 = 已售区间段数 / (座位数 × 区间数)
+    """
+    if requests is None:
+        requests = generate_requests(total_seats * 4, stops, seed)
+    long_haul = (stops - 1) / 2
+    long_requests = sum(1 for start_no, end_no in requests if end_no - start_no > long_haul) or 1
+    results = {}
+    for name in strategies or STRATEGIES:
+        inventory = SeatInventory(total_seats)
+        allocator = SeatAllocator(inventory, name)
+        latencies = []
+        sold = 0
+        long_sold = 0
+        for start_no, end_no in requests:
+            t0 = time.perf_counter()
+            seat = allocator.allocate('BENCH', '2025-01-01', start_no, end_no)
+            latencies.append(time.perf_counter() - t0)
+            if seat is not None:
+                sold += 1
+                if end_no - start_no > long_haul:
+                    long_sold += 1
+        day = inventory.get('BENCH', '2025-01-01')
+        used = sum(mask.bit_count() for mask in day.seat_segments)
+        latencies.sort()
+        results[name] = {
+            "sold": sold,
+            "sell_through": sold / len(requests),
+            "long_sell_through": long_sold / long_requests,
+            "utilization": used / (total_seats * (stops - 1)),
+            "p50_us": statistics.median(latencies) * 1e6,
+            "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        }
+    return results
+
+
+if __name__ == '__main__':
+    seats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TOTAL_SEATS
+    stops = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"选座策略对比: {seats}座 × {stops}站")
+    print("策略          | 售出数 | 售出率  | 长途售出率 | 利用率  | P50(微秒) | P99(微秒)")
+    print("-" * 80)
+    for name, r in benchmark_strategies(seats, stops).items():
+        print(f"{name:<13} | {r['sold']:<6} | {r['sell_through']:.2%} | {r['long_sell_through']:<10.2%} |"
+              f" {r['utilization']:.2%} | {r['p50_us']:<9.2f} | {r['p99_us']:.2f}")
@@ -0,0 +1,284 @@
+import random
+import time
+from datetime import date, timedelta
+
+from database import connect
+
+# 与 server.js 保持一致：每个车次100个座位，可预订未来30天
+DEFAULT_TOTAL_SEATS = 100
+BOOKING_WINDOW_DAYS = 30
+
+
+def segment_range(start_no, end_no):
+    """[start_no, end_no) 对应的区间位图"""
+    return ((1 << end_no) - 1) ^ ((1 << start_no) - 1)
+
+
+class TrainDayInventory:
+    """
+    单个车次单日的座位占用矩阵（座位 × 区间）
+    按区间存放座位位图：segments[k] 的第 i 位表示 i+1 号座位在 [k, k+1) 区间已被占用
+    查询 [a, b) 的占用情况只需把 segments[a:b] 做按位或，一次处理全部座位
+    同时按座位存放区间位图：seat_segments[i] 的第 k 位表示 i+1 号座位的 [k, k+1) 区间已被占用，供选座策略使用
+    """
+
+    __slots__ = ('total_seats', 'all_seats', 'segments', 'seat_segments')
+
+    def __init__(self, total_seats=DEFAULT_TOTAL_SEATS):
+        self.total_seats = total_seats
+        self.all_seats = (1 << total_seats) - 1
+        self.segments = []
+        self.seat_segments = [0] * total_seats
+
+    def _ensure(self, end_no):
+        if len(self.segments) < end_no:
+            self.segments.extend([0] * (end_no - len(self.segments)))
+
+    @classmethod
+    def from_segments(cls, segments, total_seats=DEFAULT_TOTAL_SEATS):
+        """由区间位图列表重建矩阵（按座位的区间位图随之推出），用于从快照恢复"""
+        day = cls(total_seats)
+        day.segments = list(segments)
+        seat_segments = day.seat_segments
+        for k, segment in enumerate(day.segments):
+            while segment:
+                low = segment & -segment
+                seat_segments[low.bit_length() - 1] |= 1 << k
+                segment ^= low
+        return day
+
+    def copy(self):
+        """复制占用矩阵（写事务在副本上修改，提交后再替换原矩阵）"""
+        day = TrainDayInventory.__new__(TrainDayInventory)
+        day.total_seats = self.total_seats
+        day.all_seats = self.all_seats
+        day.segments = list(self.segments)
+        day.seat_segments = list(self.seat_segments)
+        return day
+
+    def occupy(self, seat_number, start_no, end_no):
+        """标记座位在 [start_no, end_no) 区间被占用"""
+        bit = 1 << (seat_number - 1)
+        self._ensure(end_no)
+        segments = self.segments
+        for k in range(start_no, end_no):
+            segments[k] |= bit
+        self.seat_segments[seat_number - 1] |= segment_range(start_no, end_no)
+
+    def release(self, seat_number, start_no, end_no):
+        """释放座位在 [start_no, end_no) 区间的占用"""
+        bit = ~(1 << (seat_number - 1))
+        segments = self.segments
+        for k in range(start_no, min(end_no, len(segments))):
+            segments[k] &= bit
+        self.seat_segments[seat_number - 1] &= ~segment_range(start_no, end_no)
+
+    def occupied_mask(self, start_no, end_no):
+        """[start_no, end_no) 区间内任一段被占用的座位位图"""
+        mask = 0
+        for segment in self.segments[start_no:end_no]:
+            mask |= segment
+        return mask
+
+    def free_mask(self, start_no, end_no):
+        """[start_no, end_no) 全程空闲的座位位图"""
+        return self.all_seats & ~self.occupied_mask(start_no, end_no)
+
+    def count_free(self, start_no, end_no):
+        """[start_no, end_no) 全程空闲的座位数"""
+        return self.free_mask(start_no, end_no).bit_count()
+
+    def free_seats(self, start_no, end_no):
+        """[start_no, end_no) 全程空闲的座位号列表（升序）"""
+        mask = self.free_mask(start_no, end_no)
+        seats = []
+        while mask:
+            low = mask & -mask
+            seats.append(low.bit_length())
+            mask ^= low
+        return seats
+
+    def first_free_seat(self, start_no, end_no):
+        """编号最小的空闲座位，没有时返回 None"""
+        mask = self.free_mask(start_no, end_no)
+        return (mask & -mask).bit_length() if mask else None
+
+
+class SeatInventory:
+    """按 (车次, 日期) 管理座位占用矩阵，数据来源为 ticket.db 的 seat_occupancy 表"""
+
+    def __init__(self, total_seats=DEFAULT_TOTAL_SEATS):
+        self.total_seats = total_seats
+        self.trains = {}
+
+    def get(self, train_code, travel_date):
+        """获取车次当日的占用矩阵，不存在时创建空矩阵"""
+        key = (train_code, travel_date)
+        inventory = self.trains.get(key)
+        if inventory is None:
+            inventory = self.trains[key] = TrainDayInventory(self.total_seats)
+        return inventory
+
+    def add_rows(self, rows):
+        """加入 (train_code, travel_date, seat_number, start_station_no, end_station_no) 占用记录"""
+        count = 0
+        for train_code, travel_date, seat_number, start_no, end_no in rows:
+            self.get(train_code, travel_date).occupy(int(seat_number), int(start_no), int(end_no))
+            count += 1
+        return count
+
+    def load(self, conn, train_codes=None, travel_date=None, date_from=None, date_to=None):
+        """
+        从 seat_occupancy 一次性加载占用记录
+        可按车次列表、日期或日期范围 [date_from, date_to] 过滤，返回加载的记录数
+        """
+        sql = "SELECT train_code, travel_date, seat_number, start_station_no, end_station_no FROM seat_occupancy"
+        conditions = []
+        params = []
+        if train_codes is not None:
+            train_codes = list(train_codes)
+            if not train_codes:
+                return 0
+            conditions.append(f"train_code IN ({','.join('?' * len(train_codes))})")
+            params.extend(train_codes)
+        if travel_date is not None:
+            conditions.append("travel_date = ?")
+            params.append(travel_date)
+        if date_from is not None:
+            conditions.append("travel_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append("travel_date <= ?")
+            params.append(date_to)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.add_rows(conn.execute(sql, params))
+
+    @classmethod
+    def from_db(cls, db_path='ticket.db', total_seats=DEFAULT_TOTAL_SEATS, **filters):
+        """从数据库文件创建并加载库存"""
+        inventory = cls(total_seats)
+        conn = connect(db_path, profile='query', readonly=True)
+        try:
+            inventory.load(conn, **filters)
+        finally:
+            conn.close()
+        return inventory
+
+    def base_day(self, train_code, travel_date):
+        """trains 之外的底层矩阵（每次新建）；普通库存没有底层，返回 None，见 inventory_snapshot.SnapshotInventory"""
+        return None
+
+    def forget(self, train_code, travel_date):
+        """丢弃某车次某日的矩阵（连同底层中的），之后按没有占用处理"""
+        self.trains.pop((train_code, travel_date), None)
+
+    def replace_date(self, travel_date, trains):
+        """用重新读取的 trains 替换某日的全部矩阵：先放入新矩阵，再删除该日已没有占用的车次"""
+        self.trains.update(trains)
+        for key in [key for key in self.trains if key[1] == travel_date and key not in trains]:
+            del self.trains[key]
+
+    def occupy(self, train_code, travel_date, seat_number, start_no, end_no):
+        self.get(train_code, travel_date).occupy(seat_number, start_no, end_no)
+
+    def release(self, train_code, travel_date, seat_number, start_no, end_no):
+        inventory = self.trains.get((train_code, travel_date))
+        if inventory is not None:
+            inventory.release(seat_number, start_no, end_no)
+
+    def free_seats(self, train_code, travel_date, start_no, end_no):
+        """某车次某日 [start_no, end_no) 的空闲座位号"""
+        return self.get(train_code, travel_date).free_seats(start_no, end_no)
+
+    def count_available(self, train_code, travel_date, start_no, end_no):
+        """某车次某日 [start_no, end_no) 的空闲座位数"""
+        inventory = self.trains.get((train_code, travel_date))
+        if inventory is None:
+            return self.total_seats
+        return inventory.count_free(start_no, end_no)
+
+    def count_available_many(self, queries):
+        """批量查询空闲座位数，queries 为 (train_code, travel_date, start_no, end_no) 序列"""
+        trains = self.trains
+        total = self.total_seats
+        counts = []
+        for train_code, travel_date, start_no, end_no in queries:
+            inventory = trains.get((train_code, travel_date))
+            counts.append(total if inventory is None else inventory.count_free(start_no, end_no))
+        return counts
+
+
+def booking_window(start_date=None, days=BOOKING_WINDOW_DAYS):
+    """
+    预售期内的日期列表（'YYYY-MM-DD'），默认从明天开始：今天的车次已不能预订，
+    与 api_service.parse_order 和 server.js 的 bookingWindowDates 相同
+    """
+    if start_date is None:
+        start_date = date.today() + timedelta(days=1)
+    elif isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date)
+    return [(start_date + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def availability_calendar(conn, routes, dates, total_seats=DEFAULT_TOTAL_SEATS):
+    """
+    多日余票查询：routes 为 (train_code, start_no, end_no) 序列，dates 为升序日期列表
+    对 seat_occupancy 只做一次 (train_code, travel_date) 范围扫描
+    返回 {(train_code, start_no, end_no): [与 dates 对齐的余票数]}
+    """
+    routes = list(routes)
+    if not routes or not dates:
+        return {route: [] for route in routes}
+    inventory = SeatInventory(total_seats)
+    inventory.load(conn, train_codes={route[0] for route in routes}, date_from=dates[0], date_to=dates[-1])
+    return {
+        route: inventory.count_available_many((route[0], travel_date, route[1], route[2]) for travel_date in dates)
+        for route in routes
+    }
+
+
+def count_free_naive(records, total_seats, start_no, end_no):
+    """server.js 现有算法：逐个座位检查所有占用记录，用于对比"""
+    free = 0
+    for seat in range(1, total_seats + 1):
+        if not any(r[0] == seat and not (r[2] <= start_no or r[1] >= end_no) for r in records):
+            free += 1
+    return free
+
+
+def benchmark(total_seats=1000, stops=30, records=5000, queries=200, seed=1):
+    """对比位图矩阵与逐座位循环在大车次上的查询耗时"""
+    rng = random.Random(seed)
+    inventory = TrainDayInventory(total_seats)
+    occupancy = []
+    for _ in range(records):
+        seat = rng.randint(1, total_seats)
+        start_no = rng.randint(1, stops - 1)
+        end_no = rng.randint(start_no + 1, stops)
+        if inventory.free_mask(start_no, end_no) >> (seat - 1) & 1:
+            inventory.occupy(seat, start_no, end_no)
+            occupancy.append((seat, start_no, end_no))
+
+    ranges = []
+    for _ in range(queries):
+        start_no = rng.randint(1, stops - 1)
+        ranges.append((start_no, rng.randint(start_no + 1, stops)))
+
+    start = time.perf_counter()
+    fast = [inventory.count_free(a, b) for a, b in ranges]
+    fast_seconds = time.perf_counter() - start
+
+    sample = ranges[:10]
+    start = time.perf_counter()
+    slow = [count_free_naive(occupancy, total_seats, a, b) for a, b in sample]
+    slow_seconds = (time.perf_counter() - start) * len(ranges) / len(sample)
+
+    assert fast[:len(sample)] == slow
+    print(f"{total_seats}座 × {stops}站，占用记录 {len(occupancy)} 条，查询 {queries} 次")
+    print(f"位图矩阵: {fast_seconds * 1000:.3f} 毫秒 ({fast_seconds / queries * 1e6:.2f} 微秒/次)")
+    print(f"逐座位循环(估算): {slow_seconds * 1000:.1f} 毫秒 ({slow_seconds / queries * 1e6:.0f} 微秒/次)")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -3,6 +3,7 @@ import cors from 'cors';
 import svgCaptcha from 'svg-captcha';
 import knexLib from 'knex';
 import jwt from 'jsonwebtoken';
+import fs from 'fs';
 
 const app = express();
 app.use(cors());
@@ -143,10 +144,8 @@ async function initTicketDb() {
       // 添加唯一约束确保不会重复记录
       table.unique(['train_code', 'travel_date', 'seat_number', 'start_station_no', 'end_station_no']);
       
-      // 索引
-      table.index(['train_code', 'travel_date']);
-      table.index(['seat_number']);
-      table.index(['start_station_no', 'end_station_no']);
+      // 索引：按车次+日期查询由上面的唯一索引覆盖；退票/改签按票ID释放座位（见 index_advisor.py）
+      table.index(['ticket_id'], 'idx_seat_occupancy_ticket');
     });
   }
 }
@@ -329,43 +328,334 @@ app.get('/api/captcha', (req, res) => {
   res.status(200).send(captcha.data); 
 });
 
-// 站点城市映射 - 更新包含所有主要城市
-const city_stations = {
-  "北京": ["北京", "北京西", "北京南", "北京东"],
-  "上海": ["上海", "上海虹桥", "上海南", "上海西"],
-  "天津": ["天津", "天津西", "天津南", "天津北"],
-  "重庆": ["重庆", "重庆北", "重庆西", "重庆南"],
-  "广州": ["广州", "广州南", "广州东", "广州北"],
-  "深圳": ["深圳", "深圳北", "深圳东", "深圳西"],
-  "成都": ["成都", "成都东", "成都南", "成都西"],
-  "武汉": ["武汉", "汉口", "武昌", "武汉西"],
-  "西安": ["西安", "西安北", "西安南", "西安东"],
-  "南京": ["南京", "南京南", "南京北", "南京西"],
-  "杭州": ["杭州", "杭州东", "杭州南", "杭州西"],
-  "长沙": ["长沙", "长沙南", "长沙西", "长沙北"],
-  "长春": ["长春", "长春西", "长春南", "长春北"],
-  "福州": ["福州", "福州南", "福州北"],
-  "贵阳": ["贵阳", "贵阳北", "贵阳东"],
-  "呼和浩特": ["呼和浩特", "呼和浩特东"],
-  "哈尔滨": ["哈尔滨", "哈尔滨东", "哈尔滨西", "哈尔滨北"],
-  "合肥": ["合肥", "合肥南", "合肥北", "合肥西"],
-  "海口": ["海口", "海口东"],
-  "济南": ["济南", "济南西", "济南东"],
-  "昆明": ["昆明", "昆明南", "昆明北"],
-  "拉萨": ["拉萨"],
-  "兰州": ["兰州", "兰州西", "兰州东"],
-  "南宁": ["南宁", "南宁东", "南宁西"],
-  "南昌": ["南昌", "南昌西", "南昌东"],
-  "沈阳": ["沈阳", "沈阳北", "沈阳南", "沈阳东"],
-  "石家庄": ["石家庄", "石家庄北", "石家庄东"],
-  "太原": ["太原", "太原南", "太原东", "太原北"],
-  "乌鲁木齐": ["乌鲁木齐", "乌鲁木齐南"],
-  "西宁": ["西宁", "西宁西"],
-  "银川": ["银川", "银川东"],
-  "大连": ["大连", "大连北", "大连南"],
-  "青岛": ["青岛", "青岛北", "青岛西"],
-  "厦门": ["厦门", "厦门北", "厦门高崎"]
+// 城市/车站解析缓存：启动时从 stations.db 加载，stations.db（含 WAL）变化后自动重建
+const STATIONS_DB_FILE = './stations.db';
+// 城市简称/别名 -> 标准城市名，与 Python 脚本共用 city_aliases.json
+const CITY_ALIASES = JSON.parse(fs.readFileSync('./city_aliases.json', 'utf8'));
+let stationCache = null;
+
+// 数据库文件签名：主文件和 WAL 文件的修改时间与大小
+async function fileSignature(file) {
+  const parts = [];
+  for (const name of [file, `${file}-wal`]) {
+    try {
+      const { mtimeMs, size } = await fs.promises.stat(name);
+      parts.push(`${mtimeMs}:${size}`);
+    } catch {
+      parts.push('-');
+    }
+  }
+  return parts.join('|');
+}
+
+async function getStationCache() {
+  const version = await fileSignature(STATIONS_DB_FILE);
+  if (stationCache && stationCache.version === version) {
+    return stationCache;
+  }
+  const rows = await stationsDb('stations').select('id', 'name', 'city');
+  const cityStationIds = {};
+  const stationIds = {};
+  const stationNames = {};
+  for (const { id, name, city } of rows) {
+    (cityStationIds[city || name] ||= []).push(id);
+    stationIds[name] = id;
+    stationNames[id] = name;
+  }
+  stationCache = { version, cityStationIds, stationIds, stationNames };
+  return stationCache;
+}
+
+// 城市名/别名 -> 该城市全部车站ID；不是城市但恰好是站名时只返回该站
+function resolveStationIds(cache, name) {
+  const ids = cache.cityStationIds[name] || cache.cityStationIds[CITY_ALIASES[name]];
+  if (ids) return ids;
+  return cache.stationIds[name] !== undefined ? [cache.stationIds[name]] : [];
+}
+
+// 直达路线结果缓存：LRU + TTL，条目带时刻表版本号（ETL 脚本提交时写入 timetable_meta）
+// 只缓存车次列表，余票每次按日期单独计算后叠加
+const ROUTE_CACHE_MAX = 1024;
+const ROUTE_CACHE_TTL_MS = 60 * 60 * 1000;
+const TRAINS_DB_FILE = './trains.db';
+const routeCache = new Map();
+const routeCacheStats = { hits: 0, misses: 0, stale: 0, expired: 0, evictions: 0, bytes: 0 };
+let timetableVersion = { signature: null, value: null };
+
+async function readVersion(db) {
+  try {
+    const row = await db('timetable_meta').where('key', 'timetable_version').first('value');
+    return row ? row.value : 0;
+  } catch {
+    return 0;
+  }
+}
+
+// 版本号只在数据库文件签名变化时重新读取
+async function getTimetableVersion() {
+  const signature = `${await fileSignature(TRAINS_DB_FILE)}#${await fileSignature(STATIONS_DB_FILE)}`;
+  if (timetableVersion.signature !== signature) {
+    const value = `${await readVersion(trainsDb)}.${await readVersion(stationsDb)}`;
+    timetableVersion = { signature, value };
+  }
+  return timetableVersion.value;
+}
+
+function removeCachedRoutes(key) {
+  const entry = routeCache.get(key);
+  if (entry) {
+    routeCacheStats.bytes -= entry.bytes;
+    routeCache.delete(key);
+  }
+}
+
+async function getCachedRoutes(key, loader) {
+  const version = await getTimetableVersion();
+  const now = Date.now();
+  const entry = routeCache.get(key);
+  if (entry) {
+    if (entry.version !== version) {
+      routeCacheStats.stale++;
+      removeCachedRoutes(key);
+    } else if (entry.expiresAt <= now) {
+      routeCacheStats.expired++;
+      removeCachedRoutes(key);
+    } else {
+      // Map 按插入顺序迭代，重新插入即移到最近使用
+      routeCache.delete(key);
+      routeCache.set(key, entry);
+      routeCacheStats.hits++;
+      return entry.routes;
+    }
+  }
+  routeCacheStats.misses++;
+  const routes = await loader();
+  const bytes = Buffer.byteLength(JSON.stringify(routes));
+  removeCachedRoutes(key);
+  routeCache.set(key, { version, expiresAt: now + ROUTE_CACHE_TTL_MS, routes, bytes });
+  routeCacheStats.bytes += bytes;
+  while (routeCache.size > ROUTE_CACHE_MAX) {
+    removeCachedRoutes(routeCache.keys().next().value);
+    routeCacheStats.evictions++;
+  }
+  return routes;
+}
+
+// 路线缓存指标
+app.get('/api/metrics/route-cache', async (req, res) => {
+  const lookups = routeCacheStats.hits + routeCacheStats.misses;
+  res.json({
+    code: 0,
+    data: {
+      ...routeCacheStats,
+      entries: routeCache.size,
+      hitRate: lookups ? routeCacheStats.hits / lookups : 0,
+      version: timetableVersion.value
+    }
+  });
+});
+
+// 直达路线过滤与排序：所有条件都拼进 SQL，出发侧走 (station_id, depart_min) 索引
+// 车次类型为车次代码首字母；区间时长缺少站点时刻时退回全程运行时长
+const TRAIN_CLASSES = ['C', 'D', 'G', 'K', 'P', 'S', 'T', 'Y', 'Z'];
+const NO_TIME = 99999;
+const ROUTE_SORT_KEYS = {
+  train_code: { sql: "''", minutes: false },
+  depart: { sql: `COALESCE(a.depart_min, ${NO_TIME})`, minutes: true },
+  arrive: { sql: `COALESCE(b.arrive_min, ${NO_TIME})`, minutes: true },
+  duration: {
+    sql: `COALESCE((b.arrive_day * 1440 + b.arrive_min) - (a.depart_day * 1440 + a.depart_min), a.run_minutes, ${NO_TIME})`,
+    minutes: true
+  }
 };
+const ROUTE_MAX_LIMIT = 100;
+const MINUTE_COLUMNS = ['arrive_min', 'arrive_day', 'depart_min', 'depart_day', 'run_minutes'];
+let minuteColumns = { version: null, present: false };
+
+// 分钟列由 time_columns.py 生成；时刻表版本变化后重新检查
+async function hasMinuteColumns() {
+  const version = await getTimetableVersion();
+  if (minuteColumns.version !== version) {
+    const columns = await trainsDb.raw('PRAGMA table_info(train_routes)');
+    const names = new Set(columns.map(column => column.name));
+    minuteColumns = { version, present: MINUTE_COLUMNS.every(name => names.has(name)) };
+  }
+  return minuteColumns.present;
+}
+
+function parseHHMM(text) {
+  const match = /^(\d{1,2}):(\d{2})$/.exec(text || '');
+  if (!match) return null;
+  const hours = parseInt(match[1], 10);
+  const minutes = parseInt(match[2], 10);
+  return hours < 24 && minutes < 60 ? hours * 60 + minutes : null;
+}
+
+// '14:00-18:00' -> [840, 1080]；只给一端时另一端取当天起止
+function parseWindow(text) {
+  if (!text) return null;
+  const [start, end] = String(text).split('-');
+  const window = [start ? parseHHMM(start) : 0, end ? parseHHMM(end) : 1439];
+  if (window.includes(null)) throw new Error(`无效的时间窗: ${text}`);
+  return window;
+}
+
+function formatMinutes(minutes, dayOffset = 0) {
+  if (minutes == null) return null;
+  const text = `${String(Math.floor(minutes / 60)).padStart(2, '0')}:${String(minutes % 60).padStart(2, '0')}`;
+  return dayOffset > 0 ? `${text}(+${dayOffset})` : text;
+}
+
+function encodeCursor(key) {
+  return Buffer.from(JSON.stringify(key)).toString('base64url');
+}
+
+function decodeCursor(cursor) {
+  try {
+    const key = JSON.parse(Buffer.from(String(cursor), 'base64url').toString('utf8'));
+    if (Array.isArray(key) && key.length === 4) return key;
+  } catch {
+    // 格式错误统一在下面报错
+  }
+  throw new Error('无效的翻页游标');
+}
+
+async function parseRouteSearch(query) {
+  const sort = query.sort || 'train_code';
+  if (!ROUTE_SORT_KEYS[sort]) throw new Error(`不支持的排序方式: ${sort}`);
+  const classes = query.classes ? String(query.classes).toUpperCase().split(',').filter(Boolean) : [];
+  const unknown = classes.filter(c => !TRAIN_CLASSES.includes(c));
+  if (unknown.length) throw new Error(`不支持的车次类型: ${unknown.join(', ')}`);
+  const maxDuration = query.maxDuration ? parseInt(query.maxDuration, 10) : null;
+  if (query.maxDuration && !(maxDuration > 0)) throw new Error('无效的最长历时');
+  const search = {
+    departWindow: parseWindow(query.depart),
+    arriveWindow: parseWindow(query.arrive),
+    maxDuration,
+    classes,
+    sort,
+    trainCode: query.trainCode ? String(query.trainCode) : null,
+    cursor: query.cursor ? decodeCursor(query.cursor) : null,
+    limit: Math.max(1, Math.min(parseInt(query.limit, 10) || 30, ROUTE_MAX_LIMIT)),
+    minutes: await hasMinuteColumns()
+  };
+  const needsMinutes = ROUTE_SORT_KEYS[sort].minutes || search.departWindow || search.arriveWindow || maxDuration != null;
+  if (needsMinutes && !search.minutes) throw new Error('时刻数据尚未生成，暂不支持按时间过滤或排序');
+  return search;
+}
+
+function buildRouteQuery(startIds, endIds, search) {
+  const sortSql = ROUTE_SORT_KEYS[search.sort].sql;
+  const conditions = [
+    `a.station_id IN (${startIds.map(() => '?').join(',')})`,
+    `b.station_id IN (${endIds.map(() => '?').join(',')})`,
+    'a.station_no < b.station_no'
+  ];
+  const bindings = [...startIds, ...endIds];
+  if (search.departWindow) {
+    conditions.push('a.depart_min BETWEEN ? AND ?');
+    bindings.push(...search.departWindow);
+  }
+  if (search.arriveWindow) {
+    conditions.push('b.arrive_min BETWEEN ? AND ?');
+    bindings.push(...search.arriveWindow);
+  }
+  if (search.maxDuration != null) {
+    conditions.push(`${ROUTE_SORT_KEYS.duration.sql} <= ?`);
+    bindings.push(search.maxDuration);
+  }
+  if (search.classes.length) {
+    conditions.push(`substr(a.train_code, 1, 1) IN (${search.classes.map(() => '?').join(',')})`);
+    bindings.push(...search.classes);
+  }
+  if (search.trainCode) {
+    conditions.push('a.train_code = ?');
+    bindings.push(search.trainCode);
+  }
+  if (search.cursor) {
+    conditions.push(`(${sortSql}, a.train_code, a.station_id, b.station_id) > (?, ?, ?, ?)`);
+    bindings.push(...search.cursor);
+  }
+  const minuteSelect = search.minutes
+    ? 'a.depart_min, a.depart_day, b.arrive_min, b.arrive_day, a.run_minutes'
+    : 'NULL AS depart_min, NULL AS depart_day, NULL AS arrive_min, NULL AS arrive_day, NULL AS run_minutes';
+  bindings.push(search.limit);
+  return {
+    sql: `
+      SELECT ${sortSql} AS sort_key,
+        a.train_code,
+        a.train_full_code,
+        a.station_id as start_id,
+        b.station_id as end_id,
+        a.station_no as start_no,
+        b.station_no as end_no,
+        a.run_time,
+        ${minuteSelect}
+      FROM train_routes a
+      JOIN train_routes b ON a.train_code = b.train_code
+      WHERE ${conditions.join(' AND ')}
+      ORDER BY sort_key, a.train_code, a.station_id, b.station_id
+      LIMIT ?
+    `,
+    bindings
+  };
+}
+
+// 路线 -> 接口返回的 JSON；ticketsLeft 为余票数（直达查询）或按日余票数组（余票日历）
+function formatRoute(route, stationIdToName, from, to, ticketsLeft) {
+  return {
+    trainCode: route.train_code,
+    trainFullCode: route.train_full_code || route.train_code,
+    from: {
+      station: stationIdToName[route.start_id] || from,
+      sequence: route.start_no
+    },
+    to: {
+      station: stationIdToName[route.end_id] || to,
+      sequence: route.end_no
+    },
+    runTime: route.run_time || "未知",
+    departTime: formatMinutes(route.depart_min),
+    arriveTime: formatMinutes(route.arrive_min, route.arrive_day - (route.depart_day || 0)),
+    duration: route.depart_min != null && route.arrive_min != null
+      ? (route.arrive_day * 1440 + route.arrive_min) - (route.depart_day * 1440 + route.depart_min)
+      : route.run_minutes,
+    ticketsLeft
+  };
+}
+
+// 按过滤条件查询直达路线（按城市对+过滤条件缓存，时刻表版本变化后失效）
+async function findRoutes(from, to, startIds, endIds, search) {
+  const cacheKey = JSON.stringify([from, to, search]);
+  return getCachedRoutes(cacheKey, async () => {
+    const trx = await trainsDb.transaction();
+    try {
+      const { sql, bindings } = buildRouteQuery(startIds, endIds, search);
+      const rows = await trx.raw(sql, bindings);
+      await trx.commit();
+      const last = rows.length === search.limit ? rows[rows.length - 1] : null;
+      return {
+        routes: rows,
+        nextCursor: last ? encodeCursor([last.sort_key, last.train_code, last.start_id, last.end_id]) : null
+      };
+    } catch (err) {
+      await trx.rollback();
+      throw err;
+    }
+  });
+}
+
+// 可预订的日期（本地日期 'YYYY-MM-DD'）：明天起 30 天，与购票接口的日期校验一致
+function bookingWindowDates(days = 30) {
+  const dates = [];
+  const day = new Date();
+  for (let i = 0; i < days; i++) {
+    day.setDate(day.getDate() + 1);
+    const month = String(day.getMonth() + 1).padStart(2, '0');
+    dates.push(`${day.getFullYear()}-${month}-${String(day.getDate()).padStart(2, '0')}`);
+  }
+  return dates;
+}
 
 // 直达路线查询接口 - 修改以减少并发查询并确保连接释放
 app.get('/api/routes/direct', async (req, res) => {
@@ -380,107 +670,33 @@ app.get('/api/routes/direct', async (req, res) => {
       });
     }
 
-    // 获取出发城市和目的地对应的站点
-    const fromStations = city_stations[from] || [];
-    const toStations = city_stations[to] || [];
+    // 获取出发城市和目的地对应的站点（内存缓存，无需查询数据库）
+    const stationCacheNow = await getStationCache();
+    const startIds = resolveStationIds(stationCacheNow, from);
+    const endIds = resolveStationIds(stationCacheNow, to);
 
-    if (fromStations.length === 0 || toStations.length === 0) {
+    if (startIds.length === 0 || endIds.length === 0) {
       return res.json({
         code: 1,
         msg: '不支持的城市'
       });
     }
 
-    // 使用单一事务进行查询站点ID
-    const trx1 = await trainsDb.transaction();
-    let startIds, endIds;
-    
+    const stationIdToName = stationCacheNow.stationNames;
+
+    // 过滤、排序与翻页参数（与 route_search.py 的 build_route_query 一致）
+    let search;
     try {
-      // 查询站点ID
-      const startStations = await trx1('train_routes')
-        .whereIn('city', fromStations.length > 0 ? fromStations : [from])
-        .distinct('station_id')
-        .select('station_id');
-      
-      const endStations = await trx1('train_routes')
-        .whereIn('city', toStations.length > 0 ? toStations : [to])
-        .distinct('station_id')
-        .select('station_id');
-      
-      // 提取站点ID数组
-      startIds = startStations.map(s => s.station_id);
-      endIds = endStations.map(s => s.station_id);
-      
-      await trx1.commit();
+      search = await parseRouteSearch(req.query);
     } catch (err) {
-      await trx1.rollback();
-      throw err;
-    }
-
-    if (startIds.length === 0 || endIds.length === 0) {
       return res.json({
         code: 1,
-        msg: '未找到对应的站点'
-      });
-    }
-
-    // 使用单一事务查询真实站点名称
-    const trx2 = await stationsDb.transaction();
-    let stationIdToName = {};
-    
-    try {
-      // 从stations.db查询真实站点名称
-      const startStationNames = await trx2('stations')
-        .whereIn('id', startIds)
-        .select('id', 'name');
-      
-      const endStationNames = await trx2('stations')
-        .whereIn('id', endIds)
-        .select('id', 'name');
-      
-      // 创建站点ID到站点名称的映射
-      startStationNames.forEach(station => {
-        stationIdToName[station.id] = station.name;
+        msg: err.message
       });
-      endStationNames.forEach(station => {
-        stationIdToName[station.id] = station.name;
-      });
-      
-      await trx2.commit();
-    } catch (err) {
-      await trx2.rollback();
-      throw err;
     }
 
-    // 使用单一事务查询符合条件的路线
-    const trx3 = await trainsDb.transaction();
-    let routes;
-    
-    try {
-      // 查询符合条件的路线 - 修改查询方式，减少子查询
-      routes = await trx3.raw(`
-        SELECT DISTINCT 
-          a.train_code,
-          a.train_full_code,
-          a.station_id as start_id,
-          b.station_id as end_id,
-          a.station_no as start_no,
-          b.station_no as end_no,
-          a.run_time
-        FROM train_routes a
-        JOIN train_routes b ON a.train_code = b.train_code
-        WHERE a.station_id IN (${startIds.join(',')})
-        AND b.station_id IN (${endIds.join(',')})
-        AND a.station_no < b.station_no
-        ORDER BY a.train_code
-        LIMIT 30
-      `);
-      
-      await trx3.commit();
-    } catch (err) {
-      await trx3.rollback();
-      throw err;
-    }
+    // 查询符合条件的路线（按城市对+过滤条件缓存，时刻表版本变化后失效）
+    const { routes, nextCursor } = await findRoutes(from, to, startIds, endIds, search);
 
     // 使用单一事务查询每个车次的区间占用情况
     const trx4 = await ticketDb.transaction();
@@ -538,28 +754,15 @@ app.get('/api/routes/direct', async (req, res) => {
     }
 
     // 格式化结果
-    const formattedRoutes = routes.map(route => {
-      return {
-        trainCode: route.train_code,
-        trainFullCode: route.train_full_code || route.train_code,
-        from: {
-          station: stationIdToName[route.start_id] || from,
-          sequence: route.start_no
-        },
-        to: {
-          station: stationIdToName[route.end_id] || to,
-          sequence: route.end_no
-        },
-        runTime: route.run_time || "未知",
-        ticketsLeft: availableSeatsMap[route.train_code] || 0
-      };
-    });
+    const formattedRoutes = routes.map(route =>
+      formatRoute(route, stationIdToName, from, to, availableSeatsMap[route.train_code] || 0));
 
     res.json({
       code: 0,
       data: {
         routes: formattedRoutes,
         total: formattedRoutes.length,
+        nextCursor,
         from,
         to,
         date
@@ -575,6 +778,78 @@ app.get('/api/routes/direct', async (req, res) => {
   }
 });
 
+// 余票日历接口：预售期内每天的余票，一次请求代替逐日查询 /api/routes/direct
+// 参数与直达查询相同（可加 trainCode 只看一个车次）；对 seat_occupancy 只做一次 (train_code, travel_date) 范围查询
+app.get('/api/routes/calendar', async (req, res) => {
+  try {
+    const { from, to } = req.query;
+    if (!from || !to) {
+      return res.json({ code: 1, msg: '请提供出发城市和目的地' });
+    }
+
+    const stationCacheNow = await getStationCache();
+    const startIds = resolveStationIds(stationCacheNow, from);
+    const endIds = resolveStationIds(stationCacheNow, to);
+    if (startIds.length === 0 || endIds.length === 0) {
+      return res.json({ code: 1, msg: '不支持的城市' });
+    }
+
+    let search;
+    try {
+      search = await parseRouteSearch(req.query);
+    } catch (err) {
+      return res.json({ code: 1, msg: err.message });
+    }
+    const { routes, nextCursor } = await findRoutes(from, to, startIds, endIds, search);
+
+    const totalSeats = 100; // 与购票接口一致，每个车次100个座位
+    const dates = bookingWindowDates();
+    const trainCodes = [...new Set(routes.map(route => route.train_code))];
+    const records = trainCodes.length ? await ticketDb('seat_occupancy')
+      .whereIn('train_code', trainCodes)
+      .whereBetween('travel_date', [dates[0], dates[dates.length - 1]])
+      .select('train_code', 'travel_date', 'seat_number', 'start_station_no', 'end_station_no') : [];
+
+    // 按 车次|日期 分组，每个区间一次遍历统计冲突座位
+    const recordsByDay = new Map();
+    for (const record of records) {
+      const key = `${record.train_code}|${record.travel_date}`;
+      if (!recordsByDay.has(key)) recordsByDay.set(key, []);
+      recordsByDay.get(key).push(record);
+    }
+    const formattedRoutes = routes.map(route => {
+      const ticketsLeft = dates.map(travelDate => {
+        const conflicts = new Set();
+        for (const record of recordsByDay.get(`${route.train_code}|${travelDate}`) || []) {
+          if (record.start_station_no < route.end_no && record.end_station_no > route.start_no) {
+            conflicts.add(record.seat_number);
+          }
+        }
+        return totalSeats - conflicts.size;
+      });
+      return formatRoute(route, stationCacheNow.stationNames, from, to, ticketsLeft);
+    });
+
+    res.json({
+      code: 0,
+      data: {
+        dates,
+        routes: formattedRoutes,
+        total: formattedRoutes.length,
+        nextCursor,
+        from,
+        to
+      }
+    });
+  } catch (error) {
+    console.error('查询余票日历错误:', error);
+    res.json({
+      code: 500,
+      msg: '查询失败，请稍后重试'
+    });
+  }
+});
+
 // 修改购票接口，使用区间占用模型并保存到用户数据库
 app.post('/api/tickets', authMiddleware, async (req, res) => {
   const trx = await ticketDb.transaction();
@@ -861,27 +1136,23 @@ app.post('/api/tickets/change', authMiddleware, async (req, res) => {
     // 假设每个车次有100个座位
     const totalSeats = 100;
     
-    // 查询当前已占用的区间
-    const occupiedSeats = await trx('seat_occupancy')
+    // 只查询与新区间重叠的占用记录，一次遍历得到冲突座位集合
+    const conflictRows = await trx('seat_occupancy')
       .where({
         train_code: newTrainCode,
         travel_date: newTravelDate
       })
       .whereNot('ticket_id', ticketId)  // 排除自己的原车票
-      .select('seat_number', 'start_station_no', 'end_station_no');
+      .where('start_station_no', '<', parseInt(newToStationNo))
+      .where('end_station_no', '>', parseInt(newFromStationNo))
+      .select('seat_number');
+    const conflictSeats = new Set(conflictRows.map(record => record.seat_number));
     
     // 找出可用座位
     const availableSeats = [];
     
     for (let seatNum = 1; seatNum <= totalSeats; seatNum++) {
-      const conflicts = occupiedSeats.filter(record => {
-        // 检查是否有区间重叠
-        return record.seat_number === seatNum && 
-               !(parseInt(record.end_station_no) <= parseInt(newFromStationNo) || 
-                 parseInt(record.start_station_no) >= parseInt(newToStationNo));
-      });
-      
-      if (conflicts.length === 0) {
+      if (!conflictSeats.has(seatNum)) {
         availableSeats.push(seatNum);
       }
     }
@@ -905,11 +1176,6 @@ app.post('/api/tickets/change', authMiddleware, async (req, res) => {
         updated_at: trx.fn.now()
       });
     
-    // 删除原来的座位占用记录
-    await trx('seat_occupancy')
-      .where('ticket_id', ticketId)
-      .delete();
-    
     // 添加新车票记录
     const [newTicketId] = await trx('tickets').insert({
       user_id: userId,
@@ -925,15 +1191,21 @@ app.post('/api/tickets/change', authMiddleware, async (req, res) => {
       changed_from: ticketId  // 记录改签来源
     });
     
-    // 添加新座位占用记录
-    await trx('seat_occupancy').insert({
+    // 原座位占用记录原地改写为新车票（不再先删除再插入）
+    const newOccupancy = {
       train_code: newTrainCode,
       travel_date: newTravelDate,
       seat_number: assignedSeat,
       start_station_no: newFromStationNo,
       end_station_no: newToStationNo,
       ticket_id: newTicketId
-    });
+    };
+    const moved = await trx('seat_occupancy')
+      .where('ticket_id', ticketId)
+      .update(newOccupancy);
+    if (!moved) {
+      await trx('seat_occupancy').insert(newOccupancy);
+    }
     
     await trx.commit();
     
@@ -0,0 +1,170 @@
+import json
+import os
+import sys
+import time
+
+from database import connect
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时使用内置的地名读音表
+    lazy_pinyin = None
+
+# 城市简称/别名 -> 标准城市名：唯一来源为 city_aliases.json，server.js、city_resolver.py、123.py 共用
+CITY_ALIASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'city_aliases.json')
+
+
+def load_city_aliases(path=CITY_ALIASES_PATH):
+    """读取城市别名表 {别名: 标准城市名}"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+CITY_ALIASES = load_city_aliases()
+
+# 内置读音表：覆盖现有车站/城市名用字，多音字取地名读音（长沙、重庆、厦门）
+PINYIN_FALLBACK = {
+    '上': 'shang', '东': 'dong', '乌': 'wu', '京': 'jing', '兰': 'lan', '北': 'bei', '南': 'nan',
+    '原': 'yuan', '厦': 'xia', '口': 'kou', '合': 'he', '呼': 'hu', '和': 'he', '哈': 'ha',
+    '圳': 'zhen', '天': 'tian', '太': 'tai', '宁': 'ning', '安': 'an', '家': 'jia', '尔': 'er',
+    '川': 'chuan', '州': 'zhou', '广': 'guang', '庄': 'zhuang', '庆': 'qing', '成': 'cheng',
+    '拉': 'la', '昆': 'kun', '昌': 'chang', '明': 'ming', '春': 'chun', '木': 'mu', '杭': 'hang',
+    '桥': 'qiao', '武': 'wu', '汉': 'han', '沈': 'shen', '沙': 'sha', '津': 'jin', '济': 'ji',
+    '浩': 'hao', '海': 'hai', '深': 'shen', '滨': 'bin', '特': 'te', '石': 'shi', '福': 'fu',
+    '肥': 'fei', '萨': 'sa', '虹': 'hong', '西': 'xi', '贵': 'gui', '郑': 'zheng', '都': 'du',
+    '重': 'chong', '银': 'yin', '长': 'chang', '门': 'men', '阳': 'yang', '鲁': 'lu', '齐': 'qi',
+    '大': 'da', '连': 'lian', '青': 'qing', '岛': 'dao', '站': 'zhan',
+}
+
+# 序列化文件格式版本，结构变化时递增
+INDEX_VERSION = 1
+
+
+def to_pinyin(text):
+    """汉字 -> (全拼, 首字母)，无法转换的字符原样保留"""
+    if lazy_pinyin is not None:
+        syllables = lazy_pinyin(text, style=Style.NORMAL)
+    else:
+        syllables = [PINYIN_FALLBACK.get(ch, ch) for ch in text]
+    return ''.join(syllables).lower(), ''.join(s[0] for s in syllables if s).lower()
+
+
+def entry_keys(name, aliases=()):
+    """一个条目的全部检索键：名称、全拼、拼音首字母、别名"""
+    full, initials = to_pinyin(name)
+    keys = {name, full, initials}
+    keys.update(aliases)
+    return keys
+
+
+class StationSearch:
+    """
+    车站/城市名称前缀索引
+    条目保存 (名称, 类型, 所属城市, 权重)；每个检索键的每个前缀预先算好 top-k 条目，查询只需一次字典查找
+    """
+
+    def __init__(self, entries=(), keys=(), k=10):
+        self.entries = list(entries)   # [(名称, 'city'/'station', 城市, 权重), ...]
+        self.keys = list(keys)         # [(检索键, 条目下标), ...]
+        self.k = k
+        self._prefixes = {}
+        self._build_prefixes()
+
+    def _build_prefixes(self):
+        candidates = {}
+        for key, entry_id in self.keys:
+            for end in range(1, len(key) + 1):
+                candidates.setdefault(key[:end], set()).add(entry_id)
+        rank = lambda i: (-self.entries[i][3], self.entries[i][1] != 'city', self.entries[i][0])
+        self._prefixes = {
+            prefix: tuple(sorted(ids, key=rank)[:self.k]) for prefix, ids in candidates.items()
+        }
+
+    @classmethod
+    def build(cls, stations_db='stations.db', trains_db='trains.db', k=10):
+        """从 stations.db 和 trains.db 构建索引，权重为经停车次数"""
+        weights = {}
+        if trains_db and os.path.exists(trains_db):
+            conn = connect(trains_db, profile='query', readonly=True)
+            try:
+                weights = dict(conn.execute("""
+                    SELECT station_id, COUNT(*) FROM train_routes
+                    WHERE station_id IS NOT NULL GROUP BY station_id
+                """))
+            finally:
+                conn.close()
+
+        conn = connect(stations_db, profile='query', readonly=True)
+        try:
+            rows = conn.execute("SELECT id, name, city FROM stations ORDER BY id").fetchall()
+        finally:
+            conn.close()
+
+        city_weights = {}
+        entries = []
+        for station_id, name, city in rows:
+            city = city or name
+            weight = weights.get(station_id, 0)
+            city_weights[city] = city_weights.get(city, 0) + weight
+            entries.append((name, 'station', city, weight))
+        for city, weight in sorted(city_weights.items()):
+            entries.append((city, 'city', city, weight))
+
+        aliases = {}
+        for alias, city in CITY_ALIASES.items():
+            aliases.setdefault(city, []).append(alias)
+        keys = []
+        for entry_id, (name, kind, city, _) in enumerate(entries):
+            for key in sorted(entry_keys(name, aliases.get(name, ()) if kind == 'city' else ())):
+                keys.append((key, entry_id))
+        return cls(entries, keys, k)
+
+    def search(self, prefix, limit=None):
+        """按前缀查询，返回按权重排序的 [(名称, 类型, 城市), ...]"""
+        ids = self._prefixes.get(prefix.strip().lower(), ())
+        return [self.entries[i][:3] for i in ids[:limit or self.k]]
+
+    def save(self, path):
+        """序列化为紧凑 JSON（只保存条目和检索键，前缀表在加载时重建）"""
+        data = {"version": INDEX_VERSION, "k": self.k, "entries": self.entries, "keys": self.keys}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """从 save() 生成的文件加载索引"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"索引文件版本不兼容: {data.get('version')}")
+        return cls([tuple(e) for e in data["entries"]], [tuple(k) for k in data["keys"]], data["k"])
+
+
+if __name__ == '__main__':
+    index_path = sys.argv[1] if len(sys.argv) > 1 else 'station_index.json'
+    start = time.perf_counter()
+    index = StationSearch.build()
+    index.save(index_path)
+    print(f"已构建 {len(index.entries)} 个条目、{len(index.keys)} 个检索键，"
+          f"耗时 {(time.perf_counter() - start) * 1000:.1f} 毫秒，保存到 {index_path}"
+          f"（{os.path.getsize(index_path) / 1024:.1f} KB）")
+    if lazy_pinyin is None:
+        print("未安装 pypinyin，使用内置读音表")
+
+    start = time.perf_counter()
+    index = StationSearch.load(index_path)
+    print(f"加载耗时 {(time.perf_counter() - start) * 1000:.1f} 毫秒")
+
+    while True:
+        try:
+            prefix = input("\n请输入车站/城市（拼音、首字母或简称，回车退出）：")
+        except EOFError:
+            break
+        if not prefix:
+            break
+        t0 = time.perf_counter()
+        results = index.search(prefix)
+        elapsed = (time.perf_counter() - t0) * 1e6
+        for name, kind, city in results:
+            print(f"  {name}（{'城市' if kind == 'city' else city}）")
+        print(f"共 {len(results)} 条，耗时 {elapsed:.1f} 微秒")
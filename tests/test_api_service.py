@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_service import ApiService, parse_order, sign_token, verify_token
+from database import close_all
+from ticket_shards import ShardMap
+from time_columns import normalize_times
+
+STATIONS = [(1, '北京南', '北京'), (2, '北京西', '北京'), (3, '上海虹桥', '上海'), (4, '南京南', '南京')]
+ROUTES = [
+    ('G1', 1, 1, None, '07:00', '04:30'),
+    ('G1', 4, 2, '10:00', '10:02', '04:30'),
+    ('G1', 3, 3, '11:30', None, '04:30'),
+    ('D5', 2, 1, None, '15:30', '06:30'),
+    ('D5', 3, 5, '22:00', None, '06:30'),
+]
+
+
+class TestApiService(unittest.TestCase):
+    """Python 异步后端接口测试（与 server.js 的 JSON 格式一致）"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = self.tmpdir.name
+        conn = sqlite3.connect(os.path.join(path, 'stations.db'))
+        conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY, name TEXT, city TEXT)")
+        conn.executemany("INSERT INTO stations VALUES (?, ?, ?)", STATIONS)
+        conn.commit()
+        conn.close()
+        conn = sqlite3.connect(os.path.join(path, 'trains.db'))
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, station_id INTEGER,
+                station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+                UNIQUE(train_code, station_id)
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO train_routes (train_code, station_id, station_no, arrive_time, depart_time, run_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ROUTES)
+        conn.commit()
+        conn.close()
+        normalize_times(os.path.join(path, 'trains.db'))
+
+        self.travel_date = (date.today() + timedelta(days=3)).isoformat()
+        self.token = sign_token({"id": 7, "account": "alice", "exp": int(time.time()) + 3600})
+        self.service = ApiService(os.path.join(path, 'trains.db'), os.path.join(path, 'stations.db'),
+                                  os.path.join(path, 'ticket.db'), total_seats=3)
+
+    def tearDown(self):
+        close_all()
+        self.tmpdir.cleanup()
+
+    def call(self, coro_func):
+        async def run():
+            await self.service.start()
+            try:
+                return await coro_func()
+            finally:
+                await self.service.stop()
+        return asyncio.run(run())
+
+    def request(self, method, target, body=None, token=None):
+        headers = {'authorization': f"Bearer {token}"} if token else {}
+        data = json.dumps(body).encode() if body is not None else b''
+        return self.service.dispatch(method, target, headers, data)
+
+    def order(self, from_no=1, to_no=3, **extra):
+        body = {"trainCode": 'G1', "fromStation": '北京南', "toStation": '上海虹桥',
+                "fromStationNo": from_no, "toStationNo": to_no, "travelDate": self.travel_date}
+        body.update(extra)
+        return body
+
+    def test_tokens(self):
+        """HS256 令牌校验：签名、过期时间"""
+        self.assertEqual(verify_token(self.token)['id'], 7)
+        self.assertIsNone(verify_token(self.token, secret='other'))
+        self.assertIsNone(verify_token(sign_token({"id": 7, "exp": int(time.time()) - 1})))
+        self.assertIsNone(verify_token('not.a.token'))
+
+    def test_parse_order(self):
+        """参数校验与 server.js 的提示一致"""
+        with self.assertRaisesRegex(ValueError, '参数不完整'):
+            parse_order({"trainCode": 'G1'})
+        with self.assertRaisesRegex(ValueError, '未来30天内'):
+            parse_order(self.order(travelDate=date.today().isoformat()))
+        with self.assertRaisesRegex(ValueError, '出发站必须在到达站之前'):
+            parse_order(self.order(from_no=3, to_no=1))
+
+    def test_direct_routes(self):
+        """直达查询：过滤、排序、时刻格式化和余票"""
+        async def scenario():
+            status, all_routes = await self.request('GET', f'/api/routes/direct?from=北京&to=上海&date={self.travel_date}')
+            _, late = await self.request('GET', '/api/routes/direct?from=北京&to=上海&depart=12:00-&sort=depart')
+            _, bad = await self.request('GET', '/api/routes/direct?from=北京&to=上海&classes=X')
+            _, unknown = await self.request('GET', '/api/routes/direct?from=火星&to=上海')
+            past = [await self.request('GET', f'/api/routes/direct?from=北京&to=上海&date={value}')
+                    for value in (date.today().isoformat(), '2000-01-01', 'xyz')]
+            return status, all_routes, late, bad, unknown, past
+
+        status, all_routes, late, bad, unknown, past = self.call(scenario)
+        self.assertEqual(status, 200)
+        self.assertEqual([r['trainCode'] for r in all_routes['data']['routes']], ['D5', 'G1'])
+        g1 = all_routes['data']['routes'][1]
+        self.assertEqual((g1['from'], g1['to']), ({"station": '北京南', "sequence": 1},
+                                                 {"station": '上海虹桥', "sequence": 3}))
+        self.assertEqual((g1['departTime'], g1['arriveTime'], g1['duration'], g1['ticketsLeft']),
+                         ('07:00', '11:30', 270, 3))
+        self.assertIsNone(all_routes['data']['nextCursor'])
+        self.assertEqual([r['trainCode'] for r in late['data']['routes']], ['D5'])
+        self.assertEqual(bad['code'], 1)
+        self.assertEqual(unknown, {"code": 1, "msg": "不支持的城市"})
+        # 预售期外的日期直接拒绝，不会整日载入占用记录
+        self.assertEqual([payload for _, payload in past], [{"code": 1, "msg": "请选择合法的乘车日期（未来30天内）"}] * 3)
+        self.assertEqual(self.service.writer.loaded_dates, {self.travel_date})
+
+    def test_route_calendar(self):
+        """余票日历：一次请求返回预售期内每天的余票，可按车次过滤"""
+        async def scenario():
+            await self.request('POST', '/api/tickets', self.order(), self.token)
+            _, calendar = await self.request('GET', '/api/routes/calendar?from=北京&to=南京&trainCode=G1')
+            _, both = await self.request('GET', '/api/routes/calendar?from=北京&to=上海')
+            _, missing = await self.request('GET', '/api/routes/calendar?from=北京')
+            return calendar, both, missing
+
+        calendar, both, missing = self.call(scenario)
+        dates = calendar['data']['dates']
+        self.assertEqual(len(dates), 30)
+        self.assertEqual(dates[0], (date.today() + timedelta(days=1)).isoformat())
+        [g1] = calendar['data']['routes']
+        self.assertEqual((g1['trainCode'], g1['to']['station']), ('G1', '南京南'))
+        expected = [3] * 30
+        expected[dates.index(self.travel_date)] = 2
+        self.assertEqual(g1['ticketsLeft'], expected)
+        self.assertEqual([r['trainCode'] for r in both['data']['routes']], ['D5', 'G1'])
+        self.assertEqual(both['data']['routes'][0]['ticketsLeft'], [3] * 30)
+        self.assertEqual(missing, {"code": 1, "msg": "请提供出发城市和目的地"})
+
+    def test_booking_lifecycle(self):
+        """并发购票座位不重复、售罄、余票、退票、改签和我的车票"""
+        async def scenario():
+            results = await asyncio.gather(*(
+                self.request('POST', '/api/tickets', self.order(), self.token) for _ in range(4)))
+            _, routes = await self.request('GET', f'/api/routes/direct?from=北京&to=南京&date={self.travel_date}')
+            first = results[0][1]['data']['ticketId']
+            _, refund = await self.request('POST', '/api/tickets/refund', {"ticketId": first}, self.token)
+            _, again = await self.request('POST', '/api/tickets/refund', {"ticketId": first}, self.token)
+            second = results[1][1]['data']['ticketId']
+            _, change = await self.request('POST', '/api/tickets/change', {
+                "ticketId": second, "newTrainCode": 'G1', "newFromStation": '南京南', "newToStation": '上海虹桥',
+                "newFromStationNo": 2, "newToStationNo": 3, "newTravelDate": self.travel_date}, self.token)
+            _, mine = await self.request('GET', '/api/user/tickets', token=self.token)
+            _, after = await self.request('GET', f'/api/routes/direct?from=北京&to=南京&date={self.travel_date}')
+            return results, routes, refund, again, change, mine, after
+
+        results, routes, refund, again, change, mine, after = self.call(scenario)
+        payloads = [payload for _, payload in results]
+        seats = sorted(p['data']['seatNumber'] for p in payloads if p['code'] == 0)
+        self.assertEqual(seats, [1, 2, 3])
+        self.assertEqual([p['msg'] for p in payloads if p['code'] != 0], ['该车次在所选区间已无可用座位'])
+        self.assertEqual(routes['data']['routes'][0]['ticketsLeft'], 0)
+
+        self.assertEqual(refund, {"code": 0, "msg": "退票成功"})
+        self.assertEqual(again['code'], 1)
+        self.assertEqual(change['code'], 0)
+        # 退掉 1 张、1 张改签为南京南-上海虹桥，北京南-南京南区间空出 2 个座位
+        self.assertEqual(after['data']['routes'][0]['ticketsLeft'], 2)
+        self.assertEqual(len(mine['data']['tickets']), 2)
+        self.assertEqual(set(mine['data']['tickets'][0]), {'id', 'trainCode', 'fromStation', 'toStation',
+                                                           'travelDate', 'seatNumber'})
+
+        conn = sqlite3.connect(os.path.join(self.tmpdir.name, 'ticket.db'))
+        statuses = conn.execute("SELECT status, changed_from FROM tickets ORDER BY id").fetchall()
+        occupancy = conn.execute("SELECT COUNT(*) FROM seat_occupancy").fetchone()[0]
+        conn.close()
+        self.assertEqual([s for s, _ in statuses], ['cancelled', 'changed', 'booked', 'booked'])
+        self.assertEqual(statuses[-1][1], results[1][1]['data']['ticketId'])
+        self.assertEqual(occupancy, 2)
+
+    def test_bulk_change(self):
+        """团体票批量改签：任一张失败时全部不变，成功时返回每张新票"""
+        def change(ticket_id):
+            return {"ticketId": ticket_id, "newTrainCode": 'D5', "newFromStation": '北京西',
+                    "newToStation": '上海虹桥', "newFromStationNo": 1, "newToStationNo": 5,
+                    "newTravelDate": self.travel_date}
+
+        async def scenario():
+            booked = [(await self.request('POST', '/api/tickets', self.order(), self.token))[1]['data']['ticketId']
+                      for _ in range(2)]
+            _, bad = await self.request('POST', '/api/tickets/change', {"changes": []}, self.token)
+            _, failed = await self.request('POST', '/api/tickets/change',
+                                           {"changes": [change(booked[0]), change(999)]}, self.token)
+            _, changed = await self.request('POST', '/api/tickets/change',
+                                            {"changes": [change(ticket_id) for ticket_id in booked]}, self.token)
+            _, mine = await self.request('GET', '/api/user/tickets', token=self.token)
+            return bad, failed, changed, mine
+
+        bad, failed, changed, mine = self.call(scenario)
+        self.assertEqual(bad, {"code": 1, "msg": "改签参数不完整"})
+        self.assertEqual(failed, {"code": 1, "msg": "未找到有效车票或无权改签"})
+        self.assertEqual(changed['code'], 0)
+        self.assertEqual([(t['trainCode'], t['seatNumber']) for t in changed['data']['tickets']], [('D5', 1), ('D5', 2)])
+        self.assertEqual([t['trainCode'] for t in mine['data']['tickets']], ['D5', 'D5'])
+
+    def test_sharded_backend(self):
+        """指定分片表时购票写入分片库，我的车票和余票日历跨分片归并"""
+        shard_map = ShardMap.create(2, self.tmpdir.name)
+        self.service = ApiService(os.path.join(self.tmpdir.name, 'trains.db'),
+                                  os.path.join(self.tmpdir.name, 'stations.db'), shard_map=shard_map)
+
+        async def scenario():
+            orders = [self.order(), self.order(trainCode='D5', fromStation='北京西', toStationNo=5)]
+            booked = [(await self.request('POST', '/api/tickets', order, self.token))[1] for order in orders]
+            _, mine = await self.request('GET', '/api/user/tickets', token=self.token)
+            _, calendar = await self.request('GET', '/api/routes/calendar?from=北京&to=上海')
+            return booked, mine, calendar
+
+        booked, mine, calendar = self.call(scenario)
+        index = calendar['data']['dates'].index(self.travel_date)
+        self.assertEqual([r['ticketsLeft'][index] for r in calendar['data']['routes']], [99, 99])
+        self.assertEqual([b['code'] for b in booked], [0, 0])
+        self.assertEqual(sorted(t['trainCode'] for t in mine['data']['tickets']), ['D5', 'G1'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'ticket.db')))
+
+    def test_http_and_auth(self):
+        """真实 HTTP 往返：未登录返回 401，CORS 预检返回 204"""
+        async def fetch(port, raw):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            head, _, body = response.partition(b'\r\n\r\n')
+            return head.decode('latin-1'), body
+
+        async def scenario():
+            server = await asyncio.start_server(self.service.handle_client, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                body = json.dumps(self.order()).encode()
+                unauthorized = await fetch(port, b"POST /api/tickets HTTP/1.1\r\nContent-Type: application/json\r\n"
+                                           b"Connection: close\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+                preflight = await fetch(port, b"OPTIONS /api/tickets HTTP/1.1\r\nConnection: close\r\n\r\n")
+                routes = await fetch(port, "GET /api/routes/direct?from=%E5%8C%97%E4%BA%AC&to=%E4%B8%8A%E6%B5%B7 "
+                                           "HTTP/1.1\r\nConnection: close\r\n\r\n".encode())
+            return unauthorized, preflight, routes
+
+        unauthorized, preflight, routes = self.call(scenario)
+        self.assertTrue(unauthorized[0].startswith('HTTP/1.1 401'))
+        self.assertEqual(json.loads(unauthorized[1])['msg'], '未授权，请先登录')
+        self.assertTrue(preflight[0].startswith('HTTP/1.1 204'))
+        self.assertIn('Access-Control-Allow-Headers: Content-Type,Authorization', preflight[0])
+        self.assertEqual(json.loads(routes[1])['data']['total'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark_suite
+
+TINY_SCALE = {'trains': 20, 'stops': 6, 'stations': 30, 'cities': 10, 'dates': 2, 'seats': 10}
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """离线基准测试套件测试"""
+
+    def test_generate_is_reproducible(self):
+        """同一种子生成的数据相同"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            contents = []
+            for run in range(2):
+                trains_db = os.path.join(tmpdir, f'trains{run}.db')
+                stations_db = os.path.join(tmpdir, f'stations{run}.db')
+                scale = dict(benchmark_suite.DEFAULT_SCALE, **TINY_SCALE)
+                self.assertEqual(benchmark_suite.generate_timetable(trains_db, stations_db, scale, seed=3), 120)
+                conn = sqlite3.connect(trains_db)
+                contents.append(conn.execute("SELECT train_code, station_id, station_no FROM train_routes").fetchall())
+                conn.close()
+            self.assertEqual(contents[0], contents[1])
+
+    def test_run_suite_and_compare(self):
+        """小规模运行全部基准，并与基准结果比较"""
+        results = benchmark_suite.run_suite(TINY_SCALE, operations=20)
+        self.assertEqual(set(results), {'direct_search_index', 'direct_search_sql', 'count_available',
+                                        'availability_calendar', 'book', 'refund'})
+        for r in results.values():
+            self.assertLessEqual(r['p50_us'], r['p99_us'])
+
+        baseline = {"results": {name: dict(r) for name, r in results.items()}}
+        self.assertEqual(benchmark_suite.compare_baseline(results, baseline), [])
+        baseline["results"]["book"]["p95_us"] = results["book"]["p95_us"] / 10
+        self.assertEqual([name for name, _, _ in benchmark_suite.compare_baseline(results, baseline)], ['book'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import booking_queue
+from booking_queue import TicketWriter, benchmark_booking, generate_orders
+from seat_inventory import SeatInventory
+
+
+class TestBookingQueue(unittest.TestCase):
+    """单写者购票队列与批量提交测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ticket_db = os.path.join(self.tmpdir.name, 'ticket.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_writer(self, scenario, **kwargs):
+        async def run():
+            writer = TicketWriter(self.ticket_db, SeatInventory(total_seats=5), **kwargs)
+            await writer.start()
+            try:
+                return await scenario(writer), writer
+            finally:
+                await writer.stop()
+        return asyncio.run(run())
+
+    @staticmethod
+    async def attempt(coro):
+        try:
+            return await coro
+        except ValueError as e:
+            return str(e)
+
+    def test_group_commit(self):
+        """并发请求合并为少量事务，每个请求拿到自己的结果，售罄只影响自己"""
+        order = generate_orders(1, seed=2)[0]
+
+        async def scenario(writer):
+            return await asyncio.gather(*(
+                self.attempt(writer.submit(writer.book, user_id, order)) for user_id in range(8)))
+
+        results, writer = self.run_writer(scenario)
+        booked = [r for r in results if isinstance(r, tuple)]
+        self.assertEqual(sorted(seat for _, seat in booked), [1, 2, 3, 4, 5])
+        self.assertEqual(results[5:], ['该车次在所选区间已无可用座位'] * 3)
+        self.assertLess(writer.stats()['batches'], 8)
+        self.assertEqual(writer.stats()['requests'], 8)
+
+        # 提交后内存矩阵与数据库一致
+        key = (order['train_code'], order['travel_date'])
+        self.assertEqual(writer.inventory.trains[key].count_free(order['from_no'], order['to_no']), 0)
+        conn = sqlite3.connect(self.ticket_db)
+        rows = conn.execute("SELECT COUNT(*), COUNT(DISTINCT seat_number) FROM seat_occupancy").fetchone()
+        conn.close()
+        self.assertEqual(rows, (5, 5))
+
+    def test_failed_request_rolls_back_alone(self):
+        """同一批中的无效退票、改签失败不影响其它请求，内存矩阵保持原状"""
+        order = generate_orders(1, seed=3)[0]
+        other = dict(order, train_code='Z99', from_no=1, to_no=2)
+
+        async def scenario(writer):
+            first = await writer.submit(writer.book, 1, order)
+            results = await asyncio.gather(
+                self.attempt(writer.submit(writer.refund, 2, first[0])),    # 不是自己的票
+                self.attempt(writer.submit(writer.change, 1, 999, other)),  # 车票不存在
+                self.attempt(writer.submit(writer.book, 3, other)),
+                self.attempt(writer.submit(writer.change, 1, first[0], other)),
+            )
+            return first, results
+
+        (first, results), writer = self.run_writer(scenario, max_batch=16)
+        self.assertEqual(results[0], '未找到有效车票或无权退票')
+        self.assertEqual(results[1], '未找到有效车票或无权改签')
+        self.assertEqual([seat for _, seat in results[2:]], [1, 2])
+
+        conn = sqlite3.connect(self.ticket_db)
+        statuses = conn.execute("SELECT id, status, changed_from FROM tickets ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual(statuses, [(1, 'changed', None), (2, 'booked', None), (3, 'booked', first[0])])
+        old_key = (order['train_code'], order['travel_date'])
+        self.assertEqual(writer.inventory.trains[old_key].count_free(order['from_no'], order['to_no']), 5)
+
+    def test_committed_matrix_is_reused(self):
+        """写者提交过的矩阵直接复用，不再读取 seat_occupancy；其它连接写入后重新读取"""
+        order = generate_orders(1, seed=4)[0]
+        other = dict(order, train_code='Z99')
+
+        async def scenario(writer):
+            first = await writer.book_ticket(1, order)
+            await writer.book_ticket(2, order)
+            await writer.change_ticket(1, first[0], other)
+            scans = writer.stats()['scans']
+            # 模拟 server.js 直接写库：占用 Z99 上剩余的所有座位
+            conn = sqlite3.connect(self.ticket_db)
+            conn.executemany("""
+                INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no,
+                                            ticket_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(other['train_code'], other['travel_date'], seat, other['from_no'], other['to_no'], 100 + seat)
+                  for seat in range(2, 6)])
+            conn.commit()
+            conn.close()
+            sold_out = await self.attempt(writer.book_ticket(3, other))
+            return scans, sold_out
+
+        (scans, sold_out), writer = self.run_writer(scenario)
+        self.assertEqual(scans, 2)  # 两个车次各读取一次
+        self.assertEqual(sold_out, '该车次在所选区间已无可用座位')
+        self.assertEqual(writer.stats()['scans'], 3)
+
+    def test_external_writes_visible_to_reads(self):
+        """其它连接写库后，下一次 ensure_date 只重新读取受影响的车次/日期，余票随之更新；变更日志被清理时整日重读"""
+        order = generate_orders(1, seed=6)[0]
+        other = dict(order, train_code='Z99')
+        query = [(order['train_code'], order['travel_date'], order['from_no'], order['to_no']),
+                 (other['train_code'], other['travel_date'], other['from_no'], other['to_no'])]
+
+        def external(seats, *sql):
+            conn = sqlite3.connect(self.ticket_db)
+            conn.executemany("""
+                INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no,
+                                            ticket_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(order['train_code'], order['travel_date'], seat, order['from_no'], order['to_no'], 100 + seat)
+                  for seat in seats])
+            for statement in sql:
+                conn.execute(statement)
+            conn.commit()
+            conn.close()
+
+        async def scenario(writer):
+            await writer.book_ticket(1, order)
+            await writer.book_ticket(2, other)
+            await writer.ensure_date(order['travel_date'])
+            before = writer.count_available_many(query), writer.stats()['scans']
+            # 模拟 server.js：另外卖出 2、3 号座，并退掉写者卖出的 1 号座
+            external((2, 3), "DELETE FROM seat_occupancy WHERE ticket_id = 1")
+            await writer.ensure_date(order['travel_date'])
+            after = writer.count_available_many(query), writer.stats()['scans']
+            rebooked = await writer.book_ticket(3, order)
+            # 变更日志被其它进程清理后无法衔接，整日重读
+            scans = writer.stats()['scans']
+            external((4,), "DELETE FROM seat_occupancy WHERE ticket_id = 103", "DELETE FROM seat_occupancy_changes")
+            await writer.ensure_date(order['travel_date'])
+            return before, after, rebooked, (writer.count_available_many(query), writer.stats()['scans'] - scans)
+
+        (before, after, rebooked, pruned), writer = self.run_writer(scenario)
+        self.assertEqual(before[0], [4, 4])
+        self.assertEqual(after[0], [3, 4])
+        self.assertEqual(after[1], before[1] + 1)   # 只重读了被改过的车次
+        self.assertEqual(rebooked[1], 1)
+        self.assertEqual(pruned, ([2, 4], 0))        # 整日按日期重读，不逐个车次读取
+
+    def test_change_log_pruned(self):
+        """没有快照时，写者处理过的变更日志（自己和其它连接的退票、改签）随下一批清理，不会一直增长"""
+        order = generate_orders(1, seed=9)[0]
+        other = dict(order, train_code='Z99')
+
+        def log_rows():
+            conn = sqlite3.connect(self.ticket_db)
+            try:
+                return conn.execute("SELECT COUNT(*) FROM seat_occupancy_changes").fetchone()[0]
+            finally:
+                conn.close()
+
+        async def scenario(writer):
+            first = await writer.book_ticket(1, order)
+            second = await writer.book_ticket(1, order)
+            await writer.refund_ticket(1, first[0])
+            await writer.change_ticket(1, second[0], other)
+            after_own = log_rows()
+            conn = sqlite3.connect(self.ticket_db)
+            conn.execute("DELETE FROM seat_occupancy WHERE train_code = ?", (other['train_code'],))
+            conn.commit()
+            conn.close()
+            external = log_rows()
+            await writer.book_ticket(2, order)
+            return after_own, external, log_rows()
+
+        counts, _ = self.run_writer(scenario)
+        self.assertEqual(counts, (0, 1, 0))
+
+    def test_write_during_version_check_not_skipped(self):
+        """检查其它连接写入的过程中又有提交：高水位不会越过它，下一次 ensure_date 仍会重读"""
+        order = generate_orders(1, seed=7)[0]
+        other = dict(order, train_code='Z99')
+        query = [(other['train_code'], other['travel_date'], other['from_no'], other['to_no'])]
+
+        def external(target, seat):
+            conn = sqlite3.connect(self.ticket_db)
+            conn.execute("""
+                INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no,
+                                            ticket_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (target['train_code'], target['travel_date'], seat, target['from_no'], target['to_no'], 100 + seat))
+            conn.commit()
+            conn.close()
+
+        real_high_water = booking_queue.high_water
+
+        def racing_high_water(conn):
+            external(other, 2)     # 模拟 server.js 恰好在读取变更日志之后、读取高水位之前提交
+            return real_high_water(conn)
+
+        async def scenario(writer):
+            await writer.book_ticket(1, order)
+            await writer.book_ticket(2, other)
+            await writer.ensure_date(order['travel_date'])
+            external(order, 2)
+            with mock.patch.object(booking_queue, 'high_water', racing_high_water):
+                await writer.ensure_date(order['travel_date'])
+            await writer.ensure_date(order['travel_date'])
+            left = writer.count_available_many(query)
+            return left, await writer.book_ticket(3, other)
+
+        (left, booked), _ = self.run_writer(scenario)
+        self.assertEqual(left, [3])
+        self.assertEqual(booked[1], 3)
+
+    def test_bulk_change(self):
+        """团体票批量改签全部成功或全部不变；座位占用记录原地改写为新车票"""
+        order = generate_orders(1, seed=6)[0]
+        other = dict(order, train_code='Z99')
+
+        async def scenario(writer):
+            booked = [await writer.book_ticket(1, order) for _ in range(3)]
+            ids = [ticket_id for ticket_id, _ in booked]
+            failed = await self.attempt(writer.change_tickets(1, [(ids[0], other), (ids[1], other), (999, other)]))
+            conn = sqlite3.connect(self.ticket_db)
+            rowids = conn.execute("SELECT rowid FROM seat_occupancy ORDER BY rowid").fetchall()
+            conn.close()
+            changed = await writer.change_tickets(1, [(ticket_id, other) for ticket_id in ids])
+            return ids, failed, rowids, changed
+
+        (ids, failed, rowids, changed), writer = self.run_writer(scenario)
+        self.assertEqual(failed, '未找到有效车票或无权改签')
+        self.assertEqual([seat for _, seat in changed], [1, 2, 3])
+        key, other_key = (order['train_code'], order['travel_date']), ('Z99', order['travel_date'])
+        self.assertEqual(writer.inventory.trains[key].count_free(order['from_no'], order['to_no']), 5)
+        self.assertEqual(writer.inventory.trains[other_key].count_free(order['from_no'], order['to_no']), 2)
+
+        conn = sqlite3.connect(self.ticket_db)
+        statuses = conn.execute("SELECT status, changed_from FROM tickets ORDER BY id").fetchall()
+        occupancy = conn.execute("SELECT rowid, train_code, ticket_id FROM seat_occupancy ORDER BY rowid").fetchall()
+        conn.close()
+        self.assertEqual(statuses, [('changed', None)] * 3 + [('booked', ticket_id) for ticket_id in ids])
+        self.assertEqual(occupancy, [(rowid, 'Z99', new_id) for (rowid,), (new_id, _) in zip(rowids, changed)])
+
+    def test_benchmark_booking(self):
+        """负载测试：批量提交没有锁冲突失败，所有请求都得到处理"""
+        results = benchmark_booking(requests=200, concurrency=8, workdir=self.tmpdir.name)
+        self.assertEqual(set(results), {'per_request', 'per_request_no_wait', 'group_commit'})
+        group = results['group_commit']
+        self.assertEqual(group['busy'], 0)
+        self.assertEqual(group['sold'] + group['sold_out'], 200)
+        self.assertGreater(group['throughput'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
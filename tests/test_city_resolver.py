@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from city_resolver import get_resolver
+
+
+class TestCityResolver(unittest.TestCase):
+    """城市 -> 车站解析测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.stations_db = os.path.join(self.tmpdir.name, 'stations.db')
+        conn = sqlite3.connect(self.stations_db)
+        conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, city TEXT)")
+        conn.executemany("INSERT INTO stations VALUES (?, ?, ?)", [
+            (1, '北京', '北京'), (2, '北京南', '北京'), (3, '呼和浩特东', '呼和浩特'), (4, '汉口', '武汉'),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_resolve(self):
+        """城市、别名和单个站名都能解析"""
+        resolver = get_resolver(self.stations_db)
+        self.assertEqual(resolver.resolve('北京'), ['北京', '北京南'])
+        self.assertEqual(resolver.resolve_ids('呼市'), [('呼和浩特东', 3)])
+        self.assertEqual(resolver.resolve('汉口'), ['汉口'])
+        self.assertEqual(resolver.canonical_city('汉口'), '武汉')
+        self.assertEqual(resolver.resolve('广州'), [])
+        self.assertIs(get_resolver(self.stations_db), resolver)
+
+    def test_reload_when_file_changes(self):
+        """stations.db 变化后重新加载"""
+        resolver = get_resolver(self.stations_db)
+        conn = sqlite3.connect(self.stations_db)
+        conn.execute("INSERT INTO stations VALUES (5, '广州南', '广州')")
+        conn.commit()
+        conn.close()
+        os.utime(self.stations_db, ns=(0, resolver.signature[0][0] + 1))
+        reloaded = get_resolver(self.stations_db)
+        self.assertIsNot(reloaded, resolver)
+        self.assertEqual(reloaded.resolve('广州'), ['广州南'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_hygiene import run_hygiene
+from database import read_timetable_version
+
+
+class TestDataHygiene(unittest.TestCase):
+    """车次数据清洗测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmpdir.name, 'trains.db')
+        conn = sqlite3.connect(self.db)
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY,
+                train_code TEXT, station_id INTEGER, station_no INTEGER,
+                train_full_code TEXT, city TEXT, arrive_time TEXT, depart_time TEXT
+            )
+        """)
+        rows = [
+            # G1：正常车次，站序连续，有时刻
+            ('G1', 1, 1, '北京', None, '08:00'),
+            ('G1', 2, 2, '天津', '08:30', '08:32'),
+            ('G1', 3, 3, '上海', '12:00', None),
+            # K2：只保存主要经停站，站序不连续且没有时刻
+            ('K2', 1, 1, '北京', None, None),
+            ('K2', 4, 7, '上海', None, None),
+            # C3：同城车次
+            ('C3', 5, 1, '上海', None, '09:00'),
+            ('C3', 6, 2, '上海', '09:20', None),
+        ]
+        # 单站车次，数量超过批大小
+        rows += [(f'D{i}', 1, 1, '北京', None, None) for i in range(7)]
+        conn.executemany("""
+            INSERT INTO train_routes (train_code, station_id, station_no, city, arrive_time, depart_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def codes(self):
+        conn = sqlite3.connect(self.db)
+        codes = {row[0] for row in conn.execute("SELECT DISTINCT train_code FROM train_routes")}
+        conn.close()
+        return codes
+
+    def test_rule_counts(self):
+        """各规则命中车次数与行数"""
+        report = run_hygiene(self.db, dry_run=True)
+        self.assertEqual(report['_shape']['trains'], 10)
+        self.assertEqual((report['single_station']['trains'], report['single_station']['rows']), (7, 7))
+        self.assertEqual(report['single_city']['examples'], ['C3'])
+        self.assertEqual(report['non_contiguous']['examples'], ['K2'])
+        self.assertEqual(report['missing_times']['trains'], 8)
+
+    def test_dry_run_does_not_modify(self):
+        """试运行不删除数据、不递增版本号"""
+        before = os.path.getmtime(self.db)
+        report = run_hygiene(self.db, dry_run=True)
+        self.assertEqual(report['single_station']['deleted'], 0)
+        self.assertEqual(len(self.codes()), 10)
+        self.assertEqual(os.path.getmtime(self.db), before)
+
+    def test_batched_delete_only_single_station(self):
+        """分批删除只影响单站车次，并递增时刻表版本号"""
+        report = run_hygiene(self.db, batch_size=3)
+        self.assertEqual(report['single_station']['deleted'], 7)
+        self.assertEqual(self.codes(), {'G1', 'K2', 'C3'})
+        conn = sqlite3.connect(self.db)
+        self.assertEqual(read_timetable_version(conn), 1)
+        conn.close()
+
+    def test_explicit_delete_rule(self):
+        """显式指定规则时删除同城车次"""
+        run_hygiene(self.db, rules=['single_city'], delete={'single_city'})
+        self.assertNotIn('C3', self.codes())
+        self.assertIn('D0', self.codes())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool, connect
+
+
+class TestDatabase(unittest.TestCase):
+    """连接池与 PRAGMA 配置档测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("INSERT INTO t (name) VALUES ('北京')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_profile_pragmas(self):
+        """配置档中的 PRAGMA 生效"""
+        conn = connect(self.path, profile='oltp')
+        try:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -32768)
+        finally:
+            conn.close()
+
+    def test_readonly_rejects_writes(self):
+        """只读连接不能写库"""
+        conn = connect(self.path, profile='query', readonly=True)
+        try:
+            self.assertEqual(conn.execute("SELECT name FROM t").fetchone()[0], '北京')
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO t (name) VALUES ('上海')")
+        finally:
+            conn.close()
+
+    def test_pool_reuses_connection(self):
+        """归还的连接被再次借出，未提交的事务被回滚"""
+        pool = ConnectionPool(self.path, profile='etl', max_size=2)
+        try:
+            with pool.connection() as conn:
+                first = conn
+                conn.execute("INSERT INTO t (name) VALUES ('上海')")
+            with pool.connection() as conn:
+                self.assertIs(conn, first)
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 1)
+        finally:
+            pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import 去重 as dedup
+
+
+class TestDeduplicate(unittest.TestCase):
+    """train_routes 去重测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, station_id INTEGER,
+                station_no INTEGER, train_full_code TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX idx_train_station ON train_routes(train_code, station_id)")
+        rows = [('G1', 1, 1, 'A'), ('G1', 2, 2, 'A'), ('G1', 1, 1, 'A'), ('G1', 1, 1, 'A'),
+                ('K9', None, None, None), ('K9', None, None, None), ('K9', 3, 1, None)]
+        rows += [('D%d' % i, 1, 1, None) for i in range(20)] * 2
+        conn.executemany("INSERT INTO train_routes (train_code, station_id, station_no, train_full_code) "
+                         "VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def ids(self):
+        conn = sqlite3.connect(self.trains_db)
+        try:
+            return [row[0] for row in conn.execute("SELECT id FROM train_routes ORDER BY id")]
+        finally:
+            conn.close()
+
+    def test_dry_run_does_not_modify(self):
+        """试运行只统计重复组"""
+        before = self.ids()
+        self.assertEqual(dedup.remove_duplicates(self.trains_db, dry_run=True), 22)
+        self.assertEqual(self.ids(), before)
+
+    def test_chunked_delete_keeps_min_id(self):
+        """分批删除，保留每组最小 id，NULL 列按相同处理"""
+        progress = []
+        conn = sqlite3.connect(self.trains_db)
+        try:
+            deleted = dedup.delete_duplicates(conn, chunk_size=7, progress=lambda *p: progress.append(p))
+        finally:
+            conn.close()
+        self.assertEqual(deleted, 23)
+        self.assertEqual(self.ids(), [1, 2, 5, 7] + list(range(8, 28)))
+        self.assertEqual(progress[-1], (23, 23, 23))
+        self.assertEqual(len(progress), 4)
+        self.assertEqual(dedup.remove_duplicates(self.trains_db), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_advisor import WORKLOAD, advise_database, apply_advice, check_plans
+
+# 与线上 trains.db / ticket.db 相同的表结构和历史索引
+TRAINS_SCHEMA = [
+    """
+    CREATE TABLE train_routes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        train_code TEXT NOT NULL,
+        station_id INTEGER,
+        station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+        UNIQUE(train_code, station_id)
+    )
+    """,
+    "CREATE INDEX idx_train_station ON train_routes(train_code, station_id)",
+    "CREATE INDEX idx_station_no ON train_routes(station_id, station_no)",
+    "CREATE INDEX idx_train_code ON train_routes(train_code)",
+    "CREATE INDEX idx_station_train ON train_routes(station_no, train_code)",
+    "CREATE INDEX idx_station_id ON train_routes(station_id)",
+    "CREATE INDEX idx_train_full_code ON train_routes(train_full_code)",
+    "CREATE INDEX idx_route_search ON train_routes(train_code, station_id, station_no)",
+]
+
+TICKET_SCHEMA = [
+    """
+    CREATE TABLE tickets (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, train_code VARCHAR(255) NOT NULL,
+        train_full_code VARCHAR(255), from_station VARCHAR(255) NOT NULL, from_station_no INTEGER NOT NULL,
+        to_station VARCHAR(255) NOT NULL, to_station_no INTEGER NOT NULL, travel_date DATE NOT NULL,
+        seat_number INTEGER NOT NULL, status VARCHAR(255) DEFAULT 'booked',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        changed_from INTEGER NULL
+    )
+    """,
+    "CREATE INDEX tickets_user_id_index ON tickets (user_id)",
+    "CREATE INDEX tickets_train_code_travel_date_index ON tickets (train_code, travel_date)",
+    """
+    CREATE TABLE seat_occupancy (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, train_code VARCHAR(255) NOT NULL, travel_date DATE NOT NULL,
+        seat_number INTEGER NOT NULL, start_station_no INTEGER NOT NULL, end_station_no INTEGER NOT NULL,
+        ticket_id INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE UNIQUE INDEX seat_occupancy_unique ON seat_occupancy "
+    "(train_code, travel_date, seat_number, start_station_no, end_station_no)",
+    "CREATE INDEX seat_occupancy_train_code_travel_date_index ON seat_occupancy (train_code, travel_date)",
+    "CREATE INDEX seat_occupancy_seat_number_index ON seat_occupancy (seat_number)",
+]
+
+
+class TestIndexAdvisor(unittest.TestCase):
+    """索引建议与查询计划回归检查"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        for path, schema in (('trains.db', TRAINS_SCHEMA), ('ticket.db', TICKET_SCHEMA)):
+            conn = sqlite3.connect(path)
+            for sql in schema:
+                conn.execute(sql)
+            conn.commit()
+            conn.close()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def apply(self, path):
+        advice = advise_database(path)
+        conn = sqlite3.connect(path)
+        apply_advice(conn, advice)
+        violations = check_plans(conn, WORKLOAD[path])
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        return advice, violations, indexes
+
+    def test_trains_redundant_indexes_dropped(self):
+        """前缀重复的索引被删除，留下一个覆盖索引"""
+        advice, violations, indexes = self.apply('trains.db')
+        self.assertEqual(violations, [])
+        self.assertLessEqual(advice['cost'], advice['baseline_cost'])
+        for name in ('idx_train_code', 'idx_train_station', 'idx_station_id', 'idx_station_no'):
+            self.assertIn(name, advice['drop'])
+            self.assertNotIn(name, indexes)
+        self.assertIn('sqlite_autoindex_train_routes_1', indexes)
+        self.assertIn('idx_route_station', indexes)
+
+    def test_release_seat_scan_detected_and_fixed(self):
+        """按票ID释放/改签座位原为全表扫描，建议后走索引"""
+        conn = sqlite3.connect('ticket.db')
+        before = check_plans(conn, WORKLOAD['ticket.db'])
+        conn.close()
+        self.assertEqual([name for name, _ in before], ['release_seat', 'move_seat'])
+
+        advice, violations, indexes = self.apply('ticket.db')
+        self.assertEqual(violations, [])
+        self.assertIn('idx_seat_occupancy_ticket', indexes)
+        self.assertIn('seat_occupancy_unique', indexes)
+        self.assertNotIn('seat_occupancy_train_code_travel_date_index', indexes)
+        # 分片迁移按 (车次, 日期) 读写车票，原有索引保留
+        self.assertIn('tickets_train_code_travel_date_index', indexes)
+        self.assertNotIn('tickets_train_code_travel_date_index', advice['drop'])
+
+    def test_rebalance_index_proposed(self):
+        """车票表缺少 (车次, 日期) 索引时，分片迁移的逐组查询是全表扫描，建议新建索引"""
+        conn = sqlite3.connect('ticket.db')
+        conn.execute("DROP INDEX tickets_train_code_travel_date_index")
+        conn.commit()
+        before = check_plans(conn, WORKLOAD['ticket.db'])
+        conn.close()
+        self.assertIn('rebalance_delete_tickets', [name for name, _ in before])
+
+        advice, violations, indexes = self.apply('ticket.db')
+        self.assertEqual(violations, [])
+        self.assertIn('idx_tickets_train_date', indexes)
+
+    def test_hot_queries_never_scan(self):
+        """回归检查：建议的索引集合下所有在线查询都不是全表扫描"""
+        for path in WORKLOAD:
+            advice = advise_database(path)
+            self.assertEqual(advice['violations'], [], path)
+            for query in WORKLOAD[path]:
+                if query['hot'] and query['name'] in advice['plans']:
+                    self.assertTrue(any(d.startswith('SEARCH') for d in advice['plans'][query['name']]),
+                                    query['name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_queue import TicketWriter, ensure_ticket_tables, generate_orders
+from inventory_snapshot import (InventorySnapshot, SnapshotInventory, benchmark_restart, restore_inventory,
+                                take_snapshot, write_snapshot)
+from seat_inventory import SeatInventory
+
+TODAY = date.today()
+DAY1 = (TODAY + timedelta(days=1)).isoformat()
+DAY2 = (TODAY + timedelta(days=2)).isoformat()
+PAST = (TODAY - timedelta(days=10)).isoformat()
+
+ROWS = [
+    ('G1', DAY1, 1, 1, 3, 1),
+    ('G1', DAY1, 2, 2, 5, 2),
+    ('G1', DAY1, 1, 3, 4, 3),
+    ('G1', DAY2, 5, 1, 2, 4),
+    ('D5', DAY1, 3, 1, 9, 5),
+    ('G1', PAST, 4, 1, 3, 6),
+]
+
+
+class TestInventorySnapshot(unittest.TestCase):
+    """座位库存快照：二进制格式、映射读取、回放恢复"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ticket_db = os.path.join(self.tmpdir.name, 'ticket.db')
+        self.snapshot = self.ticket_db + '.inv'
+        conn = sqlite3.connect(self.ticket_db)
+        ensure_ticket_tables(conn)
+        self.insert(conn, ROWS)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def insert(conn, rows):
+        conn.executemany("""
+            INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no,
+                                        ticket_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    def execute(self, sql, params=()):
+        conn = sqlite3.connect(self.ticket_db)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def insert_external(self, rows):
+        conn = sqlite3.connect(self.ticket_db)
+        self.insert(conn, rows)
+        conn.commit()
+        conn.close()
+
+    def assert_matches_db(self, inventory, date_from=None):
+        full = SeatInventory.from_db(self.ticket_db, inventory.total_seats, date_from=date_from)
+        self.assertEqual({k: v.segments for k, v in inventory.trains.items()},
+                         {k: v.segments for k, v in full.trains.items()})
+        for key, day in full.trains.items():
+            self.assertEqual(inventory.trains[key].seat_segments, day.seat_segments)
+
+    def test_round_trip(self):
+        """快照写出后映射读取：余票、矩阵与数据库一致，多个读者共享同一文件，替换文件不影响已映射的读者"""
+        stats = take_snapshot(self.ticket_db, total_seats=5)
+        self.assertTrue(stats['full_load'])
+        self.assertEqual(stats['occupancy_hw'], 6)
+        full = SeatInventory.from_db(self.ticket_db, 5)
+
+        first, second = InventorySnapshot(self.snapshot), InventorySnapshot(self.snapshot)
+        try:
+            self.assertEqual(len(first), 4)
+            self.assertEqual(sorted(first.keys()), sorted(full.trains))
+            queries = [('G1', DAY1, 1, 4), ('G1', DAY1, 3, 4), ('G1', DAY1, 4, 8), ('D5', DAY1, 2, 3),
+                       ('G1', DAY2, 1, 2), ('Z99', DAY1, 1, 2)]
+            self.assertEqual(first.count_available_many(queries), full.count_available_many(queries))
+            self.assertEqual(first.get('G1', DAY1).seat_segments, full.trains[('G1', DAY1)].seat_segments)
+            self.assertIsNone(first.get('Z99', DAY1))
+
+            write_snapshot(SeatInventory(5), self.snapshot)
+            self.assertEqual(second.count_available('G1', DAY1, 1, 4), 3)
+        finally:
+            first.close()
+            second.close()
+        with InventorySnapshot(self.snapshot) as replaced:
+            self.assertEqual(len(replaced), 0)
+
+    def test_replay(self):
+        """快照之后的新增记录按高水位 id 回放，退票和改签（删除、原地改写）涉及的车次/日期重新读取"""
+        take_snapshot(self.ticket_db, total_seats=5, date_from=TODAY.isoformat())
+        conn = sqlite3.connect(self.ticket_db)
+        self.insert(conn, [('G1', DAY2, 1, 1, 5, 7), ('K9', DAY2, 2, 1, 2, 8)])
+        conn.execute("DELETE FROM seat_occupancy WHERE ticket_id = 1")
+        conn.execute("UPDATE seat_occupancy SET train_code = 'K9', ticket_id = 9 WHERE ticket_id = 5")
+        conn.commit()
+        conn.close()
+
+        inventory, stats = restore_inventory(self.ticket_db, self.snapshot, 5, date_from=TODAY.isoformat())
+        self.assertFalse(stats['full_load'])
+        self.assertEqual(stats['snapshot_keys'], 3)
+        self.assertEqual(stats['replayed_rows'], 2)     # 第二天的两条新记录
+        self.assertEqual(stats['reloaded_keys'], 3)     # 第一天的 G1（删除）、D5 和 K9（改写）
+        self.assertEqual(stats['occupancy_hw'], 8)
+        self.assertNotIn(('G1', PAST), inventory.trains)
+        self.assert_matches_db(inventory, date_from=TODAY.isoformat())
+
+    def test_lazy_restore(self):
+        """lazy 恢复只重建回放涉及的矩阵，其余余票读映射；遮盖的车次和日期不再读取快照"""
+        take_snapshot(self.ticket_db, total_seats=5, date_from=TODAY.isoformat())
+        conn = sqlite3.connect(self.ticket_db)
+        self.insert(conn, [('G1', DAY2, 1, 1, 5, 7), ('K9', DAY2, 2, 1, 2, 8)])
+        conn.execute("DELETE FROM seat_occupancy WHERE ticket_id = 5")
+        conn.commit()
+        conn.close()
+
+        inventory, stats = restore_inventory(self.ticket_db, self.snapshot, 5, date_from=TODAY.isoformat(), lazy=True)
+        full = SeatInventory.from_db(self.ticket_db, 5, date_from=TODAY.isoformat())
+        try:
+            self.assertIsInstance(inventory, SnapshotInventory)
+            self.assertEqual(stats['replayed_rows'], 2)
+            self.assertEqual(sorted(inventory.trains), [('G1', DAY2), ('K9', DAY2)])   # G1 当日的矩阵仍在快照中
+            # 写线程在读路径查目录时 detach：本次查询仍用取到的快照读完，之后不再读快照
+            class DetachingIndex(dict):
+                def get(self, key, default=None):
+                    inventory.detach()
+                    return dict.get(self, key, default)
+
+            inventory._index = DetachingIndex(inventory._index)
+            self.assertEqual(inventory.count_available_many([('G1', DAY1, 1, 4)]), [3])
+            self.assertEqual(inventory.count_available_many([('G1', DAY1, 1, 4)]), [5])
+            self.assertIsNone(inventory.base_day('G1', DAY1))
+            inventory.snapshot = inventory._mapping
+            inventory._index = dict(inventory._index)
+            queries = [(code, day, a, b) for code in ('G1', 'D5', 'K9') for day in (PAST, DAY1, DAY2)
+                       for a, b in ((1, 2), (1, 4), (3, 9))]
+            self.assertEqual(inventory.count_available_many(queries), full.count_available_many(queries))
+            self.assertEqual(inventory.get('G1', DAY1).seat_segments, full.trains[('G1', DAY1)].seat_segments)
+
+            inventory.forget('G1', DAY1)
+            inventory.replace_date(DAY2, {})
+            self.assertEqual(inventory.count_available_many([('G1', DAY1, 1, 4), ('G1', DAY2, 1, 4)]), [5, 5])
+            self.assertIsNone(inventory.base_day('G1', DAY2))
+        finally:
+            inventory.close()
+
+    def test_fallback_to_full_load(self):
+        """快照损坏、座位数不同或所需的变更日志已被清理时退回完整加载"""
+        take_snapshot(self.ticket_db, total_seats=5)
+        stale = self.snapshot + '.old'
+        shutil.copy(self.snapshot, stale)
+        self.execute("DELETE FROM seat_occupancy WHERE ticket_id = 2")
+        take_snapshot(self.ticket_db, total_seats=5)     # 清理了旧快照需要的日志
+        self.execute("DELETE FROM seat_occupancy WHERE ticket_id = 3")
+
+        inventory, stats = restore_inventory(self.ticket_db, stale, 5)
+        self.assertTrue(stats['full_load'])
+        self.assert_matches_db(inventory)
+        inventory, stats = restore_inventory(self.ticket_db, self.snapshot, 5)
+        self.assertFalse(stats['full_load'])
+        self.assert_matches_db(inventory)
+        self.assertTrue(restore_inventory(self.ticket_db, self.snapshot, 6)[1]['full_load'])
+
+        with open(stale, 'wb') as f:
+            f.write(b'not a snapshot')
+        self.assertRaises(ValueError, InventorySnapshot, stale)
+        inventory, stats = restore_inventory(self.ticket_db, stale, 5)
+        self.assertTrue(stats['full_load'])
+        self.assert_matches_db(inventory)
+
+    def test_date_from_recorded(self):
+        """快照记录起始日期：恢复更早的日期（或全部日期）时退回完整加载，不会漏掉快照之前的日期"""
+        take_snapshot(self.ticket_db, total_seats=5, date_from=TODAY.isoformat())
+        with InventorySnapshot(self.snapshot) as snapshot:
+            self.assertEqual(snapshot.date_from, TODAY.isoformat())
+
+        for date_from in (None, PAST):
+            inventory, stats = restore_inventory(self.ticket_db, self.snapshot, 5, date_from=date_from)
+            self.assertTrue(stats['full_load'])
+            self.assertIn(('G1', PAST), inventory.trains)
+            self.assert_matches_db(inventory, date_from=date_from)
+        inventory, stats = restore_inventory(self.ticket_db, self.snapshot, 5, date_from=DAY2)
+        self.assertFalse(stats['full_load'])
+        self.assert_matches_db(inventory, date_from=DAY2)
+
+    def test_writer_warm_start(self):
+        """写者停止时更新快照，重启后从快照恢复，查询余票和购票都不再读取 seat_occupancy"""
+        order = generate_orders(1, seed=8)[0]
+
+        async def run(scenario):
+            writer = TicketWriter(self.ticket_db, SeatInventory(5), snapshot_path=self.snapshot)
+            await writer.start()
+            try:
+                return await scenario(writer), writer
+            finally:
+                await writer.stop()
+
+        async def book(writer):
+            return await writer.book_ticket(1, order)
+
+        async def restart(writer):
+            await writer.ensure_date(order['travel_date'])
+            left = writer.count_available_many([('G1', DAY1, 1, 4)])
+            booked = await writer.book_ticket(2, order)
+            return left, booked
+
+        _, writer = asyncio.run(run(book))
+        self.assertTrue(writer.restore_stats['full_load'])
+        (left, booked), writer = asyncio.run(run(restart))
+        self.assertFalse(writer.restore_stats['full_load'])
+        self.assertIsInstance(writer.inventory, SnapshotInventory)
+        self.assertEqual(left, [3])
+        self.assertEqual(booked[1], 2)
+        self.assertEqual(writer.stats()['scans'], 0)
+        with InventorySnapshot(self.snapshot) as snapshot:
+            self.assertEqual(snapshot.count_available(order['train_code'], order['travel_date'],
+                                                      order['from_no'], order['to_no']), 3)
+
+    def test_writer_sees_external_writes_after_warm_start(self):
+        """从快照恢复后，其它连接改过的车次不再读快照：下一次 ensure_date 重新读取"""
+        take_snapshot(self.ticket_db, total_seats=5, date_from=TODAY.isoformat())
+
+        async def scenario():
+            writer = TicketWriter(self.ticket_db, SeatInventory(5), snapshot_path=self.snapshot)
+            await writer.start()
+            try:
+                before = writer.count_available_many([('G1', DAY1, 1, 4), ('D5', DAY1, 1, 2)])
+                self.execute("DELETE FROM seat_occupancy WHERE ticket_id = 5")
+                self.insert_external([('G1', DAY1, 5, 1, 2, 7)])
+                await writer.ensure_date(DAY1)
+                return before, writer.count_available_many([('G1', DAY1, 1, 4), ('D5', DAY1, 1, 2)]), writer
+            finally:
+                await writer.stop()
+
+        before, after, writer = asyncio.run(scenario())
+        self.assertEqual(before, [3, 4])
+        self.assertEqual(after, [2, 5])
+        self.assertEqual(writer.stats()['scans'], 2)
+
+    def test_benchmark_restart(self):
+        """小规模启动耗时对比：快照恢复结果与完整加载一致"""
+        result = benchmark_restart(rows=2000, trains=20, recent=50, workdir=self.tmpdir.name)
+        self.assertFalse(result['full_load'])
+        self.assertGreater(result['reloaded_keys'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journey_planner import JourneyPlanner, format_minutes, stop_times
+
+
+def build_test_databases(directory):
+    """创建带到发时刻的小规模时刻表"""
+    stations_db = os.path.join(directory, 'stations.db')
+    trains_db = os.path.join(directory, 'trains.db')
+
+    conn = sqlite3.connect(stations_db)
+    conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, city TEXT)")
+    conn.executemany("INSERT INTO stations (id, name, city) VALUES (?, ?, ?)", [
+        (1, '北京', '北京'), (2, '北京南', '北京'), (3, '济南', '济南'),
+        (4, '上海', '上海'), (5, '南京', '南京'), (6, '天津', '天津'),
+    ])
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(trains_db)
+    conn.execute("""
+        CREATE TABLE train_routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            train_code TEXT NOT NULL,
+            station_id INTEGER,
+            station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+            UNIQUE(train_code, station_id)
+        )
+    """)
+    conn.executemany("""
+        INSERT INTO train_routes (train_code, station_id, station_no, arrive_time, depart_time)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        # 北京南 -> 济南 -> 南京
+        ('G1', 2, 1, None, '08:00'), ('G1', 3, 2, '10:00', '10:02'), ('G1', 5, 3, '12:00', None),
+        # 南京 -> 上海，12:05 开车赶不上（同站换乘10分钟）
+        ('G2', 5, 1, None, '12:05'), ('G2', 4, 2, '13:30', None),
+        ('G3', 5, 1, None, '12:20'), ('G3', 4, 2, '13:40', None),
+        # 北京 -> 上海 夜车
+        ('K1', 1, 1, None, '20:00'), ('K1', 3, 2, '23:50', '23:58'), ('K1', 4, 3, '07:00', None),
+        # 天津 -> 北京，再从北京南去上海（同城换乘）
+        ('T1', 6, 1, None, '08:00'), ('T1', 1, 2, '09:00', None),
+        ('T2', 2, 1, None, '09:30'), ('T2', 4, 2, '14:00', None),
+        ('T4', 2, 1, None, '10:30'), ('T4', 4, 2, '15:00', None),
+        # 没有时刻的车次不参与规划
+        ('Z9', 1, 1, None, None), ('Z9', 4, 2, None, None),
+    ])
+    conn.commit()
+    conn.close()
+    return trains_db, stations_db
+
+
+class TestJourneyPlanner(unittest.TestCase):
+    """换乘规划器测试"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.trains_db, cls.stations_db = build_test_databases(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_stop_times_roll_over_midnight(self):
+        """跨天车次的时刻单调递增"""
+        timed = stop_times([(1, 1, None, '20:00'), (3, 2, '23:50', '00:05'), (4, 3, '07:00', None)])
+        self.assertEqual([t[2:] for t in timed], [(1200, 1200), (1430, 1445), (1860, 1860)])
+        self.assertEqual(format_minutes(1860), '07:00(+1)')
+
+    def test_pareto_by_transfers(self):
+        """直达与一次换乘方案都返回，换乘方案到达更早"""
+        planner = JourneyPlanner.load(self.trains_db, self.stations_db)
+        self.assertEqual(planner.stats()['skipped_trains'], 1)
+
+        itineraries = planner.plan('北京', '上海', depart_after=0, max_transfers=1)
+        self.assertEqual([it['transfers'] for it in itineraries], [0, 1])
+        self.assertEqual([leg['train_code'] for leg in itineraries[0]['legs']], ['T2'])
+        self.assertEqual(itineraries[0]['arrive'], 14 * 60)
+        # G2 换乘时间不足，只能换乘 G3
+        self.assertEqual([leg['train_code'] for leg in itineraries[1]['legs']], ['G1', 'G3'])
+        self.assertEqual(itineraries[1]['arrive'], 13 * 60 + 40)
+
+    def test_city_transfer_time(self):
+        """同城不同车站换乘需要满足同城换乘时间"""
+        strict = JourneyPlanner.load(self.trains_db, self.stations_db, city_transfer=60)
+        result = strict.plan('天津', '上海', max_transfers=1)
+        self.assertEqual([leg['train_code'] for leg in result[-1]['legs']], ['T1', 'T4'])
+
+        relaxed = JourneyPlanner.load(self.trains_db, self.stations_db, city_transfer=20)
+        result = relaxed.plan('天津', '上海', max_transfers=1)
+        self.assertEqual([leg['train_code'] for leg in result[-1]['legs']], ['T1', 'T2'])
+
+    def test_overnight_direct(self):
+        """晚间出发时只剩夜车，到达时刻跨天"""
+        planner = JourneyPlanner.load(self.trains_db, self.stations_db)
+        itineraries = planner.plan('北京', '上海', depart_after=19 * 60, max_transfers=0)
+        self.assertEqual([leg['train_code'] for leg in itineraries[0]['legs']], ['K1'])
+        self.assertEqual(itineraries[0]['arrive'], 1860)
+
+    def test_no_transfer_allowed(self):
+        """max_transfers=0 时只返回直达方案"""
+        planner = JourneyPlanner.load(self.trains_db, self.stations_db)
+        itineraries = planner.plan('天津', '上海', max_transfers=0)
+        self.assertEqual(itineraries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate_timetable
+
+
+class TestMigrateTimetable(unittest.TestCase):
+    """规范化时刻表迁移测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = lambda name: os.path.join(self.tmpdir.name, name)
+
+        conn = sqlite3.connect(self.path('stations.db'))
+        conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, city TEXT)")
+        conn.executemany("INSERT INTO stations VALUES (?, ?, ?)", [
+            (1, '北京南', '北京'), (2, '南京南', '南京'), (3, '上海虹桥', '上海'), (4, '北京西', '北京'),
+        ])
+        conn.commit()
+        conn.close()
+
+        conn = sqlite3.connect(self.path('trains.db'))
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, station_id INTEGER,
+                station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+                UNIQUE(train_code, station_id)
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO train_routes (train_code, station_id, station_no, city, train_full_code, run_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            ('G1', 1, 1, '北京', '24000000G10A', '04:18'), ('G1', 2, 5, '南京', '24000000G10A', '04:18'),
+            ('G1', 3, 9, '上海', '24000000G10A', '04:18'),
+            ('D2', 3, 1, '上海', None, None), ('D2', 4, 3, '北京', None, None),
+        ])
+        conn.commit()
+        conn.close()
+
+        # 12306.db 中多出一个车次 K3 和一个新车站
+        conn = sqlite3.connect(self.path('12306.db'))
+        conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, code TEXT NOT NULL, "
+                     "station_no INTEGER, UNIQUE(name, code))")
+        conn.executemany("INSERT INTO stations (name, code, station_no) VALUES (?, ?, ?)", [
+            ('北京南', 'G1', 1), ('北京西', 'K3', 1), ('德州', 'K3', 2), ('南京南', 'K3', 6),
+        ])
+        conn.commit()
+        conn.close()
+
+        conn = sqlite3.connect(self.path('train_basic.db'))
+        conn.execute("CREATE TABLE D (train_full_code TEXT, train_class TEXT, run_time TEXT)")
+        conn.execute("INSERT INTO D VALUES ('5c000000D20A', '动车', '05:00')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_migrate(self):
+        return migrate_timetable.migrate(
+            self.path('timetable.db'), self.path('trains.db'), self.path('stations.db'),
+            self.path('train_basic.db'), self.path('12306.db'),
+        )
+
+    def test_decode_full_code(self):
+        """完整车次号解码为车次代码"""
+        self.assertEqual(migrate_timetable.decode_full_code('6c000D36180E'), 'D3618')
+        self.assertEqual(migrate_timetable.decode_full_code('800000Z1620H'), 'Z162')
+        self.assertIsNone(migrate_timetable.decode_full_code(''))
+
+    def test_migrate_merges_sources(self):
+        """合并 trains.db、12306.db 和 train_basic.db"""
+        counts = self.run_migrate()
+        self.assertEqual(counts['trains'], 3)
+        self.assertEqual(counts['stations'], 5)
+        self.assertEqual(counts['stops'], 8)
+        self.assertEqual(counts['legacy_stops'], 3)
+
+        conn = sqlite3.connect(self.path('timetable.db'))
+        try:
+            self.assertEqual(conn.execute("""
+                SELECT t.full_code, c.name, t.run_time FROM trains t JOIN train_classes c ON c.id = t.class_id
+                WHERE t.code = 'D2'
+            """).fetchone(), ('5c000000D20A', '动车', '05:00'))
+            self.assertEqual(
+                migrate_timetable.direct_trains(conn, '北京', '南京'),
+                [('G1', 1, 5), ('K3', 1, 6)],
+            )
+            self.assertEqual(migrate_timetable.direct_trains(conn, '上海', '北京'), [('D2', 1, 3)])
+            self.assertEqual(migrate_timetable.direct_trains(conn, '北京', '广州'), [])
+        finally:
+            conn.close()
+        self.assertFalse(os.path.exists(self.path('timetable.db.tmp')))
+
+    def test_report_matches_legacy(self):
+        """只有 trains.db 数据时新旧查询结果数一致"""
+        os.remove(self.path('12306.db'))
+        self.run_migrate()
+        report = migrate_timetable.migration_report(
+            self.path('timetable.db'), self.path('trains.db'), self.path('stations.db'),
+            sources=[self.path('trains.db'), self.path('stations.db')], repeat=1,
+        )
+        self.assertEqual(report['legacy_rows'], report['new_rows'])
+        self.assertEqual(report['pairs'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
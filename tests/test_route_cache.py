@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import bump_timetable_version, read_timetable_version
+from route_cache import RouteCache
+
+
+class TestRouteCache(unittest.TestCase):
+    """直达查询结果缓存测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("CREATE TABLE train_routes (train_code TEXT)")
+        conn.commit()
+        conn.close()
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def loader(self, value):
+        def load():
+            self.calls += 1
+            return value
+        return load
+
+    def bump(self):
+        conn = sqlite3.connect(self.trains_db)
+        bump_timetable_version(conn)
+        conn.commit()
+        version = read_timetable_version(conn)
+        conn.close()
+        return version
+
+    def test_hit_and_lru_eviction(self):
+        """命中不重复计算，超过容量淘汰最久未使用的条目"""
+        cache = RouteCache(max_entries=2, databases=[self.trains_db])
+        cache.get(('北京', '上海'), self.loader([('G1', '北京南', 1, '上海虹桥', 3)]))
+        cache.get(('北京', '天津'), self.loader([]))
+        cache.get(('北京', '上海'), self.loader(None))
+        cache.get(('上海', '北京'), self.loader([]))
+        self.assertEqual(self.calls, 3)
+
+        cache.get(('北京', '天津'), self.loader([]))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 4, 2))
+        self.assertEqual(stats['entries'], 2)
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_version_bump_invalidates(self):
+        """ETL 递增版本号后旧条目失效"""
+        cache = RouteCache(databases=[self.trains_db])
+        self.assertEqual(cache.version(), (0,))
+        cache.get('k', self.loader(1))
+        self.assertEqual(self.bump(), 1)
+        self.assertEqual(self.bump(), 2)
+        self.assertEqual(cache.get('k', self.loader(2)), 2)
+        self.assertEqual(cache.stats()['stale'], 1)
+        self.assertEqual(cache.stats()['version'], (2,))
+
+    def test_ttl_expiry(self):
+        """过期条目重新计算"""
+        cache = RouteCache(ttl=0, databases=[self.trains_db])
+        cache.get('k', self.loader(1))
+        self.assertEqual(cache.get('k', self.loader(2)), 2)
+        self.assertEqual(cache.stats()['expired'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
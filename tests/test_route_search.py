@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect
+from route_search import build_route_query, decode_cursor, encode_cursor, parse_window, search_routes
+from time_columns import normalize_times
+
+# (车次, [(车站ID, 站序, 到达, 出发), ...], 运行时长)
+TRAINS = [
+    ('G1', [(1, 1, None, '07:00'), (3, 2, '11:30', None)], '04:30'),
+    ('G3', [(2, 1, None, '14:00'), (3, 4, '18:10', None)], '04:10'),
+    ('D5', [(1, 1, None, '15:30'), (4, 3, '22:00', None)], '06:30'),
+    ('K7', [(1, 1, None, '21:00'), (3, 9, '09:00', None)], '12:00'),
+    ('G9', [(2, 1, None, '16:00'), (4, 2, '19:55', None)], '03:55'),
+    # 反方向，不应出现
+    ('G2', [(3, 1, None, '08:00'), (1, 2, '12:30', None)], '04:30'),
+]
+
+
+class TestRouteSearch(unittest.TestCase):
+    """直达查询过滤、排序与翻页测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, station_id INTEGER,
+                station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+                UNIQUE(train_code, station_id)
+            )
+        """)
+        for code, stops, run_time in TRAINS:
+            conn.executemany("""
+                INSERT INTO train_routes (train_code, station_id, station_no, arrive_time, depart_time, run_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(code, *stop, run_time) for stop in stops])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def search(self, **filters):
+        conn = connect(self.trains_db, readonly=True)
+        try:
+            return search_routes(conn, [1, 2], [3, 4], **filters)
+        finally:
+            conn.close()
+
+    def codes(self, **filters):
+        return [route['train_code'] for route in self.search(**filters)[0]]
+
+    def test_without_minute_columns(self):
+        """未生成分钟列时按车次排序仍可用，时间过滤报错"""
+        self.assertEqual(self.codes(), ['D5', 'G1', 'G3', 'G9', 'K7'])
+        with self.assertRaises(ValueError):
+            self.search(sort='depart')
+
+    def test_filters_and_sorts(self):
+        """时间窗、时长上限、车次类型和排序"""
+        normalize_times(self.trains_db)
+        self.assertEqual(self.codes(sort='depart'), ['G1', 'G3', 'D5', 'G9', 'K7'])
+        self.assertEqual(self.codes(sort='duration'), ['G9', 'G3', 'G1', 'D5', 'K7'])
+        self.assertEqual(self.codes(depart_window=parse_window('14:00-16:00'), sort='depart'), ['G3', 'D5', 'G9'])
+        self.assertEqual(self.codes(arrive_window=parse_window('-12:00')), ['G1', 'K7'])
+        self.assertEqual(self.codes(max_minutes=260, sort='duration'), ['G9', 'G3'])
+        self.assertEqual(self.codes(classes=['D', 'K']), ['D5', 'K7'])
+
+        # 跨天到达：21:00 出发次日 09:00 到达
+        k7 = self.search(classes=['K'])[0][0]
+        self.assertEqual((k7['arrive_min'], k7['arrive_day'], k7['duration']), (540, 1, 720))
+
+    def test_keyset_pagination(self):
+        """逐页翻完与一次性查询结果一致，末页没有游标"""
+        normalize_times(self.trains_db)
+        expected = self.codes(sort='duration')
+        pages = []
+        cursor = None
+        while True:
+            routes, cursor = self.search(sort='duration', limit=2, cursor=cursor)
+            pages.append([route['train_code'] for route in routes])
+            if cursor is None:
+                break
+        self.assertEqual(pages, [expected[:2], expected[2:4], expected[4:]])
+
+    def test_filters_pushed_into_index(self):
+        """过滤条件在 SQL 中，出发侧走 (station_id, depart_min) 索引"""
+        normalize_times(self.trains_db)
+        sql, params = build_route_query([1, 2], [3, 4], depart_window=(840, 960), classes=['G'], sort='depart')
+        self.assertIn("substr(a.train_code, 1, 1) IN (?)", sql)
+        conn = sqlite3.connect(self.trains_db)
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        conn.close()
+        self.assertIn('idx_route_depart', plan[0])
+        self.assertTrue(all(not detail.startswith('SCAN') for detail in plan))
+
+    def test_invalid_input(self):
+        """无效的游标、排序、车次类型和时间窗"""
+        self.assertEqual(decode_cursor(encode_cursor((258, 'G9', 2, 4))), [258, 'G9', 2, 4])
+        # server.js 的 Buffer 'base64url' 不带填充，两边生成的游标相同
+        self.assertEqual(decode_cursor('WyIiLCJHMSIsMSwyXQ'), ['', 'G1', 1, 2])
+        self.assertEqual(encode_cursor(('', 'G1', 1, 2)), 'WyIiLCJHMSIsMSwyXQ')
+        for bad in ('not-a-cursor', encode_cursor([1, 2])):
+            with self.assertRaises(ValueError):
+                decode_cursor(bad)
+        with self.assertRaises(ValueError):
+            build_route_query([1], [3], sort='price')
+        with self.assertRaises(ValueError):
+            build_route_query([1], [3], classes=['X'])
+        with self.assertRaises(ValueError):
+            parse_window('25:00-')
+
+
+if __name__ == '__main__':
+    unittest.main()
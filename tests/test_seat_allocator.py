@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seat_allocator import SeatAllocator, benchmark_strategies, register_strategy
+from seat_inventory import SeatInventory
+
+
+def build_inventory():
+    """5个座位、10站：
+    1号座 [1,3) 已售；2号座 [5,10) 已售；3号座 [1,3) 和 [6,10) 已售；4、5号座空闲
+    """
+    inventory = SeatInventory(total_seats=5)
+    inventory.occupy('G1', '2025-06-04', 1, 1, 3)
+    inventory.occupy('G1', '2025-06-04', 2, 5, 10)
+    inventory.occupy('G1', '2025-06-04', 3, 1, 3)
+    inventory.occupy('G1', '2025-06-04', 3, 6, 10)
+    return inventory
+
+
+class TestSeatAllocator(unittest.TestCase):
+    """选座策略测试"""
+
+    def test_first_fit(self):
+        """首次适应选编号最小的空座"""
+        allocator = SeatAllocator(build_inventory(), 'first_fit')
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 3, 5), 1)
+
+    def test_best_fit_picks_tightest_gap(self):
+        """最佳适应选空闲区间最短的座位"""
+        allocator = SeatAllocator(build_inventory(), 'best_fit')
+        # 3号座空闲区间为 [3,6)，比1号座 [3,10) 和2号座 [1,5) 都短
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 3, 5), 3)
+        # 3号座剩余 [5,6) 恰好填满
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 5, 6), 3)
+
+    def test_consolidate_prefers_adjacent(self):
+        """集中分配优先选择与已售区间相接的座位"""
+        allocator = SeatAllocator(build_inventory(), 'consolidate')
+        # 1号座的已售区间在3号站结束，与 [3,5) 相接
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 3, 5), 1)
+        # 2号座的已售区间从5号站开始，与 [2,5) 相接；空闲的4、5号座留给长途
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 2, 5), 2)
+
+    def test_sold_out_and_release(self):
+        """无空座返回 None，退票后可再次分配"""
+        allocator = SeatAllocator(SeatInventory(total_seats=1), 'best_fit')
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 1, 5), 1)
+        self.assertIsNone(allocator.allocate('G1', '2025-06-04', 2, 3))
+        allocator.release('G1', '2025-06-04', 1, 1, 5)
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 2, 3), 1)
+
+    def test_custom_strategy(self):
+        """可注册自定义策略"""
+        register_strategy('last_fit', lambda day, free_mask, start_no, end_no: free_mask.bit_length())
+        allocator = SeatAllocator(build_inventory(), 'last_fit')
+        self.assertEqual(allocator.allocate('G1', '2025-06-04', 3, 5), 5)
+
+    def test_benchmark_reports_each_strategy(self):
+        """基准测试输出每种策略的指标"""
+        results = benchmark_strategies(total_seats=20, stops=8, strategies=['first_fit', 'best_fit'])
+        self.assertEqual(set(results), {'first_fit', 'best_fit'})
+        for r in results.values():
+            self.assertGreater(r['sold'], 0)
+            self.assertLessEqual(r['utilization'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
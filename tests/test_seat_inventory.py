@@ -0,0 +1,106 @@
+import os
+import random
+import sqlite3
+import sys
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seat_inventory import (SeatInventory, TrainDayInventory, availability_calendar, booking_window,
+                            count_free_naive)
+
+
+class TestTrainDayInventory(unittest.TestCase):
+    """座位区间位图测试"""
+
+    def test_interval_overlap(self):
+        """相邻区间不冲突，重叠区间冲突"""
+        inventory = TrainDayInventory(total_seats=3)
+        inventory.occupy(1, 1, 3)
+        self.assertEqual(inventory.free_seats(3, 5), [1, 2, 3])
+        self.assertEqual(inventory.free_seats(2, 4), [2, 3])
+        self.assertEqual(inventory.first_free_seat(1, 2), 2)
+
+        inventory.release(1, 1, 3)
+        self.assertEqual(inventory.count_free(1, 5), 3)
+
+    def test_matches_naive_loop(self):
+        """与逐座位循环的结果一致"""
+        rng = random.Random(7)
+        inventory = TrainDayInventory(total_seats=50)
+        records = []
+        for _ in range(300):
+            seat = rng.randint(1, 50)
+            start_no = rng.randint(1, 11)
+            end_no = rng.randint(start_no + 1, 12)
+            if seat in inventory.free_seats(start_no, end_no):
+                inventory.occupy(seat, start_no, end_no)
+                records.append((seat, start_no, end_no))
+
+        for start_no in range(1, 12):
+            for end_no in range(start_no + 1, 13):
+                self.assertEqual(inventory.count_free(start_no, end_no),
+                                 count_free_naive(records, 50, start_no, end_no))
+
+
+class TestSeatInventory(unittest.TestCase):
+    """按车次/日期管理的座位库存测试"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("""
+            CREATE TABLE seat_occupancy (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, travel_date DATE NOT NULL,
+                seat_number INTEGER NOT NULL, start_station_no INTEGER NOT NULL, end_station_no INTEGER NOT NULL,
+                ticket_id INTEGER NOT NULL
+            )
+        """)
+        self.conn.executemany("""
+            INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no, ticket_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            ('G1', '2025-06-04', 1, 1, 5, 1),
+            ('G1', '2025-06-04', 2, 3, 5, 2),
+            ('G1', '2025-06-05', 1, 1, 5, 3),
+            ('D2', '2025-06-04', 1, 2, 3, 4),
+        ])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_load_with_filters(self):
+        """按车次和日期过滤加载"""
+        inventory = SeatInventory(total_seats=10)
+        self.assertEqual(inventory.load(self.conn, train_codes=['G1'], travel_date='2025-06-04'), 2)
+        self.assertEqual(inventory.count_available('G1', '2025-06-04', 1, 3), 9)
+        self.assertEqual(inventory.count_available('G1', '2025-06-05', 1, 3), 10)
+
+    def test_count_available_many(self):
+        """批量查询多个车次"""
+        inventory = SeatInventory(total_seats=10)
+        inventory.load(self.conn)
+        counts = inventory.count_available_many([
+            ('G1', '2025-06-04', 1, 5),
+            ('G1', '2025-06-05', 1, 5),
+            ('D2', '2025-06-04', 3, 4),
+            ('K9', '2025-06-04', 1, 2),
+        ])
+        self.assertEqual(counts, [8, 9, 10, 10])
+
+    def test_availability_calendar(self):
+        """一次扫描得到多个车次多天的余票"""
+        dates = booking_window('2025-06-03', 3)
+        self.assertEqual(dates, ['2025-06-03', '2025-06-04', '2025-06-05'])
+        # 默认预售期与购票校验一致：明天起 30 天
+        default = booking_window()
+        self.assertEqual((default[0], default[-1], len(default)),
+                         ((date.today() + timedelta(days=1)).isoformat(),
+                          (date.today() + timedelta(days=30)).isoformat(), 30))
+        calendar = availability_calendar(self.conn, [('G1', 1, 3), ('D2', 1, 2)], dates, total_seats=10)
+        self.assertEqual(calendar[('G1', 1, 3)], [10, 9, 9])
+        self.assertEqual(calendar[('D2', 1, 2)], [10, 10, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from station_search import CITY_ALIASES, CITY_ALIASES_PATH, StationSearch, load_city_aliases, to_pinyin
+
+
+class TestStationSearch(unittest.TestCase):
+    """车站/城市前缀索引测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.stations_db = os.path.join(self.tmpdir.name, 'stations.db')
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+
+        conn = sqlite3.connect(self.stations_db)
+        conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, city TEXT)")
+        conn.executemany("INSERT INTO stations VALUES (?, ?, ?)", [
+            (1, '北京南', '北京'), (2, '北京西', '北京'), (3, '呼和浩特东', '呼和浩特'), (4, '包头', '包头'),
+        ])
+        conn.commit()
+        conn.close()
+
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("CREATE TABLE train_routes (train_code TEXT, station_id INTEGER)")
+        conn.executemany("INSERT INTO train_routes VALUES (?, ?)", [
+            ('G1', 1), ('G3', 1), ('G5', 1), ('K1', 2), ('K1', 3), ('K1', 4), ('K3', 4),
+        ])
+        conn.commit()
+        conn.close()
+        self.index = StationSearch.build(self.stations_db, self.trains_db)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_pinyin(self):
+        """地名多音字取地名读音"""
+        self.assertEqual(to_pinyin('长沙南'), ('changshanan', 'csn'))
+        self.assertEqual(to_pinyin('重庆'), ('chongqing', 'cq'))
+
+    def test_prefix_keys(self):
+        """汉字、全拼、首字母和别名都能检索，按经停车次数排序"""
+        self.assertEqual(self.index.search('北京'), [
+            ('北京', 'city', '北京'), ('北京南', 'station', '北京'), ('北京西', 'station', '北京'),
+        ])
+        self.assertEqual(self.index.search('bjx'), [('北京西', 'station', '北京')])
+        self.assertEqual(self.index.search('Beijingn'), [('北京南', 'station', '北京')])
+        self.assertEqual(self.index.search('呼市'), [('呼和浩特', 'city', '呼和浩特')])
+        self.assertEqual(self.index.search('b', limit=2), [('北京', 'city', '北京'), ('北京南', 'station', '北京')])
+        self.assertEqual(self.index.search('xyz'), [])
+
+    def test_city_aliases_file(self):
+        """city_aliases.json 读取为 {别名: 标准城市名}，CITY_ALIASES 即默认文件的内容"""
+        self.assertEqual(CITY_ALIASES, load_city_aliases(CITY_ALIASES_PATH))
+        self.assertEqual(CITY_ALIASES['呼市'], '呼和浩特')
+        for alias, city in CITY_ALIASES.items():
+            self.assertIsInstance(alias, str)
+            self.assertIsInstance(city, str)
+            self.assertNotEqual(alias, city)
+        path = os.path.join(self.tmpdir.name, 'aliases.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"包市": "包头"}')
+        self.assertEqual(load_city_aliases(path), {"包市": "包头"})
+
+    def test_save_and_load(self):
+        """序列化后加载结果一致"""
+        path = os.path.join(self.tmpdir.name, 'index.json')
+        self.index.save(path)
+        loaded = StationSearch.load(path)
+        for prefix in ('b', 'bt', '包', 'hh', 'hu'):
+            self.assertEqual(loaded.search(prefix), self.index.search(prefix))
+
+
+if __name__ == '__main__':
+    unittest.main()
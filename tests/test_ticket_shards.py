@@ -0,0 +1,171 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_queue import MAX_SHARDS, TicketWriter, ensure_ticket_tables, generate_orders
+from ticket_shards import ShardedTicketWriter, ShardMap, benchmark_shards, jump_hash, rebalance, shard_key
+
+
+def count_rows(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestTicketShards(unittest.TestCase):
+    """车票分片：路由、跨分片查询与改签、迁移工具"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.orders = generate_orders(40, trains=30, seed=5)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_writer(self, writer, scenario):
+        async def run():
+            await writer.start()
+            try:
+                return await scenario(writer)
+            finally:
+                await writer.stop()
+        return asyncio.run(run())
+
+    def test_jump_hash(self):
+        """分片号稳定；4 个分片扩到 5 个时只有约 1/5 的 key 改变分片"""
+        keys = [shard_key(f"G{i}", '2025-06-04') for i in range(2000)]
+        before = [jump_hash(key, 4) for key in keys]
+        after = [jump_hash(key, 5) for key in keys]
+        self.assertEqual(before, [jump_hash(key, 4) for key in keys])
+        self.assertEqual(set(before), {0, 1, 2, 3})
+        moved = [b for a, b in zip(before, after) if a != b]
+        self.assertTrue(all(shard == 4 for shard in moved))
+        self.assertLess(abs(len(moved) / len(keys) - 0.2), 0.05)
+
+    def test_sharded_booking(self):
+        """按车次/日期写入各分片，车票ID全局唯一，我的车票跨分片归并，跨分片改签和批量改签"""
+        shard_map = ShardMap.create(3, self.tmpdir.name)
+        shards = {shard_map.shard_for(o['train_code'], o['travel_date']) for o in self.orders}
+        self.assertEqual(shards, {0, 1, 2})
+        first, other = self.orders[0], next(o for o in self.orders if shard_map.shard_for(
+            o['train_code'], o['travel_date']) != shard_map.shard_for(self.orders[0]['train_code'],
+                                                                   self.orders[0]['travel_date']))
+
+        async def scenario(writer):
+            booked = await asyncio.gather(*(writer.book_ticket(1, order) for order in self.orders))
+            changed = await writer.change_ticket(1, booked[0][0], other)
+            group = await writer.change_tickets(1, [(booked[3][0], other), (booked[4][0], other)])
+            self.assertEqual(len(group), 2)
+            await writer.refund_ticket(1, booked[1][0])
+            with self.assertRaises(ValueError):
+                await writer.refund_ticket(2, booked[2][0])
+            return booked, changed, await writer.user_tickets(1)
+
+        writer = ShardedTicketWriter(shard_map, total_seats=5)
+        booked, changed, mine = self.run_writer(writer, scenario)
+        ids = [ticket_id for ticket_id, _ in booked]
+        self.assertEqual(len(set(ids)), len(ids))
+        for order, ticket_id in zip(self.orders, ids):
+            self.assertEqual(ticket_id % MAX_SHARDS, shard_map.shard_for(order['train_code'], order['travel_date']))
+
+        self.assertEqual(len(mine), 39)
+        self.assertEqual(mine, sorted(mine, key=lambda t: (t['travelDate'], t['id'])))
+        self.assertIn(changed[0], {t['id'] for t in mine})
+        self.assertNotIn(ids[0], {t['id'] for t in mine})
+        self.assertEqual(sum(count_rows(path, 'tickets') for path in shard_map.paths), 43)
+        self.assertEqual(sum(count_rows(path, 'seat_occupancy') for path in shard_map.paths), 39)
+        key = (first['train_code'], first['travel_date'])
+        self.assertEqual(writer.writer_for(*key).inventory.trains[key].count_free(first['from_no'], first['to_no']),
+                         writer.count_available_many([(*key, first['from_no'], first['to_no'])])[0])
+
+    def test_rebalance(self):
+        """单库拆分为分片、再缩减分片；迁移幂等，迁移后的车票可退，新车票ID不冲突"""
+        ticket_db = os.path.join(self.tmpdir.name, 'ticket.db')
+
+        async def book_all(writer):
+            return await asyncio.gather(*(writer.book_ticket(7, order) for order in self.orders))
+
+        booked = self.run_writer(TicketWriter(ticket_db), book_all)
+
+        three = ShardMap.create(3, self.tmpdir.name)
+        preview = rebalance([ticket_db], three, dry_run=True)
+        self.assertEqual(preview['moved_tickets'], 40)
+        self.assertFalse(os.path.exists(three.paths[0]))
+
+        stats = rebalance([ticket_db], three)
+        self.assertEqual((stats['moved_tickets'], stats['moved_occupancy']), (40, 40))
+        self.assertEqual(count_rows(ticket_db, 'tickets'), 0)
+        self.assertEqual(rebalance([ticket_db] + three.paths, three)['moved_keys'], 0)
+
+        two = ShardMap.create(2, self.tmpdir.name)
+        rebalance(three.paths, two)
+        self.assertEqual(count_rows(three.paths[2], 'tickets'), 0)
+        self.assertEqual(sum(count_rows(path, 'tickets') for path in two.paths), 40)
+
+        async def after_migration(writer):
+            await writer.refund_ticket(7, booked[5][0])
+            new_id, _ = await writer.book_ticket(7, self.orders[0])
+            return new_id, await writer.user_tickets(7)
+
+        new_id, mine = self.run_writer(ShardedTicketWriter(two), after_migration)
+        self.assertNotIn(new_id, [ticket_id for ticket_id, _ in booked])
+        self.assertEqual(len(mine), 40)
+
+    def test_rebalance_id_conflict(self):
+        """目标分片已有同ID的另一张车票时放弃该组：源库车票保留，目标分片的车票不被覆盖"""
+        ticket_db = os.path.join(self.tmpdir.name, 'ticket.db')
+        two = ShardMap.create(2, self.tmpdir.name)
+        rebalance([], two)
+        legacy = ('G1', '2030-01-01')
+        other = next(key for key in (('D%d' % i, '2030-01-01') for i in range(100))
+                     if two.path_for(*key) == two.path_for(*legacy))
+
+        def add_ticket(path, ticket_id, user_id, key):
+            conn = sqlite3.connect(path)
+            ensure_ticket_tables(conn)
+            conn.execute("""
+                INSERT INTO tickets (id, user_id, train_code, from_station, from_station_no, to_station, to_station_no,
+                                     travel_date, seat_number)
+                VALUES (?, ?, ?, 'A', 1, 'B', 2, ?, 1)
+            """, (ticket_id, user_id, key[0], key[1]))
+            conn.execute("""
+                INSERT INTO seat_occupancy (train_code, travel_date, seat_number, start_station_no, end_station_no,
+                                            ticket_id)
+                VALUES (?, ?, 1, 1, 2, ?)
+            """, (key[0], key[1], ticket_id))
+            conn.commit()
+            conn.close()
+
+        add_ticket(two.path_for(*other), 64, 1, other)
+        add_ticket(ticket_db, 64, 7, legacy)
+        add_ticket(ticket_db, 65, 7, ('G2', '2030-01-01'))
+
+        stats = rebalance([ticket_db], two)
+        self.assertEqual(stats['conflict_keys'], [legacy])
+        self.assertEqual(stats['moved_tickets'], 1)
+        conn = sqlite3.connect(ticket_db)
+        self.assertEqual(conn.execute("SELECT id, user_id FROM tickets").fetchall(), [(64, 7)])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM seat_occupancy").fetchone()[0], 1)
+        conn.close()
+        conn = sqlite3.connect(two.path_for(*other))
+        self.assertEqual(conn.execute("SELECT user_id, train_code FROM tickets WHERE id = 64").fetchone(), (1, other[0]))
+        conn.close()
+
+    def test_benchmark_shards(self):
+        """小规模吞吐测试：每种分片数都处理完全部请求"""
+        results = benchmark_shards(requests=100, concurrency=8, shard_counts=(1, 2), synchronous=None,
+                                   workdir=self.tmpdir.name)
+        self.assertEqual(set(results), {1, 2})
+        for r in results.values():
+            self.assertEqual(r['sold'] + r['sold_out'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, read_timetable_version
+from index_advisor import WORKLOAD, advise_database
+from time_columns import departures, normalize_times, parse_duration, trains_by_run_time
+
+
+class TestTimeColumns(unittest.TestCase):
+    """整数时刻列 ETL 测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, station_id INTEGER,
+                station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+                UNIQUE(train_code, station_id)
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO train_routes (train_code, station_id, station_no, arrive_time, depart_time, run_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            # Z1：22:00 发车，次日 06:30 到达
+            ('Z1', 1, 1, None, '22:00', '08:30'),
+            ('Z1', 2, 5, '23:50', '00:05', '08:30'),
+            ('Z1', 3, 9, '06:30', None, '08:30'),
+            ('G2', 1, 1, None, '14:10', '04:18'),
+            ('G2', 3, 2, '18:28', None, '04:18'),
+            # 无时刻、无效运行时长
+            ('K3', 1, 1, None, None, '--'),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_duration(self):
+        """运行时长可超过24小时"""
+        self.assertEqual(parse_duration('34:54'), 34 * 60 + 54)
+        self.assertEqual(parse_duration('0:25'), 25)
+        self.assertIsNone(parse_duration('10:75'))
+        self.assertIsNone(parse_duration('--'))
+
+    def test_day_rollover(self):
+        """跨天的站点记录当天分钟数和天数偏移"""
+        stats = normalize_times(self.trains_db)
+        self.assertEqual((stats['rows'], stats['timed'], stats['run_minutes']), (6, 5, 5))
+        conn = sqlite3.connect(self.trains_db)
+        rows = conn.execute("""
+            SELECT arrive_min, arrive_day, depart_min, depart_day, run_minutes
+            FROM train_routes WHERE train_code = 'Z1' ORDER BY station_no
+        """).fetchall()
+        self.assertEqual(read_timetable_version(conn), 1)
+        conn.close()
+        self.assertEqual(rows, [
+            (1320, 0, 1320, 0, 510),
+            (1430, 0, 5, 1, 510),
+            (390, 1, 390, 1, 510),
+        ])
+
+        # 第二次运行没有变化
+        self.assertEqual(normalize_times(self.trains_db)['updated'], 0)
+
+    def test_indexed_time_window_and_duration(self):
+        """时间窗过滤和时长排序走整数索引"""
+        normalize_times(self.trains_db)
+        conn = connect(self.trains_db, readonly=True)
+        self.assertEqual(departures(conn, [1], after=14 * 60), [('G2', 1, 1, 850, 0), ('Z1', 1, 1, 1320, 0)])
+        self.assertEqual(departures(conn, [1, 2], after=0, before=60), [('Z1', 2, 5, 5, 1)])
+        self.assertEqual(trains_by_run_time(conn), [('G2', 258), ('Z1', 510)])
+        self.assertEqual(trains_by_run_time(conn, max_minutes=300, limit=1), [('G2', 258)])
+        conn.close()
+
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        try:
+            advice = advise_database('trains.db')
+        finally:
+            os.chdir(cwd)
+        self.assertIn('idx_route_depart', advice['keep'])
+        self.assertIn('idx_route_run_minutes', advice['keep'])
+        self.assertIn('departures_window', advice['plans'])
+        self.assertEqual(advice['violations'], [])
+        self.assertIn('depart_min>?', advice['plans']['departures_window'][0])
+        self.assertTrue(all(q['name'] in advice['plans'] for q in WORKLOAD['trains.db']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import query_routes
+from city_resolver import get_resolver
+from timetable_index import TimetableIndex
+
+
+def build_test_databases(directory):
+    """在临时目录中创建小规模的 stations.db / trains.db"""
+    stations_db = os.path.join(directory, 'stations.db')
+    trains_db = os.path.join(directory, 'trains.db')
+
+    conn = sqlite3.connect(stations_db)
+    conn.execute("CREATE TABLE stations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, city TEXT)")
+    conn.executemany("INSERT INTO stations (id, name, city) VALUES (?, ?, ?)", [
+        (1, '北京', '北京'), (2, '北京南', '北京'), (3, '上海', '上海'),
+        (4, '上海虹桥', '上海'), (5, '南京南', '南京'), (6, '天津', '天津'),
+    ])
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(trains_db)
+    conn.execute("""
+        CREATE TABLE train_routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            train_code TEXT NOT NULL,
+            station_id INTEGER,
+            station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+            UNIQUE(train_code, station_id)
+        )
+    """)
+    conn.execute("CREATE INDEX idx_route_search ON train_routes(train_code, station_id, station_no)")
+    conn.executemany("INSERT INTO train_routes (train_code, station_id, station_no, city) VALUES (?, ?, ?, ?)", [
+        ('G1', 2, 1, '北京'), ('G1', 5, 2, '南京'), ('G1', 4, 3, '上海'),
+        ('G2', 4, 1, '上海'), ('G2', 5, 2, '南京'), ('G2', 2, 3, '北京'),
+        ('D5', 1, 1, '北京'), ('D5', 6, 2, '天津'), ('D5', 3, 3, '上海'), ('D5', 2, 4, '北京'),
+        ('1461', 1, 1, '北京'), ('1461', 3, 2, '上海'),
+        ('K9', 6, 1, '天津'),
+    ])
+    conn.commit()
+    conn.close()
+    return trains_db, stations_db
+
+
+class TestTimetableIndex(unittest.TestCase):
+    """内存时刻表索引测试"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.trains_db, cls.stations_db = build_test_databases(cls.tmpdir.name)
+        cls.index = TimetableIndex.load(cls.trains_db, cls.stations_db)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_direct_routes_respect_station_order(self):
+        """只返回上车站序小于下车站序的车次"""
+        routes = self.index.direct_routes(['北京', '北京南'], ['上海', '上海虹桥'])
+        self.assertEqual(routes, [
+            ('1461', '北京', 1, '上海', 2),
+            ('D5', '北京', 1, '上海', 3),
+            ('G1', '北京南', 1, '上海虹桥', 3),
+        ])
+
+    def test_unknown_station_returns_empty(self):
+        """未知站名不报错，返回空结果"""
+        self.assertEqual(self.index.direct_routes(['不存在'], ['上海']), [])
+
+    def test_matches_sql_query(self):
+        """内存索引与原SQL查询结果一致"""
+        for start_city, end_city in [('北京', '上海'), ('上海', '北京'), ('天津', '上海'), ('北京', '天津')]:
+            expected = query_routes.query_direct_routes_sql(
+                start_city, end_city, stations_db=self.stations_db, trains_db=self.trains_db)
+            actual = query_routes.find_direct_routes(start_city, end_city, index=self.index,
+                                                     resolver=get_resolver(self.stations_db))
+            self.assertEqual(sorted(actual), sorted(expected))
+            self.assertEqual([r[0] for r in actual], [r[0] for r in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import traindata
+
+
+class TestCityPairTrains(unittest.TestCase):
+    """城市对车次表构建测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+        self.stations_db = os.path.join(self.tmpdir.name, 'stations.db')
+
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                train_code TEXT NOT NULL,
+                station_id INTEGER,
+                station_no INTEGER, city TEXT, train_full_code TEXT, arrive_time TEXT, depart_time TEXT, run_time TEXT,
+                UNIQUE(train_code, station_id)
+            )
+        """)
+        conn.executemany("INSERT INTO train_routes (train_code, station_id, station_no, city) VALUES (?, ?, ?, ?)", [
+            ('G1', 1, 1, '北京'), ('G1', 2, 2, '南京'), ('G1', 3, 3, '上海'),
+            ('G2', 3, 1, '上海'), ('G2', 1, 2, '北京'),
+            ('D3', 1, 1, '北京'), ('D3', 4, 2, '北京'),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def pairs(self):
+        conn = sqlite3.connect(self.stations_db)
+        try:
+            return conn.execute("SELECT * FROM city_pair_trains ORDER BY from_city, to_city, train_code").fetchall()
+        finally:
+            conn.close()
+
+    def test_build_pairs(self):
+        """按站序生成城市对，同城区间不计"""
+        self.assertTrue(traindata.build_city_pair_trains(self.trains_db, self.stations_db))
+        self.assertEqual(sorted(self.pairs()), sorted([
+            ('北京', '南京', 'G1', 1, 2), ('北京', '上海', 'G1', 1, 3), ('南京', '上海', 'G1', 2, 3),
+            ('上海', '北京', 'G2', 1, 2),
+        ]))
+
+    def test_incremental_rebuild(self):
+        """只重建站点有变化的车次，删除已不存在的车次"""
+        traindata.build_city_pair_trains(self.trains_db, self.stations_db)
+
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("UPDATE train_routes SET city = '天津' WHERE train_code = 'G1' AND station_no = 2")
+        conn.execute("DELETE FROM train_routes WHERE train_code = 'G2'")
+        conn.commit()
+        conn.close()
+
+        traindata.build_city_pair_trains(self.trains_db, self.stations_db)
+        self.assertEqual(sorted(self.pairs()), sorted([
+            ('北京', '天津', 'G1', 1, 2), ('北京', '上海', 'G1', 1, 3), ('天津', '上海', 'G1', 2, 3),
+        ]))
+
+        conn = sqlite3.connect(self.stations_db)
+        state = dict(conn.execute("SELECT train_code, fingerprint FROM city_pair_state").fetchall())
+        conn.close()
+        self.assertEqual(set(state), {'G1', 'D3'})
+
+
+class TestCollectTrainData(unittest.TestCase):
+    """city_trains 流式构建测试"""
+
+    def test_origin_and_terminal_flags(self):
+        """始发/终到取自分组首尾行，同城多次出现时合并标记"""
+        rows = traindata.city_train_rows('C1', [
+            ('C1', 1, '贵阳', 'FULL_C1'), ('C1', 2, '安顺', 'FULL_C1'), ('C1', 3, '贵阳', 'FULL_C1'),
+        ])
+        self.assertEqual(rows, [('贵阳', 'C1', 'FULL_C1', 1, 1), ('安顺', 'C1', 'FULL_C1', 0, 0)])
+
+        # 首行站序不为1时不视为始发
+        rows = traindata.city_train_rows('G9', [('G9', 3, '北京', None), ('G9', 7, '上海', None)])
+        self.assertEqual(rows, [('北京', 'G9', None, 0, 0), ('上海', 'G9', None, 0, 1)])
+
+    def test_collect_into_stations_db(self):
+        """单事务写入 city_trains"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trains_db = os.path.join(tmpdir, 'trains.db')
+            stations_db = os.path.join(tmpdir, 'stations.db')
+            conn = sqlite3.connect(trains_db)
+            conn.execute("CREATE TABLE train_routes (id INTEGER PRIMARY KEY, train_code TEXT, station_no INTEGER, city TEXT, train_full_code TEXT)")
+            conn.executemany("INSERT INTO train_routes (train_code, station_no, city, train_full_code) VALUES (?, ?, ?, ?)", [
+                ('G1', 2, '南京', 'X1'), ('G1', 1, '北京', 'X1'), ('G1', 3, '上海', 'X1'), ('G2', 1, None, 'X2'),
+            ])
+            conn.commit()
+            conn.close()
+
+            self.assertTrue(traindata.collect_train_data(trains_db, stations_db))
+            conn = sqlite3.connect(stations_db)
+            rows = conn.execute("SELECT city, train_code, is_origin, is_terminal FROM city_trains ORDER BY id").fetchall()
+            conn.close()
+            self.assertEqual(rows, [('北京', 'G1', 1, 0), ('南京', 'G1', 0, 0), ('上海', 'G1', 0, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect
+from update_train_times import attach_basic, create_state_table, match_report, stage_run_times, update_train_times
+
+
+class TestIncrementalUpdate(unittest.TestCase):
+    """运行时间增量导入测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.basic_db = os.path.join(self.tmpdir.name, 'train_basic.db')
+        self.trains_db = os.path.join(self.tmpdir.name, 'trains.db')
+
+        conn = sqlite3.connect(self.basic_db)
+        conn.execute("CREATE TABLE G (train_full_code TEXT, run_time TEXT)")
+        conn.executemany("INSERT INTO G VALUES (?, ?)", [
+            ('240000G1010A', '04:18'), ('240000G2020B', '05:00'), ('240000G9990C', '01:00'),
+        ])
+        conn.commit()
+        conn.close()
+
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("""
+            CREATE TABLE train_routes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, train_code TEXT NOT NULL, station_id INTEGER,
+                station_no INTEGER, train_full_code TEXT
+            )
+        """)
+        conn.executemany("INSERT INTO train_routes (train_code, station_no, train_full_code) VALUES (?, ?, ?)", [
+            ('G1', 1, '240000G1010A'), ('G1', 2, '240000G1010A'), ('G2', 1, '240000G2020B'),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_times(self):
+        conn = sqlite3.connect(self.trains_db)
+        try:
+            return conn.execute("SELECT train_code, station_no, run_time FROM train_routes ORDER BY id").fetchall()
+        finally:
+            conn.close()
+
+    def test_only_changed_rows_updated(self):
+        """第二次运行无变化时不更新，源记录变化后只更新该车次"""
+        self.assertEqual(update_train_times(self.basic_db, self.trains_db), 2)
+        self.assertEqual(self.run_times(), [('G1', 1, '04:18'), ('G1', 2, '04:18'), ('G2', 1, '05:00')])
+
+        self.assertEqual(update_train_times(self.basic_db, self.trains_db), 0)
+
+        conn = sqlite3.connect(self.basic_db)
+        conn.execute("UPDATE G SET run_time = '05:30' WHERE train_full_code = '240000G2020B'")
+        conn.commit()
+        conn.close()
+        self.assertEqual(update_train_times(self.basic_db, self.trains_db), 1)
+        self.assertEqual(self.run_times()[2], ('G2', 1, '05:30'))
+
+    def test_full_mode(self):
+        """全量模式忽略已有状态"""
+        update_train_times(self.basic_db, self.trains_db)
+        self.assertEqual(update_train_times(self.basic_db, self.trains_db, full=True), 2)
+
+    def test_shared_full_code_and_letter_report(self):
+        """同一完整车次号的多个车次都更新；按字母表统计匹配率，缺失的表跳过"""
+        conn = sqlite3.connect(self.trains_db)
+        conn.execute("INSERT INTO train_routes (train_code, station_no, train_full_code) VALUES ('G4', 1, '240000G1010A')")
+        conn.execute("INSERT INTO train_routes (train_code, station_no) VALUES ('D301', 1)")
+        conn.commit()
+        conn.close()
+        conn = sqlite3.connect(self.basic_db)
+        conn.execute("CREATE TABLE D (train_full_code TEXT, run_time TEXT)")
+        conn.executemany("INSERT INTO D VALUES (?, ?)", [('5c0000D3010B', '02:00'), ('5c0000D9990B', '--')])
+        conn.commit()
+        conn.close()
+
+        conn = connect(self.trains_db)
+        create_state_table(conn)
+        attach_basic(conn, self.basic_db)
+        self.assertEqual(stage_run_times(conn, ['D', 'G', 'K']), ['D', 'G'])
+        # D301 没有完整车次号，通过解析出的车次代码匹配；'--' 不是有效时间
+        self.assertEqual(match_report(conn), [('D', 2, 1, 1), ('G', 3, 2, 2)])
+        conn.close()
+
+        self.assertEqual(update_train_times(self.basic_db, self.trains_db), 3)
+        times = {code: run_time for code, _, run_time in self.run_times()}
+        self.assertEqual(times, {'G1': '04:18', 'G2': '05:00', 'G4': '04:18', 'D301': '02:00'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,378 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from booking_queue import (DEFAULT_MAX_BATCH, MAX_SHARDS, TicketWriter, ensure_shard_meta, ensure_ticket_tables,
+                           generate_orders)
+from database import connect
+from seat_inventory import DEFAULT_TOTAL_SEATS, SeatInventory
+
+# 分片配置默认保存位置
+SHARD_MAP_PATH = 'shards.json'
+
+# 车票表与占用表的全部列（迁移时按列名复制，ID 保持不变）
+TICKET_COLUMNS = ('id', 'user_id', 'train_code', 'train_full_code', 'from_station', 'from_station_no',
+                  'to_station', 'to_station_no', 'travel_date', 'seat_number', 'status', 'changed_from',
+                  'created_at', 'updated_at')
+OCCUPANCY_COLUMNS = ('train_code', 'travel_date', 'seat_number', 'start_station_no', 'end_station_no',
+                     'ticket_id', 'created_at')
+
+
+def jump_hash(key, buckets):
+    """
+    Jump 一致性哈希：64 位整数 key -> [0, buckets) 的分片号
+    分片数从 n 增加到 n+1 时只有约 1/(n+1) 的 key 改变分片，扩容时迁移量最小
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_key(train_code, travel_date):
+    """(车次, 日期) -> 64 位哈希值（与进程无关，重启后分片结果不变）"""
+    digest = hashlib.blake2b(f"{train_code}|{travel_date}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class ShardMap:
+    """分片表：按 (车次, 日期) 的一致性哈希把座位库存和车票路由到 N 个 ticket 分片库之一"""
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        if not 0 < len(self.paths) <= MAX_SHARDS:
+            raise ValueError(f"分片数必须在 1 到 {MAX_SHARDS} 之间")
+
+    @classmethod
+    def create(cls, count, directory='.', prefix='ticket_shard'):
+        """在 directory 下按 ticket_shard0.db、ticket_shard1.db ... 命名 count 个分片"""
+        return cls([os.path.join(directory, f"{prefix}{i}.db") for i in range(count)])
+
+    @classmethod
+    def load(cls, path=SHARD_MAP_PATH):
+        """从 JSON 文件读取分片表：{"shards": ["ticket_shard0.db", ...]}"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f)["shards"])
+
+    def save(self, path=SHARD_MAP_PATH):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"shards": self.paths}, f, ensure_ascii=False, indent=2)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def shard_for(self, train_code, travel_date):
+        """(车次, 日期) 所在的分片号"""
+        return jump_hash(shard_key(train_code, travel_date), len(self.paths))
+
+    def path_for(self, train_code, travel_date):
+        return self.paths[self.shard_for(train_code, travel_date)]
+
+
+class ShardedTicketWriter:
+    """
+    分片购票：每个分片库一个 TicketWriter（各自的写线程、连接和批量提交），互不争锁
+    接口与 TicketWriter 相同，api_service.py 可直接替换使用
+    分片用于按 (车次, 日期) 分散数据和文件锁，不是提速手段：全部写者在同一进程内共用 GIL，
+    单写者的批量提交已消除锁争用，分片越多批次越小，吞吐反而下降（见 benchmark_shards）
+    """
+
+    def __init__(self, shard_map, strategy='first_fit', total_seats=DEFAULT_TOTAL_SEATS,
+                 max_batch=DEFAULT_MAX_BATCH):
+        self.shard_map = shard_map
+        self.writers = [
+            TicketWriter(path, SeatInventory(total_seats), strategy, max_batch, shard_index=i)
+            for i, path in enumerate(shard_map.paths)
+        ]
+
+    async def start(self):
+        await asyncio.gather(*(writer.start() for writer in self.writers))
+
+    async def stop(self):
+        await asyncio.gather(*(writer.stop() for writer in self.writers))
+
+    def writer_for(self, train_code, travel_date):
+        return self.writers[self.shard_map.shard_for(train_code, travel_date)]
+
+    async def ensure_date(self, travel_date):
+        await asyncio.gather(*(writer.ensure_date(travel_date) for writer in self.writers))
+
+    def count_available_many(self, queries):
+        """按 (车次, 日期) 路由到各分片的内存占用矩阵"""
+        return [
+            self.writer_for(train_code, travel_date).count_available_many(
+                [(train_code, travel_date, start_no, end_no)])[0]
+            for train_code, travel_date, start_no, end_no in queries
+        ]
+
+    async def locate(self, user_id, ticket_id):
+        """
+        车票所在的写者：先查车票ID编码的原分片，找不到（已被 rebalance 迁走）再查其余分片
+        车票不存在或不属于该用户时返回 None
+        """
+        try:
+            ticket_id = int(ticket_id)
+        except (TypeError, ValueError):
+            return None
+        origin = ticket_id % MAX_SHARDS
+        if origin < len(self.writers) and await self.writers[origin].has_ticket(user_id, ticket_id):
+            return self.writers[origin]
+        others = [writer for i, writer in enumerate(self.writers) if i != origin]
+        found = await asyncio.gather(*(writer.has_ticket(user_id, ticket_id) for writer in others))
+        return next((writer for writer, hit in zip(others, found) if hit), None)
+
+    async def book_ticket(self, user_id, order, changed_from=None):
+        return await self.writer_for(order['train_code'], order['travel_date']).book_ticket(
+            user_id, order, changed_from)
+
+    async def refund_ticket(self, user_id, ticket_id):
+        writer = await self.locate(user_id, ticket_id)
+        if writer is None:
+            raise ValueError("未找到有效车票或无权退票")
+        await writer.refund_ticket(user_id, int(ticket_id))
+
+    async def change_ticket(self, user_id, ticket_id, order):
+        """
+        改签：新旧车次在同一分片时与 TicketWriter 相同，在一个事务中完成
+        跨分片时先在新分片出票，再在原分片注销旧票；旧票已失效（并发退票）时退掉新票作为补偿
+        """
+        source = await self.locate(user_id, ticket_id)
+        if source is None:
+            raise ValueError("未找到有效车票或无权改签")
+        ticket_id = int(ticket_id)
+        target = self.writer_for(order['train_code'], order['travel_date'])
+        if source is target:
+            return await target.change_ticket(user_id, ticket_id, order)
+        new_id, seat = await target.book_ticket(user_id, order, changed_from=ticket_id)
+        if not await source.cancel_ticket(user_id, ticket_id, 'changed'):
+            await target.cancel_ticket(user_id, new_id)
+            raise ValueError("未找到有效车票或无权改签")
+        return new_id, seat
+
+    async def change_tickets(self, user_id, changes):
+        """
+        批量改签：所有原车票和新车次都在同一分片时交给该分片的写者，在一个事务中全部完成或全部不变
+        涉及多个分片时逐张改签，不保证原子性：出错时之前已改签的车票保持改签后的状态
+        """
+        sources = await asyncio.gather(*(self.locate(user_id, ticket_id) for ticket_id, _ in changes))
+        if None in sources:
+            raise ValueError("未找到有效车票或无权改签")
+        writers = set(sources) | {self.writer_for(order['train_code'], order['travel_date']) for _, order in changes}
+        if len(writers) == 1:
+            return await writers.pop().change_tickets(
+                user_id, [(int(ticket_id), order) for ticket_id, order in changes])
+        return [await self.change_ticket(user_id, ticket_id, order) for ticket_id, order in changes]
+
+    async def user_tickets(self, user_id):
+        """向所有分片查询后按乘车日期归并"""
+        parts = await asyncio.gather(*(writer.user_tickets(user_id) for writer in self.writers))
+        return list(heapq.merge(*parts, key=lambda t: (t['travelDate'], t['id'])))
+
+    def stats(self):
+        return [writer.stats() for writer in self.writers]
+
+
+def _columns(conn, table, wanted):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    return [name for name in wanted if name in existing]
+
+
+def rebalance(source_paths, shard_map, dry_run=False):
+    """
+    离线迁移工具：把 source_paths 各库中的车票和座位占用按 shard_map 移到所属分片（服务需停止）
+    可用于把单库 ticket.db 拆分为分片，或在分片数变化后迁移；按 (车次, 日期) 逐组处理：
+    先把目标分片中还没有的行复制过去并提交，再在源库删除并提交，中途中断后重新运行即可继续（幂等）
+    目标分片中已有同ID的另一张车票（或同一座位区间被另一张票占用）时放弃这一组，源库保持不变，记入 conflict_keys
+    车票ID保持不变；最后把各分片的序号推进到已有ID之后
+    返回 {"moved_keys", "moved_tickets", "moved_occupancy", "conflict_keys"}
+    """
+    stats = {"moved_keys": 0, "moved_tickets": 0, "moved_occupancy": 0, "conflict_keys": []}
+    targets = {os.path.abspath(path): i for i, path in enumerate(shard_map.paths)}
+    if not dry_run:
+        for i, path in enumerate(shard_map.paths):
+            conn = connect(path, profile='etl')
+            try:
+                ensure_ticket_tables(conn)
+                ensure_shard_meta(conn, i)
+                conn.commit()
+            finally:
+                conn.close()
+
+    for source in source_paths:
+        if not os.path.exists(source):
+            continue
+        conn = connect(source, profile='etl', readonly=dry_run)
+        try:
+            keys = conn.execute("""
+                SELECT train_code, travel_date FROM tickets
+                UNION
+                SELECT train_code, travel_date FROM seat_occupancy
+            """).fetchall()
+            for train_code, travel_date in keys:
+                target = shard_map.path_for(train_code, travel_date)
+                if os.path.abspath(target) == os.path.abspath(source):
+                    continue
+                key = (train_code, travel_date)
+                tickets = conn.execute(
+                    "SELECT COUNT(*) FROM tickets WHERE train_code = ? AND travel_date = ?", key).fetchone()[0]
+                occupancy = conn.execute(
+                    "SELECT COUNT(*) FROM seat_occupancy WHERE train_code = ? AND travel_date = ?", key).fetchone()[0]
+                if not dry_run and not _move_key(conn, target, key):
+                    stats["conflict_keys"].append(key)
+                    continue
+                stats["moved_keys"] += 1
+                stats["moved_tickets"] += tickets
+                stats["moved_occupancy"] += occupancy
+        finally:
+            conn.close()
+
+    if not dry_run:
+        _advance_sequences(shard_map)
+    return stats
+
+
+def _move_key(conn, target, key):
+    """
+    把一组 (车次, 日期) 的车票和占用从 conn 所在库复制到 target 后删除，返回是否迁移
+    只复制目标中还没有的完全相同的行（上次中断时已复制的跳过），其余行普通 INSERT：
+    与目标中不同的车票同ID、或与别的车票占用同一座位区间时插入失败，整组回滚且不删除源库
+    """
+    ticket_columns = ', '.join(_columns(conn, 'tickets', TICKET_COLUMNS))
+    occupancy_columns = ', '.join(_columns(conn, 'seat_occupancy', OCCUPANCY_COLUMNS))
+    conn.execute("ATTACH DATABASE ? AS shard", (target,))
+    try:
+        conn.execute(f"""
+            INSERT INTO shard.tickets ({ticket_columns})
+            SELECT {ticket_columns} FROM main.tickets WHERE train_code = ?1 AND travel_date = ?2
+            EXCEPT
+            SELECT {ticket_columns} FROM shard.tickets WHERE train_code = ?1 AND travel_date = ?2
+        """, key)
+        conn.execute(f"""
+            INSERT INTO shard.seat_occupancy ({occupancy_columns})
+            SELECT {occupancy_columns} FROM main.seat_occupancy WHERE train_code = ?1 AND travel_date = ?2
+            EXCEPT
+            SELECT {occupancy_columns} FROM shard.seat_occupancy WHERE train_code = ?1 AND travel_date = ?2
+        """, key)
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        print(f"{key[0]} {key[1]} 与目标分片 {target} 中的数据冲突，未迁移: {e}")
+        return False
+    finally:
+        conn.execute("DETACH DATABASE shard")
+    conn.execute("DELETE FROM seat_occupancy WHERE train_code = ? AND travel_date = ?", key)
+    conn.execute("DELETE FROM tickets WHERE train_code = ? AND travel_date = ?", key)
+    conn.commit()
+    return True
+
+
+def _advance_sequences(shard_map):
+    """
+    各分片的车票序号推进到所有分片中同余ID的最大序号之后
+    迁入的旧车票（包括单库 ticket.db 的自增ID）不会与之后新分配的ID重复
+    """
+    highest = {}
+    for path in shard_map.paths:
+        conn = connect(path, profile='etl')
+        try:
+            for residue, seq in conn.execute(f"""
+                SELECT id % {MAX_SHARDS}, MAX(id / {MAX_SHARDS}) FROM tickets GROUP BY id % {MAX_SHARDS}
+            """):
+                highest[residue] = max(highest.get(residue, 0), seq)
+        finally:
+            conn.close()
+    for i, path in enumerate(shard_map.paths):
+        conn = connect(path, profile='etl')
+        try:
+            conn.execute("UPDATE shard_meta SET value = MAX(value, ?) WHERE key = 'ticket_seq'",
+                         (highest.get(i, 0),))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+async def _load_test(shard_map, orders, concurrency, max_batch, synchronous):
+    writer = ShardedTicketWriter(shard_map, max_batch=max_batch)
+    await writer.start()
+    if synchronous:
+        for shard in writer.writers:
+            await asyncio.get_running_loop().run_in_executor(
+                shard.executor, shard._connection().execute, f"PRAGMA synchronous = {synchronous}")
+    results = {"sold": 0, "sold_out": 0}
+    pending = iter(enumerate(orders))
+
+    async def client():
+        for user_id, order in pending:
+            try:
+                await writer.book_ticket(user_id, order)
+                results["sold"] += 1
+            except ValueError:
+                results["sold_out"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    results["seconds"] = time.perf_counter() - start
+    await writer.stop()
+    results["throughput"] = len(orders) / results["seconds"]
+    results["batches"] = sum(s["batches"] for s in writer.stats())
+    return results
+
+
+def benchmark_shards(requests=4000, concurrency=64, shard_counts=(1, 2, 4, 8), max_batch=DEFAULT_MAX_BATCH,
+                     synchronous='FULL', seed=1, workdir=None):
+    """
+    同一组购票请求在不同分片数下的吞吐（请求/秒），每次使用全新的分片库
+    synchronous 默认 FULL：每次提交都落盘，分片之间的 fsync 可以并行
+    单进程内的分片共用 GIL，吞吐不随分片数提高（本机 1/2/4/8 个分片约 13.7k/10.0k/7.1k/5.8k 请求/秒），
+    用于确认分片带来的开销，而不是证明扩展性
+    """
+    orders = generate_orders(requests, trains=200, seed=seed)
+    results = {}
+    for count in shard_counts:
+        with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+            shard_map = ShardMap.create(count, tmpdir)
+            results[count] = asyncio.run(_load_test(shard_map, orders, concurrency, max_batch, synchronous))
+    return results
+
+
+if __name__ == '__main__':
+    # 用法:
+    #   python ticket_shards.py init N            生成 N 个分片的 shards.json
+    #   python ticket_shards.py rebalance [--dry-run] [源库 ...]   按 shards.json 迁移（默认源为 ticket.db 和全部分片）
+    #   python ticket_shards.py bench [请求数]     不同分片数下的购票吞吐
+    command = sys.argv[1] if len(sys.argv) > 1 else 'bench'
+    args = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+    if command == 'init':
+        shard_map = ShardMap.create(int(args[0]) if args else 4)
+        shard_map.save()
+        print(f"已写入 {SHARD_MAP_PATH}: {', '.join(shard_map.paths)}")
+    elif command == 'rebalance':
+        shard_map = ShardMap.load()
+        sources = args or ['ticket.db'] + shard_map.paths
+        try:
+            stats = rebalance(sources, shard_map, dry_run='--dry-run' in sys.argv)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            sys.exit(1)
+        prefix = "[试运行] 需要" if '--dry-run' in sys.argv else "已"
+        print(f"{prefix}迁移 {stats['moved_keys']} 组车次/日期，"
+              f"车票 {stats['moved_tickets']} 张，座位占用 {stats['moved_occupancy']} 条")
+        if stats['conflict_keys']:
+            print(f"{len(stats['conflict_keys'])} 组与目标分片冲突，未迁移，需人工处理")
+            sys.exit(1)
+    else:
+        count = int(args[0]) if args else 4000
+        print(f"分片购票吞吐: {count} 个请求，并发 64，synchronous=FULL（单进程，分片共用 GIL，吞吐不随分片数提高）")
+        print("分片数 | 耗时(秒) | 吞吐(请求/秒) | 成功 | 无票 | 批次数")
+        print("-" * 60)
+        for shards, r in benchmark_shards(count).items():
+            print(f"{shards:<6} | {r['seconds']:<8.3f} | {r['throughput']:<13.0f} | {r['sold']:<4} |"
+                  f" {r['sold_out']:<4} | {r['batches']}")
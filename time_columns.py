@@ -0,0 +1,169 @@
+import sqlite3
+import sys
+from itertools import groupby
+
+from database import bump_timetable_version, connect
+from journey_planner import MINUTES_PER_DAY, stop_times
+
+# train_routes 上的整数时刻列：站点时刻为当天分钟数 + 相对始发日的天数，运行时长为总分钟数
+MINUTE_COLUMNS = {
+    'arrive_min': 'INTEGER',
+    'arrive_day': 'INTEGER',
+    'depart_min': 'INTEGER',
+    'depart_day': 'INTEGER',
+    'run_minutes': 'INTEGER',
+}
+
+# 车次类型即车次代码首字母，与 train_basic.db 中按字母分的表一致（导入脚本和查询共用）
+TRAIN_LETTERS = ('C', 'D', 'G', 'K', 'P', 'S', 'T', 'Y', 'Z')
+
+MINUTE_INDEXES = [
+    # 某站在时间窗内出发的车次
+    "CREATE INDEX IF NOT EXISTS idx_route_depart ON train_routes(station_id, depart_min)",
+    # 按全程运行时长排序
+    "CREATE INDEX IF NOT EXISTS idx_route_run_minutes ON train_routes(run_minutes, train_code)",
+]
+
+
+def parse_duration(text):
+    """运行时长 'H:MM'（小时可超过24，如 '34:54'）-> 分钟数，无效时返回 None"""
+    if not text or ':' not in text:
+        return None
+    hours, _, minutes = text.partition(':')
+    try:
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if hours < 0 or not (0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def add_minute_columns(conn):
+    """为 train_routes 添加缺少的整数时刻列，返回新增的列名"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(train_routes)")}
+    added = []
+    for name, column_type in MINUTE_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE train_routes ADD COLUMN {name} {column_type}")
+            added.append(name)
+    return added
+
+
+def train_minutes(rows):
+    """
+    一个车次按站序排列的 (id, station_no, arrive_time, depart_time, run_time)
+    -> [(id, arrive_min, arrive_day, depart_min, depart_day, run_minutes), ...]
+    跨天规则与 journey_planner.stop_times 相同；无时刻的站点时刻列为 NULL
+    """
+    timed = {row_id: (arrive, depart) for row_id, _, arrive, depart in stop_times([row[:4] for row in rows])}
+    result = []
+    for row_id, _, _, _, run_time in rows:
+        values = [None, None, None, None]
+        if row_id in timed:
+            arrive, depart = timed[row_id]
+            values[1], values[0] = divmod(arrive, MINUTES_PER_DAY)
+            values[3], values[2] = divmod(depart, MINUTES_PER_DAY)
+        result.append((row_id, *values, parse_duration(run_time)))
+    return result
+
+
+def normalize_times(trains_db='trains.db'):
+    """
+    ETL：由 arrive_time/depart_time/run_time 文本计算整数分钟列并建索引
+    计算结果先写入临时表，再一次 UPDATE ... FROM 只改写有变化的行
+    返回 {"rows", "timed", "run_minutes", "updated"}
+    """
+    conn = connect(trains_db, profile='etl')
+    try:
+        added = add_minute_columns(conn)
+        if added:
+            print(f"已添加列: {', '.join(added)}")
+
+        conn.execute("DROP TABLE IF EXISTS temp.route_minutes")
+        conn.execute("""
+            CREATE TEMP TABLE route_minutes (
+                id INTEGER PRIMARY KEY,
+                arrive_min INTEGER, arrive_day INTEGER,
+                depart_min INTEGER, depart_day INTEGER,
+                run_minutes INTEGER
+            )
+        """)
+        cursor = conn.execute("""
+            SELECT train_code, id, station_no, arrive_time, depart_time, run_time
+            FROM train_routes
+            ORDER BY train_code, station_no
+        """)
+        batch = []
+        for _, rows in groupby(cursor, key=lambda row: row[0]):
+            batch.extend(train_minutes([row[1:] for row in rows]))
+        conn.executemany("INSERT INTO temp.route_minutes VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+        changed = ' OR '.join(f"train_routes.{name} IS NOT m.{name}" for name in MINUTE_COLUMNS)
+        updated = conn.execute(f"""
+            UPDATE train_routes
+            SET {', '.join(f"{name} = m.{name}" for name in MINUTE_COLUMNS)}
+            FROM temp.route_minutes AS m
+            WHERE train_routes.id = m.id AND ({changed})
+        """).rowcount
+
+        for sql in MINUTE_INDEXES:
+            conn.execute(sql)
+        if updated:
+            bump_timetable_version(conn)
+        conn.commit()
+
+        rows, timed, with_run = conn.execute("""
+            SELECT COUNT(*), COUNT(depart_min), COUNT(run_minutes) FROM train_routes
+        """).fetchone()
+        conn.execute("DROP TABLE IF EXISTS temp.route_minutes")
+        return {"rows": rows, "timed": timed, "run_minutes": with_run, "updated": updated}
+    finally:
+        conn.close()
+
+
+def departures(conn, station_ids, after=None, before=None, limit=None):
+    """
+    在 station_ids 出发、出发时刻（当天分钟数）落在 [after, before] 内的车次，按出发时刻排序
+    走 (station_id, depart_min) 索引；返回 [(车次, 车站ID, 站序, depart_min, depart_day), ...]
+    """
+    station_ids = list(station_ids)
+    if not station_ids:
+        return []
+    sql = f"""
+        SELECT train_code, station_id, station_no, depart_min, depart_day
+        FROM train_routes
+        WHERE station_id IN ({','.join('?' * len(station_ids))})
+        AND depart_min BETWEEN ? AND ?
+        ORDER BY depart_min, train_code
+    """
+    params = station_ids + [0 if after is None else after, MINUTES_PER_DAY - 1 if before is None else before]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def trains_by_run_time(conn, max_minutes=None, limit=None):
+    """按全程运行时长升序列出车次，走 (run_minutes, train_code) 覆盖索引"""
+    sql = """
+        SELECT DISTINCT run_minutes, train_code
+        FROM train_routes
+        WHERE run_minutes <= ?
+        ORDER BY run_minutes, train_code
+    """
+    params = [sys.maxsize if max_minutes is None else max_minutes]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [(code, minutes) for minutes, code in conn.execute(sql, params)]
+
+
+if __name__ == '__main__':
+    try:
+        stats = normalize_times(sys.argv[1] if len(sys.argv) > 1 else 'trains.db')
+    except sqlite3.Error as e:
+        print(f"数据库错误: {e}")
+        sys.exit(1)
+    print(f"共 {stats['rows']} 条记录，本次更新 {stats['updated']} 条")
+    print(f"有到发时刻的记录: {stats['timed']}，有运行时长的记录: {stats['run_minutes']}")
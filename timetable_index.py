@@ -0,0 +1,145 @@
+import time
+from array import array
+from bisect import bisect_left
+
+from database import connect
+
+
+def _intersect(a, b):
+    """
+    求两个按车次ID升序的倒排表的交集
+    倒排表为 (车次ID数组, 车站ID数组, 站序数组)，同一车次可能连续出现多次（同城多站）
+    返回 (车次ID, 上车站ID, 上车站序, 下车站ID, 下车站序) 列表，只保留上车站序 < 下车站序
+    """
+    a_ids, a_sids, a_nos = a
+    b_ids, b_sids, b_nos = b
+    result = []
+    i = j = 0
+    len_a, len_b = len(a_ids), len(b_ids)
+    while i < len_a and j < len_b:
+        x, y = a_ids[i], b_ids[j]
+        if x < y:
+            # 跳到a中第一个 >= y 的位置
+            i = bisect_left(a_ids, y, i + 1)
+        elif x > y:
+            j = bisect_left(b_ids, x, j + 1)
+        else:
+            i_end = i + 1
+            while i_end < len_a and a_ids[i_end] == x:
+                i_end += 1
+            j_end = j + 1
+            while j_end < len_b and b_ids[j_end] == x:
+                j_end += 1
+            for p in range(i, i_end):
+                for q in range(j, j_end):
+                    if a_nos[p] < b_nos[q]:
+                        result.append((x, a_sids[p], a_nos[p], b_sids[q], b_nos[q]))
+            i, j = i_end, j_end
+    return result
+
+
+class TimetableIndex:
+    """内存时刻表索引：按车站保存 (车次ID, 站序) 的紧凑数组，用于直达线路查询"""
+
+    def __init__(self):
+        self.train_codes = []       # 车次ID -> 车次代码，ID按车次代码排序分配
+        self.station_names = {}     # 车站ID -> 站名
+        self.station_ids = {}       # 站名 -> 车站ID
+        self.station_trains = {}    # 车站ID -> array('i')，经停车次ID（升序）
+        self.station_nos = {}       # 车站ID -> array('i')，与上面一一对应的站序
+        self._postings = {}         # 车站ID组合 -> 合并后的倒排表缓存
+        self.load_seconds = 0.0
+
+    @classmethod
+    def load(cls, trains_db='trains.db', stations_db='stations.db'):
+        """从 trains.db 和 stations.db 一次性加载索引"""
+        index = cls()
+        start = time.perf_counter()
+
+        conn_stations = connect(stations_db, profile='query', readonly=True)
+        try:
+            for station_id, name in conn_stations.execute("SELECT id, name FROM stations"):
+                index.station_names[station_id] = name
+                index.station_ids[name] = station_id
+        finally:
+            conn_stations.close()
+
+        conn_trains = connect(trains_db, profile='query', readonly=True)
+        try:
+            cursor = conn_trains.cursor()
+            # 车次代码排序后分配ID，保证按ID排序即按车次代码排序（与SQL的 ORDER BY 一致）
+            cursor.execute("SELECT DISTINCT train_code FROM train_routes ORDER BY train_code")
+            index.train_codes = [row[0] for row in cursor.fetchall()]
+            train_ids = {code: i for i, code in enumerate(index.train_codes)}
+
+            # UNIQUE(train_code, station_id) 保证同一车站上每个车次只出现一次
+            cursor.execute("""
+                SELECT station_id, train_code, station_no
+                FROM train_routes
+                WHERE station_id IS NOT NULL AND station_no IS NOT NULL
+                ORDER BY station_id, train_code
+            """)
+            for station_id, train_code, station_no in cursor:
+                ids = index.station_trains.get(station_id)
+                if ids is None:
+                    ids = index.station_trains[station_id] = array('i')
+                    index.station_nos[station_id] = array('i')
+                ids.append(train_ids[train_code])
+                index.station_nos[station_id].append(station_no)
+        finally:
+            conn_trains.close()
+
+        index.load_seconds = time.perf_counter() - start
+        return index
+
+    def resolve_stations(self, station_names):
+        """站名列表 -> 车站ID列表，忽略不存在的站名"""
+        return [self.station_ids[name] for name in station_names if name in self.station_ids]
+
+    def postings(self, station_ids):
+        """合并多个车站的倒排表（同城多站），按车次ID排序后缓存"""
+        key = tuple(sorted(set(station_ids)))
+        merged = self._postings.get(key)
+        if merged is None:
+            rows = []
+            for station_id in key:
+                ids = self.station_trains.get(station_id)
+                if ids is not None:
+                    nos = self.station_nos[station_id]
+                    rows.extend((ids[k], station_id, nos[k]) for k in range(len(ids)))
+            rows.sort()
+            merged = (
+                array('i', [row[0] for row in rows]),
+                array('i', [row[1] for row in rows]),
+                array('i', [row[2] for row in rows]),
+            )
+            self._postings[key] = merged
+        return merged
+
+    def direct_routes(self, start_stations, end_stations):
+        """
+        查询两组车站之间的直达线路
+        返回 [(车次, 上车站, 上车站序, 下车站, 下车站序), ...]，按车次代码排序
+        """
+        start_ids = self.resolve_stations(start_stations)
+        end_ids = self.resolve_stations(end_stations)
+        if not start_ids or not end_ids:
+            return []
+
+        codes = self.train_codes
+        names = self.station_names
+        return [
+            (codes[tid], names[start_id], start_no, names[end_id], end_no)
+            for tid, start_id, start_no, end_id, end_no
+            in _intersect(self.postings(start_ids), self.postings(end_ids))
+        ]
+
+    def stats(self):
+        """返回索引规模信息"""
+        entries = sum(len(ids) for ids in self.station_trains.values())
+        return {
+            "trains": len(self.train_codes),
+            "stations": len(self.station_trains),
+            "entries": entries,
+            "load_seconds": self.load_seconds,
+        }
@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
-import sqlite3
+import hashlib
 import os
 import sys
+import time
+from itertools import groupby
+
+from database import bump_timetable_version, connect
 
 def create_city_trains_table(conn):
     """创建城市车次表"""
@@ -24,98 +28,202 @@ def create_city_trains_table(conn):
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_city_trains_train ON city_trains(train_code)')
     conn.commit()
 
-def collect_train_data():
-    """从trains.db收集数据并存储到stations.db"""
+def create_city_pair_tables(conn):
+    """创建城市对车次表及增量构建状态表"""
+    cursor = conn.cursor()
+    # WITHOUT ROWID 表按主键聚簇存储，主键本身就是覆盖全部列的索引，
+    # 按 (from_city, to_city) 查询只需一次索引范围扫描
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS city_pair_trains (
+        from_city TEXT NOT NULL,
+        to_city TEXT NOT NULL,
+        train_code TEXT NOT NULL,
+        from_no INTEGER NOT NULL,
+        to_no INTEGER NOT NULL,
+        PRIMARY KEY (from_city, to_city, train_code, from_no, to_no)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_city_pair_train ON city_pair_trains(train_code)')
+
+    # 记录每个车次上次构建时的站点指纹，用于只重建有变化的车次
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS city_pair_state (
+        train_code TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+def iter_train_stops(cursor):
+    """
+    按车次分组读取已按 (train_code, station_no) 排序的结果集，逐个车次产出 (车次, 站点行列表)
+    每行的前三列须为 train_code, station_no, city
+    """
+    for train_code, rows in groupby(cursor, key=lambda row: row[0]):
+        yield train_code, list(rows)
+
+def train_fingerprint(stops):
+    """车次站点序列的指纹（站序+城市）"""
+    text = '|'.join(f"{row[1]}:{row[2]}" for row in stops)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def city_pairs(train_code, stops):
+    """生成一个车次的所有 (出发城市, 到达城市, 车次, 出发站序, 到达站序)，同城区间不计"""
+    stops = [(row[1], row[2]) for row in stops if row[2] and row[1] is not None]
+    pairs = []
+    for i, (from_no, from_city) in enumerate(stops):
+        for to_no, to_city in stops[i + 1:]:
+            if from_city != to_city and from_no < to_no:
+                pairs.append((from_city, to_city, train_code, from_no, to_no))
+    return pairs
+
+def build_city_pair_trains(trains_db='trains.db', stations_db='stations.db', full=False):
+    """构建 stations.db 中的 city_pair_trains 表，默认只重建站点有变化的车次"""
+    trains_conn = None
+    stations_conn = None
+    try:
+        if not os.path.exists(trains_db):
+            print(f"错误: {trains_db} 文件不存在")
+            return False
+
+        trains_conn = connect(trains_db, profile='query', readonly=True)
+        stations_conn = connect(stations_db, profile='etl')
+        create_city_pair_tables(stations_conn)
+        stations_cursor = stations_conn.cursor()
+
+        if full:
+            print("全量重建city_pair_trains表...")
+            stations_cursor.execute("DELETE FROM city_pair_trains")
+            stations_cursor.execute("DELETE FROM city_pair_state")
+
+        stations_cursor.execute("SELECT train_code, fingerprint FROM city_pair_state")
+        previous = dict(stations_cursor.fetchall())
+
+        trains_cursor = trains_conn.execute('''
+        SELECT train_code, station_no, city
+        FROM train_routes
+        ORDER BY train_code, station_no
+        ''')
+
+        seen = set()
+        changed = 0
+        inserted = 0
+        for train_code, stops in iter_train_stops(trains_cursor):
+            seen.add(train_code)
+            fingerprint = train_fingerprint(stops)
+            if previous.get(train_code) == fingerprint:
+                continue
+
+            changed += 1
+            stations_cursor.execute("DELETE FROM city_pair_trains WHERE train_code = ?", (train_code,))
+            pairs = city_pairs(train_code, stops)
+            stations_cursor.executemany(
+                "INSERT OR IGNORE INTO city_pair_trains (from_city, to_city, train_code, from_no, to_no) VALUES (?, ?, ?, ?, ?)",
+                pairs
+            )
+            inserted += len(pairs)
+            stations_cursor.execute(
+                "INSERT OR REPLACE INTO city_pair_state (train_code, fingerprint) VALUES (?, ?)",
+                (train_code, fingerprint)
+            )
+
+        # 已从 train_routes 中删除的车次
+        removed = [code for code in previous if code not in seen]
+        for train_code in removed:
+            stations_cursor.execute("DELETE FROM city_pair_trains WHERE train_code = ?", (train_code,))
+            stations_cursor.execute("DELETE FROM city_pair_state WHERE train_code = ?", (train_code,))
+
+        if changed or removed:
+            bump_timetable_version(stations_conn)
+        stations_conn.commit()
+
+        stations_cursor.execute("SELECT COUNT(*) FROM city_pair_trains")
+        total = stations_cursor.fetchone()[0]
+        print(f"城市对构建完成: 共 {len(seen)} 个车次，重建 {changed} 个，删除 {len(removed)} 个，"
+              f"写入 {inserted} 条，city_pair_trains表中共有 {total} 条记录")
+        return True
+
+    except Exception as e:
+        print(f"错误: {e}")
+        if stations_conn is not None:
+            stations_conn.rollback()
+        return False
+
+    finally:
+        if trains_conn is not None:
+            trains_conn.close()
+        if stations_conn is not None:
+            stations_conn.close()
+
+def city_train_rows(train_code, stops):
+    """
+    把一个车次的站点行合并为 city_trains 记录
+    始发/终到由分组内第一行和最后一行决定（第一行站序须为1），同一城市出现多次时合并标记
+    """
+    cities = {}
+    for _, _, city, train_full_code in stops:
+        # 跳过空的城市名
+        if city and city not in cities:
+            cities[city] = [train_full_code, 0, 0]
+    first, last = stops[0], stops[-1]
+    if first[2] in cities and first[1] is not None and int(first[1]) == 1:
+        cities[first[2]][1] = 1
+    if last[2] in cities:
+        cities[last[2]][2] = 1
+    return [(city, train_code, full_code, is_origin, is_terminal)
+            for city, (full_code, is_origin, is_terminal) in cities.items()]
+
+def collect_train_data(trains_db='trains.db', stations_db='stations.db'):
+    """从trains.db收集数据并存储到stations.db（按车次顺序单遍流式构建）"""
+    trains_conn = None
+    stations_conn = None
     try:
         # 确保数据库文件存在
-        if not os.path.exists('trains.db'):
-            print("错误: trains.db 文件不存在")
+        if not os.path.exists(trains_db):
+            print(f"错误: {trains_db} 文件不存在")
             return False
         
         # 连接trains.db数据库
-        trains_conn = sqlite3.connect('trains.db')
-        trains_cursor = trains_conn.cursor()
+        trains_conn = connect(trains_db, profile='query', readonly=True)
         
         # 连接stations.db数据库
-        stations_conn = sqlite3.connect('stations.db')
+        stations_conn = connect(stations_db, profile='etl')
         
         # 创建city_trains表
         create_city_trains_table(stations_conn)
         stations_cursor = stations_conn.cursor()
         
-        print("正在清空city_trains表...")
-        stations_cursor.execute("DELETE FROM city_trains")
-        stations_conn.commit()
-        
-        # 首先查询表结构，看看有哪些列
-        try:
-            trains_cursor.execute("PRAGMA table_info(train_routes)")
-            columns = [col[1] for col in trains_cursor.fetchall()]
-            print(f"train_routes表的列: {columns}")
-        except Exception as e:
-            print(f"查询表结构失败: {e}")
-        
-        # 查询所有车次路线，使用正确的列名
+        # 按 (train_code, station_no) 顺序读取一遍，不再对每行做 MAX(station_no) 子查询
         print("查询所有车次路线数据...")
-        trains_cursor.execute('''
-        SELECT train_code, train_full_code, city, station_no, 
-               (SELECT MAX(station_no) FROM train_routes tr2 WHERE tr2.train_code = tr1.train_code) as max_station_no
-        FROM train_routes tr1
+        trains_cursor = trains_conn.execute('''
+        SELECT train_code, station_no, city, train_full_code
+        FROM train_routes
         ORDER BY train_code, station_no
         ''')
         
-        # 处理数据并插入
-        print("开始处理数据并插入stations.db...")
+        counters = {"rows": 0, "trains": 0}
         
-        processed = set()  # 用于跟踪已处理的城市-车次组合
-        batch_data = []
-        batch_size = 1000
-        count = 0
+        def generate_rows():
+            for train_code, stops in iter_train_stops(trains_cursor):
+                counters["rows"] += len(stops)
+                counters["trains"] += 1
+                yield from city_train_rows(train_code, stops)
         
-        for row in trains_cursor:
-            train_code = row[0]
-            train_full_code = row[1]
-            city = row[2]
-            station_no = int(row[3])
-            max_station_no = int(row[4])
-            
-            # 跳过空的城市名
-            if not city:
-                continue
-                
-            # 跳过重复的城市-车次组合
-            key = f"{city}-{train_code}"
-            if key in processed:
-                continue
-            
-            processed.add(key)
-            
-            # 判断是否为始发站或终点站
-            is_origin = 1 if station_no == 1 else 0
-            is_terminal = 1 if station_no == max_station_no else 0
-            
-            batch_data.append((city, train_code, train_full_code, is_origin, is_terminal))
-            
-            if len(batch_data) >= batch_size:
-                stations_cursor.executemany(
-                    "INSERT OR IGNORE INTO city_trains (city, train_code, train_full_code, is_origin, is_terminal) VALUES (?, ?, ?, ?, ?)",
-                    batch_data
-                )
-                stations_conn.commit()
-                count += len(batch_data)
-                print(f"已处理 {count} 条记录...")
-                batch_data = []
-        
-        # 插入剩余数据
-        if batch_data:
-            stations_cursor.executemany(
-                "INSERT OR IGNORE INTO city_trains (city, train_code, train_full_code, is_origin, is_terminal) VALUES (?, ?, ?, ?, ?)",
-                batch_data
-            )
-            stations_conn.commit()
-            count += len(batch_data)
+        # 清空和写入在同一个事务中完成
+        print("开始处理数据并写入stations.db...")
+        start = time.perf_counter()
+        stations_cursor.execute("DELETE FROM city_trains")
+        stations_cursor.executemany(
+            "INSERT OR IGNORE INTO city_trains (city, train_code, train_full_code, is_origin, is_terminal) VALUES (?, ?, ?, ?, ?)",
+            generate_rows()
+        )
+        bump_timetable_version(stations_conn)
+        stations_conn.commit()
+        elapsed = time.perf_counter() - start
         
-        print(f"数据收集完成! 共处理 {count} 条记录")
+        rate = counters["rows"] / elapsed if elapsed > 0 else 0
+        print(f"数据收集完成! 读取 {counters['rows']} 行、{counters['trains']} 个车次，"
+              f"耗时 {elapsed:.3f} 秒，{rate:,.0f} 行/秒")
         
         # 查询验证
         stations_cursor.execute("SELECT COUNT(*) FROM city_trains")
@@ -132,15 +240,20 @@ def collect_train_data():
         
     except Exception as e:
         print(f"错误: {e}")
+        if stations_conn is not None:
+            stations_conn.rollback()
         return False
         
     finally:
-        if 'trains_conn' in locals():
+        if trains_conn is not None:
             trains_conn.close()
-        if 'stations_conn' in locals():
+        if stations_conn is not None:
             stations_conn.close()
 
 if __name__ == "__main__":
     print("开始从trains.db收集车次数据到stations.db...")
     success = collect_train_data()
+    if success:
+        print("\n开始构建城市对车次表...")
+        success = build_city_pair_trains(full='--full' in sys.argv)
     sys.exit(0 if success else 1)
\ No newline at end of file
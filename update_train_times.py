@@ -1,30 +1,203 @@
+import hashlib
 import sqlite3
 import os
+import sys
+
+from database import bump_timetable_version, connect
+from migrate_timetable import decode_full_code
+from time_columns import TRAIN_LETTERS, parse_duration
 
 def get_all_letters():
     """获取所有字母表名"""
-    return ['C', 'D', 'G', 'K', 'P', 'S', 'T', 'Y', 'Z']
+    return list(TRAIN_LETTERS)
+
+def create_state_table(cursor):
+    """创建增量导入状态表：记录每条源记录上次应用时的指纹"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS train_time_state (
+            letter TEXT NOT NULL,
+            train_full_code TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY (letter, train_full_code)
+        ) WITHOUT ROWID
+    ''')
+
+def row_fingerprint(train_full_code, run_time, train_code):
+    """源记录指纹（完整车次号+运行时间+匹配到的车次）"""
+    text = f"{train_full_code}|{run_time}|{train_code}"
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def attach_basic(conn, basic_db):
+    """以只读方式附加 train_basic.db，并注册暂存时用到的函数"""
+    conn.execute("ATTACH DATABASE ? AS basic", (f"file:{os.path.abspath(basic_db)}?mode=ro",))
+    conn.create_function('decode_full_code', 1, decode_full_code, deterministic=True)
+    conn.create_function('row_fingerprint', 3, row_fingerprint, deterministic=True)
+    conn.create_function('parse_duration', 1, parse_duration, deterministic=True)
+
+def stage_run_times(conn, letters=None):
+    """
+    把 basic 库中所有字母表一次 UNION ALL 写入临时表 staged_times，并解析对应车次
+    匹配顺序：完整车次号精确匹配（同一完整车次号可对应多个车次，如 D951/D954），
+    其次用从完整车次号解析出的车次代码（match_key）匹配
+    返回实际暂存的字母表列表
+    """
+    staged = []
+    for letter in letters or get_all_letters():
+        columns = {row[1] for row in conn.execute(f'PRAGMA basic.table_info("{letter}")')}
+        if not columns:
+            print(f"表 {letter} 不存在，跳过")
+        elif not {'train_full_code', 'run_time'} <= columns:
+            print(f"表 {letter} 缺少必要的列(train_full_code 或 run_time)")
+        else:
+            staged.append(letter)
+
+    conn.execute("DROP TABLE IF EXISTS temp.staged_times")
+    conn.execute('''
+        CREATE TEMP TABLE staged_times (
+            seq INTEGER PRIMARY KEY,
+            letter TEXT NOT NULL,
+            train_full_code TEXT NOT NULL,
+            run_time TEXT,
+            match_key TEXT,
+            train_codes TEXT,
+            fingerprint TEXT,
+            changed INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    if not staged:
+        return staged
+
+    # 按字母顺序写入，seq 即源记录顺序，同一车次以最后一条为准（与逐表处理一致）
+    union = ' UNION ALL '.join(
+        f"SELECT '{letter}', train_full_code, run_time, decode_full_code(train_full_code) "
+        f"FROM basic.\"{letter}\" WHERE train_full_code IS NOT NULL AND train_full_code != ''"
+        for letter in staged
+    )
+    conn.execute(f"INSERT INTO temp.staged_times (letter, train_full_code, run_time, match_key) {union}")
+    conn.execute("CREATE INDEX temp.idx_staged_times_code ON staged_times(letter, train_full_code)")
+
+    # 车次键表：完整车次号 -> 车次，以及全部车次代码，均带主键索引
+    conn.execute("DROP TABLE IF EXISTS temp.full_codes")
+    conn.execute('''
+        CREATE TEMP TABLE full_codes (
+            train_full_code TEXT NOT NULL,
+            train_code TEXT NOT NULL,
+            PRIMARY KEY (train_full_code, train_code)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO temp.full_codes
+        SELECT train_full_code, train_code FROM main.train_routes WHERE train_full_code IS NOT NULL
+    ''')
+    conn.execute("DROP TABLE IF EXISTS temp.known_codes")
+    conn.execute("CREATE TEMP TABLE known_codes (train_code TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.execute("INSERT OR IGNORE INTO temp.known_codes SELECT train_code FROM main.train_routes")
 
-def update_train_times():
-    """从train_basic.db导入运行时间数据到trains.db，不新增车次"""
+    # 只有格式有效的运行时间才参与匹配；train_codes 为逗号分隔的匹配车次
+    conn.execute('''
+        UPDATE temp.staged_times
+        SET train_codes = COALESCE(
+            (SELECT group_concat(train_code, ',') FROM (
+                SELECT f.train_code FROM temp.full_codes f
+                WHERE f.train_full_code = staged_times.train_full_code
+                ORDER BY f.train_code
+            )),
+            (SELECT k.train_code FROM temp.known_codes k WHERE k.train_code = staged_times.match_key)
+        )
+        WHERE parse_duration(run_time) IS NOT NULL
+    ''')
+    # 与上次导入的指纹比较，只有变化的记录参与更新
+    conn.execute("UPDATE temp.staged_times SET fingerprint = row_fingerprint(train_full_code, run_time, train_codes)")
+    conn.execute('''
+        UPDATE temp.staged_times
+        SET changed = NOT EXISTS (
+            SELECT 1 FROM main.train_time_state s
+            WHERE s.letter = staged_times.letter
+            AND s.train_full_code = staged_times.train_full_code
+            AND s.fingerprint = staged_times.fingerprint
+        )
+    ''')
+    return staged
+
+def apply_run_times(conn, letters):
+    """一次 UPDATE ... FROM 写入运行时间并同步增量状态，返回更新的源记录数"""
+    updated_count = conn.execute(
+        "SELECT COUNT(*) FROM temp.staged_times WHERE changed AND train_codes IS NOT NULL"
+    ).fetchone()[0]
+    # 展开为 (车次, 源记录) 对
+    conn.execute("DROP TABLE IF EXISTS temp.staged_matches")
+    conn.execute('''
+        CREATE TEMP TABLE staged_matches AS
+        SELECT f.train_code, s.seq
+        FROM temp.staged_times s
+        JOIN temp.full_codes f ON f.train_full_code = s.train_full_code
+        WHERE s.changed AND s.train_codes IS NOT NULL
+        UNION ALL
+        SELECT s.train_codes, s.seq
+        FROM temp.staged_times s
+        WHERE s.changed AND s.train_codes IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM temp.full_codes f WHERE f.train_full_code = s.train_full_code)
+    ''')
+    # 同一车次取最后一条源记录；run_time 未变化的行不重写
+    # 已由 time_columns.py 生成整数列时同步更新 run_minutes
+    columns = {row[1] for row in conn.execute("PRAGMA main.table_info(train_routes)")}
+    run_minutes = ', run_minutes = parse_duration(latest.run_time)' if 'run_minutes' in columns else ''
+    conn.execute(f'''
+        UPDATE main.train_routes
+        SET run_time = latest.run_time{run_minutes}
+        FROM (
+            SELECT m.train_code, s.run_time
+            FROM (SELECT train_code, MAX(seq) AS seq FROM temp.staged_matches GROUP BY train_code) m
+            JOIN temp.staged_times s ON s.seq = m.seq
+        ) AS latest
+        WHERE train_routes.train_code = latest.train_code
+        AND train_routes.run_time IS NOT latest.run_time
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO main.train_time_state (letter, train_full_code, fingerprint)
+        SELECT letter, train_full_code, fingerprint FROM temp.staged_times WHERE changed ORDER BY seq
+    ''')
+    # 源表中已删除的记录只清理状态，不清空已有的运行时间
+    conn.execute(f'''
+        DELETE FROM main.train_time_state
+        WHERE letter IN ({','.join('?' * len(letters))})
+        AND NOT EXISTS (
+            SELECT 1 FROM temp.staged_times s
+            WHERE s.letter = train_time_state.letter AND s.train_full_code = train_time_state.train_full_code
+        )
+    ''', letters)
+    return updated_count
+
+def match_report(conn):
+    """每个字母表的匹配情况：[(字母, 源记录数, 匹配数, 本次更新数), ...]"""
+    return conn.execute('''
+        SELECT letter, COUNT(*), COUNT(train_codes), SUM(changed AND train_codes IS NOT NULL)
+        FROM temp.staged_times
+        GROUP BY letter
+        ORDER BY MIN(seq)
+    ''').fetchall()
+
+def update_train_times(basic_db='train_basic.db', trains_db='trains.db', full=False):
+    """
+    从train_basic.db导入运行时间数据到trains.db，不新增车次
+    所有字母表暂存到一张临时表后在 SQLite 内一次关联更新，整个导入一个事务
+    默认增量模式：只对指纹与上次不同的源记录执行更新；full=True 时清空状态全量更新
+    返回本次更新的记录数
+    """
     print('开始更新车次时间信息...')
-    
+
     # 验证文件存在
-    if not os.path.exists('train_basic.db'):
-        print("错误: train_basic.db 文件不存在!")
-        return
-    if not os.path.exists('trains.db'):
-        print("错误: trains.db 文件不存在!")
-        return
-    
-    # 连接到两个数据库
-    conn_basic = sqlite3.connect('train_basic.db')
-    conn_trains = sqlite3.connect('trains.db')
-    
-    # 创建游标
-    cursor_basic = conn_basic.cursor()
+    if not os.path.exists(basic_db):
+        print(f"错误: {basic_db} 文件不存在!")
+        return 0
+    if not os.path.exists(trains_db):
+        print(f"错误: {trains_db} 文件不存在!")
+        return 0
+
+    conn_trains = connect(trains_db, profile='etl')
     cursor_trains = conn_trains.cursor()
-    
+    updated_count = 0
+
     try:
         # 检查并添加run_time列（如果不存在）
         try:
@@ -34,122 +207,55 @@ def update_train_times():
             if "duplicate column name" not in str(e).lower():
                 raise e
             print("run_time列已存在")
-        
-        # 获取现有车次信息
-        print("\n获取trains.db中的所有车次信息...")
-        cursor_trains.execute('''
-            SELECT DISTINCT train_code, train_full_code 
-            FROM train_routes 
-            WHERE train_full_code IS NOT NULL
-        ''')
-        train_data = cursor_trains.fetchall()
-        
-        # 创建车次到完整代码的映射
-        train_codes = {}
-        train_full_codes = {}
-        for row in train_data:
-            train_code, train_full_code = row
-            train_codes[train_code] = train_full_code
-            train_full_codes[train_full_code] = train_code
-        
-        print(f"共找到 {len(train_codes)} 个带完整车次号的车次")
-        
-        # 获取没有完整代码的车次
-        cursor_trains.execute('''
-            SELECT DISTINCT train_code 
-            FROM train_routes 
-            WHERE train_full_code IS NULL
-        ''')
-        
-        for row in cursor_trains.fetchall():
-            train_code = row[0]
-            if train_code not in train_codes:
-                train_codes[train_code] = None
-        
-        print(f"总共找到 {len(train_codes)} 个不同车次")
-        
-        # 按字母类型处理
-        letters = get_all_letters()
-        updated_count = 0
-        
-        for letter in letters:
-            print(f"\n处理{letter}字头车次...")
-            
-            # 验证表是否存在
-            cursor_basic.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{letter}'")
-            if not cursor_basic.fetchone():
-                print(f"表 {letter} 不存在，跳过")
-                continue
-            
-            try:
-                # 获取表结构
-                cursor_basic.execute(f"PRAGMA table_info({letter})")
-                columns = [col[1] for col in cursor_basic.fetchall()]
-                
-                # 确定需要的列名
-                if 'run_time' in columns and 'train_full_code' in columns:
-                    query = f"SELECT train_full_code, run_time FROM {letter}"
-                    cursor_basic.execute(query)
-                    records = cursor_basic.fetchall()
-                    
-                    print(f"从{letter}表中找到 {len(records)} 条记录")
-                    
-                    # 批量准备更新数据
-                    update_data = []
-                    for train_full_code, run_time in records:
-                        if run_time and ':' in run_time:  # 确保时间格式有效
-                            # 尝试直接匹配完整车次号
-                            if train_full_code in train_full_codes:
-                                train_code = train_full_codes[train_full_code]
-                                update_data.append((run_time, train_code))
-                            else:
-                                # 尝试匹配车次编号（提取数字部分）
-                                digits = ''.join([c for c in train_full_code if c.isdigit()])
-                                if digits in train_codes:
-                                    update_data.append((run_time, digits))
-                    
-                    # 执行批量更新
-                    if update_data:
-                        cursor_trains.executemany(
-                            "UPDATE train_routes SET run_time = ? WHERE train_code = ?", 
-                            update_data
-                        )
-                        
-                        updated_count += len(update_data)
-                        print(f"更新了 {len(update_data)} 条{letter}字头车次记录")
-                        conn_trains.commit()
-                    else:
-                        print(f"没有找到可匹配的{letter}字头车次")
-                
-                else:
-                    print(f"表 {letter} 缺少必要的列(train_full_code 或 run_time)")
-                    
-            except sqlite3.Error as e:
-                print(f"处理表 {letter} 时出错: {e}")
-        
+
+        create_state_table(cursor_trains)
+        if full:
+            cursor_trains.execute("DELETE FROM train_time_state")
+            print("全量模式：已清空增量状态")
+        conn_trains.commit()
+
+        attach_basic(conn_trains, basic_db)
+        print("\n暂存所有字母表...")
+        letters = stage_run_times(conn_trains)
+
+        if letters:
+            updated_count = apply_run_times(conn_trains, letters)
+            if updated_count:
+                bump_timetable_version(conn_trains)
+
+            for letter, total, matched, updated in match_report(conn_trains):
+                print(f"{letter}字头: {total} 条记录，匹配 {matched} 条（{matched / total * 100:.1f}%），"
+                      f"本次更新 {updated} 条")
+        conn_trains.commit()
+
         # 验证结果
+        unchanged_count = cursor_trains.execute(
+            "SELECT COUNT(*) FROM temp.staged_times WHERE NOT changed"
+        ).fetchone()[0]
         cursor_trains.execute('''
             SELECT COUNT(*) as total,
                    COUNT(run_time) as with_time
             FROM train_routes
         ''')
         total, with_time = cursor_trains.fetchone()
-        
+
         print("\n更新完成:")
+        print(f"本次更新: {updated_count} 条，未变化跳过: {unchanged_count} 条")
         print(f"总记录数: {total}")
         print(f"已添加时间的记录数: {with_time}")
         print(f"更新成功率: {(with_time/total*100):.2f}%")
-            
+
     except Exception as e:
         print(f"更新车次时间信息出错: {e}")
         conn_trains.rollback()
-        
+        updated_count = 0
+
     finally:
-        cursor_basic.close()
         cursor_trains.close()
-        conn_basic.close()
         conn_trains.close()
         print("数据库连接已关闭")
 
+    return updated_count
+
 if __name__ == "__main__":
-    update_train_times()
\ No newline at end of file
+    update_train_times(full='--full' in sys.argv)